@@ -3,6 +3,7 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from restaurant_app.models import Order
+from restaurant_app.realtime import publish_event
 
 User = get_user_model()
 
@@ -42,10 +43,20 @@ class DeliveryOrder(models.Model):
 
     class Meta:
         ordering = ("-updated_at",)
+        indexes = [
+            models.Index(fields=["driver", "status"], name="delivery_driver_status_idx"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - {self.status}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.status
+        instance._loaded_driver_id = instance.driver_id
+        return instance
+
 
 @receiver(post_save, sender=Order)
 def create_delivery_order(sender, instance, created, **kwargs):
@@ -56,3 +67,23 @@ def create_delivery_order(sender, instance, created, **kwargs):
                 id=instance.delivery_driver_id
             ).first()
         DeliveryOrder.objects.create(order=instance, driver=driver)
+
+
+@receiver(post_save, sender=DeliveryOrder)
+def publish_delivery_status_event(sender, instance, created, **kwargs):
+    if not created and (
+        getattr(instance, "_loaded_status", None) == instance.status
+        and getattr(instance, "_loaded_driver_id", None) == instance.driver_id
+    ):
+        return
+    publish_event(
+        "delivery.status",
+        {
+            "id": instance.id,
+            "order": instance.order_id,
+            "driver": instance.driver_id,
+            "status": instance.status,
+        },
+    )
+    instance._loaded_status = instance.status
+    instance._loaded_driver_id = instance.driver_id
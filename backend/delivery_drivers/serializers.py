@@ -29,3 +29,12 @@ class DeliveryOrderSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Selecting "order" also caches order.delivery_order for the nested
+        # OrderSerializer, so only the order's own relations are added here
+        return queryset.select_related(
+            "driver__user",
+            "order__user__driver_profile",
+        ).prefetch_related("order__items")
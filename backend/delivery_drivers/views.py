@@ -49,8 +49,10 @@ class DeliveryOrderViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.request.user.is_staff:
-            return DeliveryOrder.objects.all()
-        return DeliveryOrder.objects.filter(driver__user=self.request.user)
+            queryset = DeliveryOrder.objects.all()
+        else:
+            queryset = DeliveryOrder.objects.filter(driver__user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset)
 
     @action(detail=True, methods=["patch"])
     def update_status(self, request, pk=None):
@@ -0,0 +1,6 @@
+from django.contrib import admin
+from unfold.admin import ModelAdmin as UnflodModelAdmin
+from .models import KitchenStation, KitchenTicket
+
+admin.site.register(KitchenStation, UnflodModelAdmin)
+admin.site.register(KitchenTicket, UnflodModelAdmin)
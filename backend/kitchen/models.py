@@ -0,0 +1,151 @@
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import DateTimeField, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from restaurant_app.models import Category, Order
+from restaurant_app.realtime import publish_event, publish_events
+
+
+class KitchenStation(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    categories = models.ManyToManyField(
+        Category, related_name="kitchen_stations", blank=True
+    )
+    is_default = models.BooleanField(
+        default=False,
+        help_text="Receives items whose category is not routed to any station.",
+    )
+
+    class Meta:
+        ordering = ("name",)
+
+    def __str__(self):
+        return self.name
+
+
+class KitchenTicket(models.Model):
+    STATUS_CHOICES = (
+        ("new", "New"),
+        ("acknowledged", "Acknowledged"),
+        ("bumped", "Bumped"),
+    )
+    OPEN_STATUSES = ("new", "acknowledged")
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="kitchen_tickets"
+    )
+    station = models.ForeignKey(
+        KitchenStation, on_delete=models.CASCADE, related_name="tickets"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="new")
+    is_addition = models.BooleanField(default=False)
+    # Snapshot of the routed lines, so displays never have to load the order
+    lines = models.JSONField(default=list)
+    note = models.TextField(blank=True)
+    order_type = models.CharField(max_length=20, choices=Order.ORDER_TYPE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    bumped_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("created_at", "id")
+        indexes = [
+            models.Index(
+                fields=["station", "created_at"],
+                condition=Q(status__in=["new", "acknowledged"]),
+                name="kitchen_open_ticket_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.id} - Order {self.order_id} - {self.station_id}"
+
+    def to_event(self):
+        return {
+            "id": self.id,
+            "order": self.order_id,
+            "station": self.station_id,
+            "status": self.status,
+            "is_addition": self.is_addition,
+            "order_type": self.order_type,
+            "note": self.note,
+            "lines": self.lines,
+            "created_at": self.created_at.isoformat(),
+        }
+
+    @classmethod
+    def create_for_items(cls, order, items, is_addition=False):
+        """Split freshly inserted order items into one ticket per station.
+
+        Items are routed by their dish's category; anything not routed goes to
+        the default station(s). Runs a fixed number of queries per order.
+        """
+        category_ids = {item.dish.category_id for item in items}
+        routes = defaultdict(list)
+        for category_id, station_id in KitchenStation.categories.through.objects.filter(
+            category_id__in=category_ids
+        ).values_list("category_id", "kitchenstation_id"):
+            routes[category_id].append(station_id)
+        if len(routes) < len(category_ids):
+            default_stations = list(
+                KitchenStation.objects.filter(is_default=True).values_list("id", flat=True)
+            )
+        else:
+            default_stations = []
+
+        lines_by_station = defaultdict(list)
+        for item in items:
+            line = {
+                "dish": item.dish_id,
+                "name": item.dish.name,
+                "quantity": item.quantity,
+                "variants": item.variants,
+            }
+            for station_id in routes.get(item.dish.category_id) or default_stations:
+                lines_by_station[station_id].append(line)
+        if not lines_by_station:
+            return []
+
+        tickets = cls.objects.bulk_create(
+            [
+                cls(
+                    order=order,
+                    station_id=station_id,
+                    is_addition=is_addition,
+                    lines=lines,
+                    note=order.kitchen_note,
+                    order_type=order.order_type,
+                )
+                for station_id, lines in lines_by_station.items()
+            ]
+        )
+        publish_events("kitchen.ticket", [ticket.to_event() for ticket in tickets])
+        return tickets
+
+    @classmethod
+    def set_status(cls, ids, status):
+        """Acknowledge or bump many tickets with one UPDATE and one event.
+
+        Returns the ids that actually changed; tickets already past the
+        requested status are left alone."""
+        now = timezone.now()
+        if status == "acknowledged":
+            tickets = cls.objects.filter(id__in=ids, status="new")
+            changes = {"acknowledged_at": now}
+        else:
+            tickets = cls.objects.filter(id__in=ids, status__in=cls.OPEN_STATUSES)
+            changes = {
+                "bumped_at": now,
+                "acknowledged_at": Coalesce(
+                    "acknowledged_at", Value(now, output_field=DateTimeField())
+                ),
+            }
+
+        with transaction.atomic():
+            changed = list(tickets.values_list("id", flat=True))
+            if changed:
+                cls.objects.filter(id__in=changed).update(status=status, **changes)
+                publish_event("kitchen.status", {"ids": changed, "status": status})
+        return changed
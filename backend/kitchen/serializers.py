@@ -0,0 +1,33 @@
+from rest_framework import serializers
+from .models import KitchenStation, KitchenTicket
+
+
+class KitchenStationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = KitchenStation
+        fields = ["id", "name", "categories", "is_default"]
+
+
+class KitchenTicketSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = KitchenTicket
+        fields = [
+            "id",
+            "order",
+            "station",
+            "status",
+            "is_addition",
+            "order_type",
+            "note",
+            "lines",
+            "created_at",
+            "acknowledged_at",
+            "bumped_at",
+        ]
+        read_only_fields = fields
+
+
+class KitchenTicketBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=500
+    )
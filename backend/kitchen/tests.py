@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from kitchen.models import KitchenStation, KitchenTicket
+from restaurant_app.models import Category, Dish, InvoiceSequence, RealtimeEvent, User
+
+
+class KitchenTicketTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="staff", password="secret-pass", passcode="123456", role="staff"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        grill = Category.objects.create(name="Grill")
+        drinks = Category.objects.create(name="Drinks")
+        desserts = Category.objects.create(name="Desserts")
+        self.grill = KitchenStation.objects.create(name="Grill")
+        self.grill.categories.add(grill)
+        self.bar = KitchenStation.objects.create(name="Bar")
+        self.bar.categories.add(drinks)
+        self.expo = KitchenStation.objects.create(name="Expo", is_default=True)
+
+        self.kebab = Dish.objects.create(name="Kebab", price=Decimal("8"), category=grill)
+        self.tea = Dish.objects.create(name="Tea", price=Decimal("1"), category=drinks)
+        self.kulfi = Dish.objects.create(name="Kulfi", price=Decimal("3"), category=desserts)
+
+    def post_order(self, dishes, note=""):
+        response = self.client.post(
+            "/api/orders/",
+            {
+                "total_amount": "0.00",
+                "order_type": "dining",
+                "kitchen_note": note,
+                "items": [{"dish": dish.id, "quantity": 1} for dish in dishes],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def test_order_is_split_into_station_tickets(self):
+        order_id = self.post_order([self.kebab, self.tea, self.kulfi], note="No chilli")
+        tickets = {t.station_id: t for t in KitchenTicket.objects.filter(order_id=order_id)}
+        self.assertEqual(set(tickets), {self.grill.id, self.bar.id, self.expo.id})
+        self.assertEqual([line["name"] for line in tickets[self.grill.id].lines], ["Kebab"])
+        self.assertEqual([line["name"] for line in tickets[self.expo.id].lines], ["Kulfi"])
+        self.assertEqual(tickets[self.bar.id].note, "No chilli")
+        self.assertEqual(RealtimeEvent.objects.filter(kind="kitchen.ticket").count(), 3)
+
+    def test_added_items_become_addition_tickets(self):
+        order_id = self.post_order([self.kebab])
+        response = self.client.patch(
+            f"/api/orders/{order_id}/",
+            {"items": [{"dish": self.tea.id, "quantity": 2}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        addition = KitchenTicket.objects.get(order_id=order_id, is_addition=True)
+        self.assertEqual(addition.station, self.bar)
+        self.assertEqual(addition.lines[0]["quantity"], 2)
+
+    def test_ticket_routing_query_count_is_flat(self):
+        InvoiceSequence.next_invoice_number()  # the first order starts the sequence
+        counts = []
+        for dishes in ([self.kebab, self.kulfi], [self.kebab, self.tea, self.kulfi] * 10):
+            self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+            with CaptureQueriesContext(connection) as queries:
+                self.post_order(dishes)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_acknowledge_and_bump(self):
+        for _ in range(3):
+            self.post_order([self.kebab])
+        ids = list(KitchenTicket.objects.values_list("id", flat=True))
+
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                "/api/kitchen-tickets/acknowledge/", {"ids": ids[:2]}, format="json"
+            )
+        self.assertEqual(response.data["ids"], ids[:2])
+
+        response = self.client.post("/api/kitchen-tickets/bump/", {"ids": ids}, format="json")
+        self.assertEqual(response.data["ids"], ids)
+        self.assertFalse(KitchenTicket.objects.filter(bumped_at__isnull=True).exists())
+        self.assertFalse(KitchenTicket.objects.filter(acknowledged_at__isnull=True).exists())
+
+        # Already bumped tickets are not touched again
+        response = self.client.post("/api/kitchen-tickets/bump/", {"ids": ids}, format="json")
+        self.assertEqual(response.data["ids"], [])
+        event = RealtimeEvent.objects.filter(kind="kitchen.status").last()
+        self.assertEqual(event.payload, {"ids": ids, "status": "bumped"})
+
+    def test_open_queue_lists_station_tickets(self):
+        self.post_order([self.kebab, self.tea])
+        response = self.client.get("/api/kitchen-tickets/", {"station": self.bar.id})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["lines"][0]["name"], "Tea")
+        self.assertNotIn("items", response.data[0])
+
+    def test_bumped_tickets_can_be_listed_and_retrieved(self):
+        self.post_order([self.kebab, self.tea])
+        ids = list(KitchenTicket.objects.values_list("id", flat=True))
+        self.client.post("/api/kitchen-tickets/bump/", {"ids": ids}, format="json")
+
+        response = self.client.get("/api/kitchen-tickets/", {"status": "bumped"})
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(f"/api/kitchen-tickets/{ids[0]}/", {"status": "bumped"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], ids[0])
+
+    def test_station_must_be_an_id(self):
+        response = self.client.get("/api/kitchen-tickets/", {"station": "abc"})
+        self.assertEqual(response.status_code, 400)
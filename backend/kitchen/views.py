@@ -0,0 +1,63 @@
+from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from .models import KitchenStation, KitchenTicket
+from .serializers import (
+    KitchenStationSerializer,
+    KitchenTicketBulkSerializer,
+    KitchenTicketSerializer,
+)
+
+
+class KitchenStationViewSet(viewsets.ModelViewSet):
+    queryset = KitchenStation.objects.prefetch_related("categories")
+    serializer_class = KitchenStationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class KitchenTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """Open tickets for the kitchen displays.
+
+    Displays load the open queue once (``?station=<id>``), then follow the
+    ``kitchen`` events on /api/events/ for new tickets and status changes.
+    ``?status=bumped`` lists recently bumped tickets instead.
+    """
+
+    serializer_class = KitchenTicketSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    bumped_list_limit = 50
+
+    def get_queryset(self):
+        queryset = KitchenTicket.objects.all()
+        station = self.request.query_params.get("station")
+        if station:
+            try:
+                queryset = queryset.filter(station_id=int(station))
+            except ValueError:
+                raise ValidationError({"station": "Must be a station id."})
+        if self.request.query_params.get("status") == "bumped":
+            return queryset.filter(status="bumped").order_by("-bumped_at")
+        return queryset.filter(status__in=KitchenTicket.OPEN_STATUSES)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get("status") == "bumped":
+            # Only the most recent ones; sliced here so detail lookups can still filter
+            queryset = queryset[: self.bumped_list_limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def set_status(self, request, status):
+        serializer = KitchenTicketBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = KitchenTicket.set_status(serializer.validated_data["ids"], status)
+        return Response({"ids": changed, "status": status})
+
+    @action(detail=False, methods=["post"])
+    def acknowledge(self, request):
+        return self.set_status(request, "acknowledged")
+
+    @action(detail=False, methods=["post"])
+    def bump(self, request):
+        return self.set_status(request, "bumped")
@@ -0,0 +1,90 @@
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def get_cache_version(key):
+    """Current value of a version counter kept in the shared catalog cache."""
+    cache = get_catalog_cache()
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost key never brings back an older version
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    """Advance a version counter once the current transaction commits."""
+
+    def bump():
+        cache = get_catalog_cache()
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def get_catalog_version():
+    return get_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response once the current transaction commits."""
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def catalog_etag(version):
+    return f'W/"catalog-{version}"'
+
+
+def cached_catalog_response(request, build_response):
+    """Serve a catalog GET from the cache keyed by the catalog version.
+
+    A matching If-None-Match short-circuits to 304 before any database or
+    serializer work; otherwise ``build_response`` runs once per version and URL.
+    """
+    version = get_catalog_version()
+    etag = catalog_etag(version)
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache = get_catalog_cache()
+    key = f"catalog:{version}:{request.build_absolute_uri()}"
+    data = cache.get(key)
+    if data is None:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        data = response.data
+        cache.set(key, data)
+    return Response(data, headers={"ETag": etag})
+
+
+class CatalogCacheMixin:
+    """Read-through catalog cache for list and retrieve on a ModelViewSet."""
+
+    def list(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request,
+            lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs),
+        )
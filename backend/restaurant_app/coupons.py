@@ -0,0 +1,73 @@
+import threading
+
+from django.utils import timezone
+
+from restaurant_app.catalog import bump_cache_version, get_cache_version
+
+
+COUPON_VERSION_KEY = "coupon:version"
+
+
+def bump_coupon_version():
+    """Make every process reload its coupon index once the current transaction commits."""
+    bump_cache_version(COUPON_VERSION_KEY)
+
+
+class CouponIndex:
+    """Active, unexpired coupons by code, held in memory.
+
+    Only coupon definitions live here. Usage is never read from the index:
+    redemption is a conditional UPDATE, so the limit holds across processes.
+    Campaign coupons can run to 100k codes, so only live campaigns are kept,
+    by prefix, once all their codes are generated; a code with a live
+    campaign's prefix is looked up by its unique index, and any other
+    unknown code is rejected without a query.
+    """
+
+    def __init__(self, coupons, campaign_prefixes=()):
+        self.coupons = {coupon.code: coupon for coupon in coupons}
+        self.campaign_prefixes = set(campaign_prefixes)
+
+    @classmethod
+    def from_database(cls):
+        from restaurant_app.models import Coupon, CouponCampaign
+
+        now = timezone.now()
+        return cls(
+            Coupon.objects.filter(campaign__isnull=True, is_active=True, end_date__gte=now),
+            CouponCampaign.objects.filter(
+                status="ready", revoked_at__isnull=True, end_date__gte=now
+            ).values_list("prefix", flat=True),
+        )
+
+    def get(self, code):
+        """The coupon for ``code`` if it is usable now (ignoring usage), else None."""
+        from restaurant_app.models import Coupon
+
+        code = (code or "").strip()
+        coupon = self.coupons.get(code)
+        if coupon is None and code.partition("-")[0] in self.campaign_prefixes:
+            coupon = Coupon.objects.filter(
+                code=code, is_active=True, campaign__status="ready"
+            ).first()
+        if coupon is None:
+            return None
+        now = timezone.now()
+        if coupon.start_date > now or coupon.end_date < now:
+            return None
+        return coupon
+
+
+_index_lock = threading.Lock()
+_index_state = {"version": None, "index": None}
+
+
+def get_coupon_index():
+    """Return this process's index, reloading it when a coupon changes."""
+    version = get_cache_version(COUPON_VERSION_KEY)
+    if _index_state["version"] != version:
+        with _index_lock:
+            if _index_state["version"] != version:
+                _index_state["index"] = CouponIndex.from_database()
+                _index_state["version"] = version
+    return _index_state["index"]
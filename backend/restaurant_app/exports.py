@@ -0,0 +1,134 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Flat (header, lookup) projections streamed by the report exports
+SALES_REPORT_COLUMNS = [
+    ("id", "id"),
+    ("invoice_number", "invoice_number"),
+    ("created_at", "created_at"),
+    ("order_type", "order_type"),
+    ("status", "status"),
+    ("payment_method", "payment_method"),
+    ("total_amount", "total_amount"),
+    ("cash_amount", "cash_amount"),
+    ("bank_amount", "bank_amount"),
+    ("delivery_charge", "delivery_charge"),
+    ("customer_name", "customer_name"),
+    ("customer_phone_number", "customer_phone_number"),
+    ("billed_by", "user__username"),
+]
+
+MESS_REPORT_COLUMNS = [
+    ("id", "id"),
+    ("customer_name", "customer_name"),
+    ("mobile_number", "mobile_number"),
+    ("start_date", "start_date"),
+    ("end_date", "end_date"),
+    ("mess_type", "mess_type__name"),
+    ("payment_method", "payment_method"),
+    ("total_amount", "total_amount"),
+    ("discount_amount", "discount_amount"),
+    ("grand_total", "grand_total"),
+    ("paid_amount", "paid_amount"),
+    ("pending_amount", "pending_amount"),
+    ("cash_amount", "cash_amount"),
+    ("bank_amount", "bank_amount"),
+]
+
+
+COUPON_EXPORT_COLUMNS = [
+    ("code", "code"),
+    ("is_active", "is_active"),
+    ("usage_count", "usage_count"),
+    ("start_date", "start_date"),
+    ("end_date", "end_date"),
+]
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for regular (error) responses; exports are streamed
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return ""
+        writer = csv.writer(Echo())
+        header = list(rows[0].keys())
+        lines = [writer.writerow(header)]
+        lines += [writer.writerow([row.get(key) for key in header]) for row in rows]
+        return "".join(lines)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows = data if isinstance(data, list) else [data]
+        return "".join(json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows)
+
+
+EXPORT_RENDERER_CLASSES = [
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    CSVRenderer,
+    NDJSONRenderer,
+]
+EXPORT_FORMATS = (CSVRenderer.format, NDJSONRenderer.format)
+
+
+def stream_queryset(queryset, columns, export_format, filename):
+    """Stream a queryset as CSV or NDJSON rows without materializing it.
+
+    Rows are fetched as plain tuples in chunks of EXPORT_CHUNK_SIZE, so memory
+    stays flat however many rows the filters match.
+    """
+    headers = [header for header, _ in columns]
+    rows = (
+        queryset.prefetch_related(None)
+        .values_list(*[lookup for _, lookup in columns])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    if export_format == CSVRenderer.format:
+        writer = csv.writer(Echo())
+        content = (
+            writer.writerow(row)
+            for row in _with_header(headers, rows)
+        )
+        renderer = CSVRenderer
+    else:
+        encoder = DjangoJSONEncoder()
+        content = (
+            encoder.encode(dict(zip(headers, row))) + "\n" for row in rows
+        )
+        renderer = NDJSONRenderer
+
+    response = StreamingHttpResponse(content, content_type=renderer.media_type)
+    response["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
+
+
+def _with_header(headers, rows):
+    yield headers
+    yield from rows
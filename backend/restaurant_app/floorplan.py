@@ -0,0 +1,126 @@
+import threading
+from collections import Counter
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from restaurant_app.catalog import bump_cache_version, get_cache_version, get_catalog_cache
+
+
+FLOOR_VERSION_KEY = "floor:version"
+TABLE_STATUSES = ("free", "seated", "billed", "cleaning")
+
+TABLE_FIELDS = (
+    "id",
+    "table_name",
+    "floor_id",
+    "seats_count",
+    "capacity",
+    "start_time",
+    "end_time",
+    "status",
+    "current_order_id",
+    "seated_at",
+)
+
+
+def get_floor_version():
+    return get_cache_version(FLOOR_VERSION_KEY)
+
+
+def bump_floor_version():
+    """Make every process rebuild its occupancy index once the current transaction commits."""
+    bump_cache_version(FLOOR_VERSION_KEY)
+
+
+class OccupancyIndex:
+    """Floors, their tables and each table's live state, held in memory.
+
+    Built with two queries and shared by every request of the process until
+    a table or floor changes; seat time is worked out when the plan is read.
+    """
+
+    def __init__(self, floors, tables):
+        self.floors = {floor["id"]: {**floor, "tables": []} for floor in floors}
+        self.floor_ids = {floor["name"]: floor["id"] for floor in floors}
+        for table in tables:
+            self.floors[table["floor_id"]]["tables"].append(table)
+
+    @classmethod
+    def from_database(cls):
+        from restaurant_app.models import Floor, Table
+
+        floors = Floor.objects.order_by("name").values("id", "name")
+        tables = Table.objects.order_by("floor_id", "table_name", "id").values(*TABLE_FIELDS)
+        return cls(list(floors), list(tables))
+
+    def floor_id(self, name):
+        return self.floor_ids.get(name)
+
+    def plan(self, floor=None, now=None):
+        """The floor plan with live table status, optionally for one floor name."""
+        now = now or timezone.now()
+        floors = self.floors.values()
+        if floor is not None:
+            floors = [f for f in floors if f["name"] == floor]
+        plan = []
+        for f in floors:
+            tables = [
+                {
+                    **table,
+                    "seated_minutes": (
+                        int((now - table["seated_at"]).total_seconds() // 60)
+                        if table["seated_at"]
+                        else None
+                    ),
+                }
+                for table in f["tables"]
+            ]
+            counts = Counter(table["status"] for table in tables)
+            plan.append(
+                {
+                    "id": f["id"],
+                    "name": f["name"],
+                    "counts": {status: counts[status] for status in TABLE_STATUSES},
+                    "tables": tables,
+                }
+            )
+        return plan
+
+
+_index_lock = threading.Lock()
+_index_state = {"version": None, "index": None}
+
+
+def get_occupancy_index():
+    """Return this process's index, rebuilding it when the floor version changes."""
+    version = get_floor_version()
+    if _index_state["version"] != version:
+        with _index_lock:
+            if _index_state["version"] != version:
+                _index_state["index"] = OccupancyIndex.from_database()
+                _index_state["version"] = version
+    return _index_state["index"]
+
+
+def floor_etag(version):
+    return f'W/"floor-{version}"'
+
+
+def cached_floor_response(request, build_data):
+    """Serve a floor GET keyed by the floor version, which changes only when a
+    Floor or Table row does. A matching If-None-Match is answered with a 304
+    before any database work; ``build_data`` runs once per version and URL."""
+    version = get_floor_version()
+    etag = floor_etag(version)
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache = get_catalog_cache()
+    key = f"floor:{version}:{request.build_absolute_uri()}"
+    data = cache.get(key)
+    if data is None:
+        data = build_data()
+        cache.set(key, data)
+    return Response(data, headers={"ETag": etag})
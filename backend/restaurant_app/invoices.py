@@ -0,0 +1,323 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from PIL import Image
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+
+INVOICE_CACHE_ALIAS = "invoices"
+
+DEFAULT_COMPANY = {
+    "name": "Your Restaurant Name",
+    "location": "123 Restaurant St, City, Country",
+    "phone": "(123) 456-7890",
+}
+
+# Built once; the header row is repeated on every page and the last row is the total
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, -1), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+COLUMN_WIDTHS = [3 * inch, 1 * inch, 1 * inch, 1 * inch]
+
+_logo_lock = threading.Lock()
+_logo_state = {"key": None, "image": None}
+
+
+def logo_file_stamp(path):
+    """Size and mtime of the logo file, so a logo replaced at the same path
+    counts as a change; None when there is no readable file."""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def get_print_logo(path):
+    """Return the decoded print logo, reading the file only when it changes.
+
+    The cache key includes the file's size and mtime, so a logo replaced at
+    the same path is picked up on the next render.
+    """
+    if not path:
+        return None
+    key = (path, logo_file_stamp(path))
+    if _logo_state["key"] != key:
+        with _logo_lock:
+            if _logo_state["key"] != key:
+                try:
+                    with Image.open(path) as image:
+                        decoded = image.convert("RGBA")
+                except OSError:
+                    decoded = None
+                reader = ImageReader(decoded) if decoded is not None else None
+                if reader is not None:
+                    # Decode the pixels now rather than on first draw in a worker
+                    reader.getRGBData()
+                _logo_state["image"] = reader
+                _logo_state["key"] = key
+    return _logo_state["image"]
+
+
+def get_letterhead():
+    """Company details and print logo path from LogoInfo, or placeholders."""
+    from restaurant_app.models import LogoInfo
+
+    logo_info = LogoInfo.objects.first()
+    if logo_info is None:
+        return {"company": dict(DEFAULT_COMPANY), "logo_path": None, "logo_stamp": None}
+    logo_path = logo_info.print_logo.path if logo_info.print_logo else None
+    return {
+        "company": {
+            "name": logo_info.company_name,
+            "location": logo_info.location,
+            "phone": logo_info.phone_number,
+        },
+        "logo_path": logo_path,
+        # Part of the snapshot version, so cached PDFs follow the file itself
+        "logo_stamp": logo_file_stamp(logo_path),
+    }
+
+
+def invoice_snapshot(order, letterhead=None, items=None):
+    """Everything the invoice shows, as plain data.
+
+    Taken in the request thread so rendering never touches the database;
+    it also determines the cache version of the rendered PDF. Batch callers
+    pass the letterhead and prefetched items to avoid per-order queries.
+    """
+    if letterhead is None:
+        letterhead = get_letterhead()
+    if items is None:
+        items = order.items.select_related("dish")
+
+    return {
+        "order_id": order.id,
+        "invoice_number": order.invoice_number,
+        "created_at": order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "billed_by": order.user.username,
+        "status": order.get_status_display(),
+        "total_amount": f"{order.total_amount:.2f}",
+        "items": [
+            (item.dish.name, item.quantity, f"{item.dish.price:.2f}",
+             f"{item.quantity * item.dish.price:.2f}")
+            for item in items
+        ],
+        **letterhead,
+    }
+
+
+def statement_snapshot(credit_user, credit_orders, start_date, end_date, letterhead):
+    """A credit customer's statement for a period, as plain data."""
+    orders = [
+        (
+            timezone.localtime(credit_order.order.created_at).strftime('%Y-%m-%d'),
+            credit_order.order.invoice_number or str(credit_order.order_id),
+            f"{credit_order.order.total_amount:.2f}",
+        )
+        for credit_order in credit_orders
+    ]
+    return {
+        "credit_user_id": credit_user.id,
+        "name": credit_user.username,
+        "mobile_number": credit_user.mobile_number,
+        "period": f"{start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}",
+        "orders": orders,
+        "period_total": f"{sum(credit_order.order.total_amount for credit_order in credit_orders):.2f}",
+        "total_due": f"{credit_user.total_due:.2f}",
+        "limit_amount": f"{credit_user.limit_amount:.2f}",
+        **letterhead,
+    }
+
+
+def snapshot_version(snapshot):
+    return hashlib.sha1(repr(sorted(snapshot.items())).encode()).hexdigest()[:20]
+
+
+def render_invoice(snapshot):
+    """Render a snapshot to PDF bytes. Pure CPU work, safe to run in a worker."""
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    draw_invoice(p, snapshot)
+    p.save()
+    return buffer.getvalue()
+
+
+def draw_letterhead(p, snapshot):
+    width, height = letter
+    company = snapshot["company"]
+
+    logo = get_print_logo(snapshot["logo_path"])
+    if logo is not None:
+        p.drawImage(logo, 50, height - 100, width=100, height=80,
+                    preserveAspectRatio=True, mask="auto")
+
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(180, height - 50, company["name"])
+    p.setFont("Helvetica", 10)
+    p.drawString(180, height - 65, company["location"])
+    p.drawString(180, height - 80, f"Phone: {company['phone']}")
+
+    p.line(50, height - 110, width - 50, height - 110)
+
+
+def draw_table(p, table, top):
+    """Draw a table from ``top`` down, continuing on new pages as needed."""
+    width, height = letter
+    while True:
+        available = top - 70
+        parts = table.split(width - 100, available)
+        if len(parts) <= 1:
+            _, table_height = table.wrapOn(p, width - 100, available)
+            table.drawOn(p, 50, top - table_height)
+            return
+        first, table = parts[0], parts[1]
+        _, first_height = first.wrapOn(p, width - 100, available)
+        first.drawOn(p, 50, top - first_height)
+        p.showPage()
+        top = height - 50
+
+
+def draw_invoice(p, snapshot):
+    """Draw one invoice onto a canvas, adding pages for long orders."""
+    width, height = letter
+    draw_letterhead(p, snapshot)
+
+    p.setFont("Helvetica-Bold", 14)
+    if snapshot["invoice_number"]:
+        p.drawString(50, height - 140, f"Invoice #{snapshot['invoice_number']}")
+    else:
+        p.drawString(50, height - 140, f"Order #{snapshot['order_id']}")
+    p.setFont("Helvetica", 10)
+    p.drawString(50, height - 160, f"Date: {snapshot['created_at']}")
+    p.drawString(50, height - 175, f"Billed by: {snapshot['billed_by']}")
+    p.drawString(50, height - 190, f"Status: {snapshot['status']}")
+
+    data = [['Item', 'Quantity', 'Price', 'Total']]
+    for name, quantity, price, total in snapshot["items"]:
+        data.append([name, str(quantity), f"${price}", f"${total}"])
+    data.append(['', '', 'Total:', f"${snapshot['total_amount']}"])
+
+    table = Table(data, colWidths=COLUMN_WIDTHS, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    draw_table(p, table, height - 210)
+
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(50, 50, "Thank you for your order! We hope you enjoy your meal.")
+    p.showPage()
+
+
+def draw_statement(p, snapshot):
+    """Draw one credit customer's statement onto a canvas."""
+    width, height = letter
+    draw_letterhead(p, snapshot)
+
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(50, height - 140, f"Credit statement: {snapshot['name']}")
+    p.setFont("Helvetica", 10)
+    p.drawString(50, height - 160, f"Mobile: {snapshot['mobile_number']}")
+    p.drawString(50, height - 175, f"Period: {snapshot['period']}")
+    p.drawString(
+        50, height - 190,
+        f"Credit limit: ${snapshot['limit_amount']}    Total due: ${snapshot['total_due']}",
+    )
+
+    data = [['Date', 'Invoice', '', 'Amount']]
+    for date, invoice_number, amount in snapshot["orders"]:
+        data.append([date, invoice_number, '', f"${amount}"])
+    data.append(['', '', 'Period total:', f"${snapshot['period_total']}"])
+
+    table = Table(data, colWidths=[1.5 * inch, 2.5 * inch, 1 * inch, 1 * inch], repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    draw_table(p, table, height - 210)
+    p.showPage()
+
+
+class InvoiceRenderer:
+    """Serves invoice PDFs from the invoice cache and renders misses on a
+    bounded thread pool, so request threads never wait on ReportLab."""
+
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = {}
+
+    @property
+    def cache(self):
+        return caches[INVOICE_CACHE_ALIAS]
+
+    @staticmethod
+    def cache_key(snapshot):
+        return f"invoice:{snapshot['order_id']}:{snapshot_version(snapshot)}"
+
+    def get_cached(self, snapshot):
+        return self.cache.get(self.cache_key(snapshot))
+
+    def submit(self, snapshot):
+        """Queue a render unless it is already queued.
+
+        Returns the future, or None when the pool is saturated.
+        """
+        key = self.cache_key(snapshot)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            if len(self.pending) >= self.max_pending:
+                return None
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="invoice-render"
+                )
+            future = self.executor.submit(self._render, key, snapshot)
+            self.pending[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _render(self, key, snapshot):
+        pdf = render_invoice(snapshot)
+        self.cache.set(key, pdf)
+        return pdf
+
+    def _forget(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def render(self, snapshot):
+        """Return the PDF, rendering it in the calling thread on a miss."""
+        pdf = self.get_cached(snapshot)
+        if pdf is None:
+            pdf = render_invoice(snapshot)
+            self.cache.set(self.cache_key(snapshot), pdf)
+        return pdf
+
+
+invoice_renderer = InvoiceRenderer(
+    max_workers=settings.INVOICE_RENDER_WORKERS,
+    max_pending=settings.INVOICE_RENDER_QUEUE_SIZE,
+)
@@ -0,0 +1,81 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from restaurant_app.exports import COUPON_EXPORT_COLUMNS, CSVRenderer, stream_queryset
+from restaurant_app.models import CouponCampaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark generating, exporting and revoking a coupon campaign against "
+        "a scratch SQLite database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_coupon_campaign only supports the SQLite backend.")
+
+        # Point the default alias at a throwaway file so the real data is untouched
+        scratch_dir = tempfile.mkdtemp(prefix="bench_coupons_")
+        db_settings = connections.settings["default"]
+        original = dict(db_settings)
+        connection.close()
+        db_settings["NAME"] = Path(scratch_dir) / "bench.sqlite3"
+        db_settings["OPTIONS"] = dict(settings.SQLITE_PRODUCTION_OPTIONS)
+        try:
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            self.run_benchmark(options)
+        finally:
+            connection.close()
+            db_settings.clear()
+            db_settings.update(original)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def run_benchmark(self, options):
+        now = timezone.now()
+        campaign = CouponCampaign.objects.create(
+            name="Bench",
+            prefix="BENCH",
+            code_count=options["count"],
+            discount_amount=5,
+            start_date=now,
+            end_date=now + timedelta(days=30),
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            created = campaign.generate_codes()
+            generate = time.perf_counter() - started
+        self.stdout.write(
+            f"generate: {created} codes in {generate:.2f}s "
+            f"({created / generate:.0f} codes/s, {len(queries)} queries)"
+        )
+
+        started = time.perf_counter()
+        response = stream_queryset(
+            campaign.coupons.order_by("id"), COUPON_EXPORT_COLUMNS, CSVRenderer.format, "bench"
+        )
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        export = time.perf_counter() - started
+        self.stdout.write(f"export: {size / 1024:.0f} KiB CSV in {export:.2f}s")
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            revoked = campaign.revoke()
+            revoke = time.perf_counter() - started
+        self.stdout.write(
+            f"revoke: {revoked} codes in {revoke:.2f}s ({len(queries)} queries)"
+        )
@@ -0,0 +1,151 @@
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from rest_framework.test import APIClient
+
+from restaurant_app.models import Category, Dish, User
+from restaurant_app.search import DishSearchIndex
+
+
+STYLES = ["kerala", "hyderabadi", "malabar", "chettinad", "punjabi", "arabic", "thai", "chinese"]
+PREPARATIONS = ["spicy", "crispy", "grilled", "roasted", "butter", "pepper", "garlic", "tandoori"]
+INGREDIENTS = ["chicken", "mutton", "fish", "paneer", "beef", "prawns", "egg", "vegetable", "mushroom"]
+DISHES = ["biryani", "curry", "mandi", "shawarma", "noodles", "fried rice", "tikka", "kebab",
+          "masala", "soup", "salad", "pathiri", "puttu", "dosa", "roll", "sandwich"]
+CATEGORIES = ["Mains", "Starters", "Rice", "Breads", "Breakfast", "Snacks", "Soups", "Grill"]
+DESCRIPTION_WORDS = ["served", "with", "fresh", "house", "sauce", "slow", "cooked", "herbs",
+                     "yogurt", "chutney", "onions", "lemon", "coriander", "cashew", "coconut"]
+
+TYPED_QUERIES = [
+    "chicken biryani",
+    "spicy paneer tikka",
+    "hyderabadi mutton",
+    "chiken biriyani",
+    "crispy prawns roll",
+]
+
+# Broad queries that match a large share of the menu, for the HTTP timing
+BROAD_QUERIES = ["chicken", "curry", "spicy", "ch"]
+
+
+class Command(BaseCommand):
+    help = "Measure per-keystroke dish search latency on a synthetic menu."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dishes", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument(
+            "--http",
+            action="store_true",
+            help="Also time GET /api/dishes/?search= end to end on a scratch SQLite database.",
+        )
+
+    def handle(self, *args, **options):
+        rows = self.make_rows(options)
+        self.bench_index(rows)
+        if options["http"]:
+            self.bench_http(rows)
+
+    def make_rows(self, options):
+        rng = random.Random(options["seed"])
+        return [
+            (
+                dish_id,
+                " ".join(
+                    [rng.choice(STYLES), rng.choice(PREPARATIONS), rng.choice(INGREDIENTS),
+                     rng.choice(DISHES), str(dish_id)]
+                ),
+                " ".join(rng.sample(DESCRIPTION_WORDS, 6)),
+                rng.choice(CATEGORIES),
+            )
+            for dish_id in range(1, options["dishes"] + 1)
+        ]
+
+    def bench_index(self, rows):
+        started = time.perf_counter()
+        index = DishSearchIndex(rows)
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f"Indexed {len(index)} dishes ({len(index.vocabulary)} terms) in {build_ms:.0f} ms"
+        )
+
+        names = {dish_id: name for dish_id, name, _, _ in rows}
+        latencies = []
+        for query in TYPED_QUERIES:
+            # The POS starts searching from the second character
+            for length in range(2, len(query) + 1):
+                prefix = query[:length]
+                started = time.perf_counter()
+                results = index.search(prefix)
+                latencies.append((time.perf_counter() - started) * 1000)
+            top = names[results[0]] if results else "-"
+            self.stdout.write(f"{query!r}: {len(results)} matches, top: {top}")
+
+        self.stdout.write(
+            f"Per keystroke over {len(latencies)} keystrokes: "
+            f"p50={statistics.median(latencies):.2f} ms "
+            f"p95={statistics.quantiles(latencies, n=20)[-1]:.2f} ms "
+            f"max={max(latencies):.2f} ms"
+        )
+
+    def bench_http(self, rows):
+        if connection.vendor != "sqlite":
+            raise CommandError("--http only supports the SQLite backend.")
+
+        # Point the default alias at a throwaway file so the real data is untouched
+        scratch_dir = tempfile.mkdtemp(prefix="bench_search_")
+        db_settings = connections.settings["default"]
+        original = dict(db_settings)
+        connection.close()
+        db_settings["NAME"] = Path(scratch_dir) / "bench.sqlite3"
+        db_settings["OPTIONS"] = dict(settings.SQLITE_PRODUCTION_OPTIONS)
+        try:
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            self.run_http_benchmark(rows)
+        finally:
+            connection.close()
+            db_settings.clear()
+            db_settings.update(original)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def run_http_benchmark(self, rows):
+        categories = {
+            name: Category.objects.create(name=name) for name in {row[3] for row in rows}
+        }
+        Dish.objects.bulk_create(
+            [
+                Dish(id=dish_id, name=name, description=description, price=10,
+                     category=categories[category])
+                for dish_id, name, description, category in rows
+            ],
+            batch_size=2000,
+        )
+        client = APIClient()
+        client.force_authenticate(
+            User.objects.create_user(
+                username="bench", password="bench-pass", passcode="000000", role="staff"
+            )
+        )
+        client.get("/api/dishes/", {"search": "warm up"})  # builds the search index
+
+        for query in BROAD_QUERIES:
+            timings = []
+            for page in (1, 2, 50):
+                started = time.perf_counter()
+                # A fresh URL each time, so the catalog response cache never answers
+                response = client.get(
+                    "/api/dishes/", {"search": query, "page": page, "nocache": time.time_ns()}
+                )
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"GET /api/dishes/?search={query}: {response.data.get('count', 0)} matches, "
+                f"pages 1/2/50 in " + "/".join(f"{ms:.0f}" for ms in timings) + " ms"
+            )
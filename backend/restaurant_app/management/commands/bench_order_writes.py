@@ -0,0 +1,117 @@
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from restaurant_app.models import Category, Dish, User
+from restaurant_app.serializers import OrderSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent order creation against a scratch SQLite database, "
+        "with or without the production pragmas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=50, help="Orders per thread")
+        parser.add_argument("--items", type=int, default=5, help="Items per order")
+        parser.add_argument(
+            "--mode", choices=["default", "production"], default="production"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_order_writes only supports the SQLite backend.")
+
+        # Point the default alias at a throwaway file so the real data is untouched
+        scratch_dir = tempfile.mkdtemp(prefix="bench_orders_")
+        db_settings = connections.settings["default"]
+        original = dict(db_settings)
+        connection.close()
+        db_settings["NAME"] = Path(scratch_dir) / "bench.sqlite3"
+        db_settings["OPTIONS"] = (
+            dict(settings.SQLITE_PRODUCTION_OPTIONS)
+            if options["mode"] == "production"
+            else {}
+        )
+        try:
+            call_command("migrate", run_syncdb=True, verbosity=0)
+            self.run_benchmark(options)
+        finally:
+            connection.close()
+            db_settings.clear()
+            db_settings.update(original)
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    def run_benchmark(self, options):
+        user = User.objects.create_user(
+            username="bench", password="bench-pass", passcode="000000", role="staff"
+        )
+        category = Category.objects.create(name="Bench")
+        dishes = Dish.objects.bulk_create(
+            [Dish(name=f"Dish {i}", price=10, category=category) for i in range(50)]
+        )
+        payload = {
+            "total_amount": "0.00",
+            "order_type": "dining",
+            "items": [
+                {"dish": dishes[i % len(dishes)].id, "quantity": 1}
+                for i in range(options["items"])
+            ],
+        }
+        context = {"request": SimpleNamespace(user=user)}
+
+        latencies = []
+        failures = []
+        start_barrier = threading.Barrier(options["threads"])
+
+        def writer():
+            close_old_connections()
+            start_barrier.wait()
+            try:
+                for _ in range(options["orders"]):
+                    started = time.perf_counter()
+                    try:
+                        serializer = OrderSerializer(data=payload, context=context)
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                    except OperationalError as exc:
+                        failures.append(str(exc))
+                        continue
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f"Every order failed, e.g. {failures[0]}")
+        latencies.sort()
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        self.stdout.write(
+            f"mode={options['mode']} threads={options['threads']} "
+            f"orders={len(latencies)} failed={len(failures)} "
+            f"elapsed={elapsed:.2f}s throughput={len(latencies) / elapsed:.1f} orders/s"
+        )
+        self.stdout.write(
+            f"latency ms: p50={statistics.median(latencies) * 1000:.1f} "
+            f"p95={p95 * 1000:.1f} max={latencies[-1] * 1000:.1f}"
+        )
+        if failures:
+            self.stdout.write(self.style.WARNING(f"First failure: {failures[0]}"))
@@ -0,0 +1,62 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from restaurant_app.models import CouponCampaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Create a coupon campaign and generate its single-use codes; run it "
+        "again to finish a campaign whose generation was interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name")
+        parser.add_argument("prefix", help="Letters and digits; codes look like PREFIX-XXXXXXXXXX.")
+        parser.add_argument("--count", type=int, required=True)
+        parser.add_argument("--days", type=int, default=30, help="How long the codes stay valid.")
+        parser.add_argument("--discount-amount", type=Decimal, default=Decimal("0"))
+        parser.add_argument("--discount-percentage", type=Decimal)
+        parser.add_argument("--min-purchase-amount", type=Decimal)
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"].upper()
+        if not prefix.isalnum():
+            raise CommandError("The prefix may only contain letters and digits.")
+        if options["count"] < 1:
+            raise CommandError("--count must be at least 1.")
+        existing = CouponCampaign.objects.filter(prefix=prefix).first()
+        if existing is not None and existing.status == "generating":
+            # Running the same command again finishes an interrupted run
+            existing.complete()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Completed campaign {existing.pk} with {existing.code_count} codes."
+                )
+            )
+            return
+        if existing is not None:
+            raise CommandError(f"A campaign with prefix {prefix} already exists.")
+
+        now = timezone.now()
+        campaign = CouponCampaign.create_with_codes(
+            name=options["name"],
+            prefix=prefix,
+            code_count=options["count"],
+            discount_amount=options["discount_amount"],
+            discount_percentage=options["discount_percentage"],
+            min_purchase_amount=options["min_purchase_amount"],
+            start_date=now,
+            end_date=now + timedelta(days=options["days"]),
+            progress=lambda done: self.stdout.write(f"{done}/{options['count']}")
+            if options["verbosity"] > 1
+            else None,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created campaign {campaign.pk} with {campaign.code_count} codes."
+            )
+        )
@@ -0,0 +1,57 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from restaurant_app.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than --days, optionally appending them "
+        "to a JSON-lines archive first. Unread notifications are always kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.NOTIFICATION_RETENTION_DAYS,
+            help="How many days of read notifications to keep.",
+        )
+        parser.add_argument("--archive", help="Append pruned notifications to this file.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows deleted per statement, to keep write locks short.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+        archive = open(options["archive"], "a") if options["archive"] else None
+        deleted = 0
+        try:
+            while True:
+                batch = list(
+                    expired.order_by("created_at").values(
+                        "id", "user_id", "message", "template", "params", "created_at"
+                    )[: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                if archive is not None:
+                    for row in batch:
+                        row["created_at"] = row["created_at"].isoformat()
+                        archive.write(json.dumps(row) + "\n")
+                    archive.flush()
+                deleted += Notification.objects.filter(
+                    id__in=[row["id"] for row in batch]
+                ).delete()[0]
+        finally:
+            if archive is not None:
+                archive.close()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} read notifications."))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from restaurant_app.models import RealtimeEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete realtime events older than the resume window. Clients that "
+        "reconnect with an older Last-Event-ID simply resume from the oldest kept event."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours", type=int, default=24, help="How many hours of events to keep."
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["hours"])
+        deleted, _ = RealtimeEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} realtime events."))
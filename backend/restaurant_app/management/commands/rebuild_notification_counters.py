@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from restaurant_app.models import Notification, NotificationCounter
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount unread notifications per recipient. Run once after upgrading, "
+        "or whenever the unread badge looks wrong."
+    )
+
+    def handle(self, *args, **options):
+        rows = (
+            Notification.objects.filter(is_read=False)
+            .values("user_id")
+            .annotate(unread=Count("id"))
+            .order_by()
+        )
+        with transaction.atomic():
+            NotificationCounter.objects.all().delete()
+            created = NotificationCounter.objects.bulk_create(
+                NotificationCounter(recipient=row["user_id"] or 0, unread=row["unread"])
+                for row in rows
+            )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(created)} notification counters."))
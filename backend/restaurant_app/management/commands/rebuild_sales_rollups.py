@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils.dateparse import parse_date
+
+from restaurant_app.models import DishSalesRollup, Order, OrderItem, SalesRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly sales rollups used by the dashboard from raw orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from-date", help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--to-date", help="Last day to rebuild (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def parse_day(self, value, option):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format")
+        return day
+
+    def handle(self, *args, **options):
+        from_date = self.parse_day(options["from_date"], "--from-date")
+        to_date = self.parse_day(options["to_date"], "--to-date")
+        batch_size = options["batch_size"]
+
+        orders = Order.objects.exclude(status="cancelled")
+        rollups = SalesRollup.objects.all()
+        dish_rollups = DishSalesRollup.objects.all()
+        if from_date:
+            orders = orders.filter(created_at__date__gte=from_date)
+            rollups = rollups.filter(date__gte=from_date)
+            dish_rollups = dish_rollups.filter(date__gte=from_date)
+        if to_date:
+            orders = orders.filter(created_at__date__lte=to_date)
+            rollups = rollups.filter(date__lte=to_date)
+            dish_rollups = dish_rollups.filter(date__lte=to_date)
+
+        order_rows = (
+            orders.annotate(date=TruncDate("created_at"), hour=ExtractHour("created_at"))
+            .values("date", "hour", "order_type", "payment_method")
+            .annotate(order_count=Count("id"), total_sales=Sum("total_amount"))
+            .order_by()
+        )
+        item_rows = (
+            OrderItem.objects.filter(order__in=orders)
+            .annotate(
+                date=TruncDate("order__created_at"), hour=ExtractHour("order__created_at")
+            )
+            .values("date", "hour", "dish_id")
+            .annotate(line_count=Count("id"), quantity=Sum("quantity"))
+            .order_by()
+        )
+
+        with transaction.atomic():
+            rollups.delete()
+            dish_rollups.delete()
+            created = SalesRollup.objects.bulk_create(
+                (SalesRollup(**row) for row in order_rows), batch_size=batch_size
+            )
+            dish_created = DishSalesRollup.objects.bulk_create(
+                (DishSalesRollup(**row) for row in item_rows), batch_size=batch_size
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(created)} sales rollups and {len(dish_created)} dish rollups."
+            )
+        )
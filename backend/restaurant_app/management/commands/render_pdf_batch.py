@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from restaurant_app.pdf_batches import render_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every invoice in a date range, or every credit statement for a "
+        "period, across a process pool into one merged PDF or a zip, e.g. "
+        "python manage.py render_pdf_batch invoices --from-date 2024-05-01 -o may.pdf"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["invoices", "statements"])
+        parser.add_argument("--from-date", help="First day (YYYY-MM-DD), default today")
+        parser.add_argument("--to-date", help="Last day (YYYY-MM-DD), default --from-date")
+        parser.add_argument("--format", choices=["pdf", "zip"], default="pdf")
+        parser.add_argument("-o", "--output", help="Output file, default <kind>-<from>-<to>.<format>")
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Worker processes, default one per core"
+        )
+
+    def parse_day(self, value, option):
+        try:
+            day = parse_date(value)
+        except ValueError:  # well formed but impossible, e.g. 2024-02-30
+            day = None
+        if day is None:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format")
+        return day
+
+    def handle(self, *args, **options):
+        from_date = (
+            self.parse_day(options["from_date"], "--from-date")
+            if options["from_date"]
+            else timezone.localdate()
+        )
+        to_date = (
+            self.parse_day(options["to_date"], "--to-date") if options["to_date"] else from_date
+        )
+        if from_date > to_date:
+            raise CommandError("--from-date must not be after --to-date")
+
+        kind, output_format = options["kind"], options["format"]
+        path = options["output"] or f"{kind}-{from_date}-{to_date}.{output_format}"
+
+        def progress(done, total, pages):
+            self.stdout.write(f"{done}/{total} {kind} rendered ({pages} pages)")
+
+        with open(path, "wb") as output:
+            stats = render_batch(
+                kind, from_date, to_date, output_format, output,
+                workers=options["workers"], progress=progress,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {stats['documents']} {kind} ({stats['pages']} pages) to {path} "
+                f"in {stats['seconds']:.1f}s, {stats['pages_per_second']} pages/s."
+            )
+        )
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from restaurant_app.messaging import FakeTransport, MessageWorker
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued SMS/WhatsApp messages from the outbox in batches. Runs "
+        "until interrupted unless --once is given. --fake sends through the "
+        "in-process fake transport, to measure throughput and retries offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Send what is due, then exit.")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--interval", type=float, default=2.0, help="Seconds to sleep when nothing is due."
+        )
+        parser.add_argument("--concurrency", type=int, default=None)
+        parser.add_argument("--fake", action="store_true", help="Use the fake transport.")
+        parser.add_argument("--fake-latency", type=float, default=0.05)
+        parser.add_argument("--fake-failure-rate", type=float, default=0.0)
+
+    def handle(self, *args, **options):
+        transport = None
+        if options["fake"]:
+            transport = FakeTransport(
+                latency=options["fake_latency"], failure_rate=options["fake_failure_rate"]
+            )
+        worker = MessageWorker(
+            transport=transport,
+            batch_size=options["batch_size"],
+            concurrency=options["concurrency"],
+        )
+
+        totals = [0, 0, 0]
+        started = time.perf_counter()
+        try:
+            while True:
+                batch_started = time.perf_counter()
+                counts = worker.run_once()
+                if any(counts):
+                    totals = [total + count for total, count in zip(totals, counts)]
+                    elapsed = time.perf_counter() - batch_started
+                    self.stdout.write(
+                        "sent={} retry={} failed={} ({:.1f} msg/s)".format(
+                            *counts, sum(counts) / elapsed if elapsed else 0
+                        )
+                    )
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Done: sent={} retry={} failed={} in {:.1f}s".format(*totals, elapsed)
+            )
+        )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Sum
+
+from restaurant_app.models import CreditBalanceSnapshot, CreditLedgerEntry, CreditUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot credit ledger balances so balance and statement lookups only "
+        "sum the entries after the latest snapshot. Meant to run periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=200,
+            help="Snapshot customers with this many entries since their last snapshot.",
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="First record opening entries for balances that predate the ledger.",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            pre_ledger = CreditUser.objects.exclude(total_due=0).filter(
+                ledger_entries__isnull=True
+            )
+            opening = [
+                CreditLedgerEntry(
+                    credit_user=credit_user, entry_type="opening", amount=credit_user.total_due
+                )
+                for credit_user in pre_ledger
+            ]
+            CreditLedgerEntry.objects.bulk_create(opening)
+            self.stdout.write(f"Recorded {len(opening)} opening balances.")
+
+        created = 0
+        for credit_user in CreditUser.objects.only("id").iterator():
+            snapshot = credit_user.balance_snapshots.order_by("-last_entry_id").first()
+            tail = credit_user.ledger_entries.all()
+            if snapshot is not None:
+                tail = tail.filter(id__gt=snapshot.last_entry_id)
+            totals = tail.aggregate(
+                count=Count("id"),
+                amount=Sum("amount"),
+                last_id=Max("id"),
+                last_at=Max("created_at"),
+            )
+            if totals["count"] < options["every"]:
+                continue
+            CreditBalanceSnapshot.objects.create(
+                credit_user=credit_user,
+                last_entry_id=totals["last_id"],
+                balance=(snapshot.balance if snapshot else 0) + totals["amount"],
+                created_at=totals["last_at"],
+            )
+            created += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {created} balance snapshots."))
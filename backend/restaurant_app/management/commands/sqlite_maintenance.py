@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Checkpoint the WAL, refresh planner statistics and optionally VACUUM the "
+        "SQLite database. Meant to be scheduled, e.g. nightly from cron: "
+        "python manage.py sqlite_maintenance --vacuum"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="Also rebuild the database file. Blocks writers while it runs.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("sqlite_maintenance only supports the SQLite backend.")
+
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            busy, log_frames, checkpointed = cursor.fetchone()
+            self.stdout.write(
+                f"WAL checkpoint: busy={busy} log_frames={log_frames} "
+                f"checkpointed={checkpointed}"
+            )
+
+            cursor.execute("ANALYZE")
+            cursor.execute("PRAGMA optimize")
+            self.stdout.write("Planner statistics refreshed.")
+
+            if options["vacuum"]:
+                cursor.execute("VACUUM")
+                self.stdout.write("Database vacuumed.")
+
+        self.stdout.write(self.style.SUCCESS("SQLite maintenance complete."))
@@ -0,0 +1,205 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+class MessageSendError(Exception):
+    """Raised by transports. ``retry`` is False for errors that will not go
+    away by themselves, such as an invalid number."""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class TwilioTransport:
+    """Sends through Twilio with one client, and so one HTTP session, per worker."""
+
+    def __init__(self):
+        from twilio.rest import Client
+
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+    def send(self, message):
+        from twilio.base.exceptions import TwilioRestException
+
+        sender = settings.TWILIO_PHONE_NUMBER
+        if message.channel == "whatsapp":
+            sender = f"whatsapp:{sender}"
+        try:
+            sent = self.client.messages.create(
+                body=message.body, from_=sender, to=message.to_number
+            )
+        except TwilioRestException as e:
+            raise MessageSendError(str(e), retry=e.status == 429 or e.status >= 500)
+        except Exception as e:
+            # Timeouts and connection errors
+            raise MessageSendError(str(e))
+        return sent.sid
+
+
+class FakeTransport:
+    """In-process transport for tests and offline benchmarks.
+
+    ``latency`` seconds are spent per send, ``failure_rate`` of sends fail with
+    a retryable error, and numbers listed in ``rejected_numbers`` fail for good.
+    """
+
+    def __init__(self, latency=0, failure_rate=0, rejected_numbers=(), seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rejected_numbers = set(rejected_numbers)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sent = []
+        self.attempts = 0
+
+    def send(self, message):
+        with self.lock:
+            self.attempts += 1
+            failed = self.random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if message.to_number in self.rejected_numbers:
+            raise MessageSendError("Invalid 'To' number", retry=False)
+        if failed:
+            raise MessageSendError("Provider unavailable")
+        with self.lock:
+            self.sent.append((message.to_number, message.body))
+            return f"FAKE{len(self.sent)}"
+
+
+def get_transport():
+    return import_string(settings.MESSAGE_TRANSPORT)()
+
+
+def queue_message(to_number, body, channel="whatsapp", dedupe_key=None):
+    """Add a message to the outbox; the message worker sends it.
+
+    Returns the queued OutboundMessage, or the existing one when a message
+    with the same ``dedupe_key`` was already queued.
+    """
+    from restaurant_app.models import OutboundMessage
+
+    if dedupe_key is None:
+        return OutboundMessage.objects.create(to_number=to_number, body=body, channel=channel)
+    message, _ = OutboundMessage.objects.get_or_create(
+        dedupe_key=dedupe_key,
+        defaults={"to_number": to_number, "body": body, "channel": channel},
+    )
+    return message
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: ~base, 2x base, 4x base ... capped at an hour."""
+    delay = settings.MESSAGE_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return min(delay, 3600) * random.uniform(0.8, 1.2)
+
+
+class MessageWorker:
+    """Claims due outbox messages in batches and sends them over one transport.
+
+    Claims are leased: a message left in "sending" by a crashed worker is
+    picked up again once the lease expires.
+    """
+
+    lease = timedelta(minutes=5)
+
+    def __init__(self, transport=None, batch_size=100, concurrency=None):
+        self.transport = transport or get_transport()
+        self.batch_size = batch_size
+        self.concurrency = concurrency or settings.MESSAGE_SEND_CONCURRENCY
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="message-send"
+        )
+
+    def claim_batch(self):
+        from restaurant_app.models import OutboundMessage
+
+        now = timezone.now()
+        due = OutboundMessage.objects.filter(
+            Q(status="pending", next_attempt_at__lte=now)
+            | Q(status="sending", claimed_at__lt=now - self.lease)
+        )
+        ids = list(
+            due.order_by("next_attempt_at", "id").values_list("id", flat=True)[: self.batch_size]
+        )
+        if not ids:
+            return []
+        # The status condition makes the claim safe against a concurrent worker
+        claimed = OutboundMessage.objects.filter(id__in=ids).filter(
+            Q(status="pending") | Q(status="sending", claimed_at__lt=now - self.lease)
+        )
+        claimed.update(status="sending", claimed_at=now)
+        return list(
+            OutboundMessage.objects.filter(id__in=ids, status="sending", claimed_at=now)
+        )
+
+    def send_one(self, message):
+        try:
+            return message, self.transport.send(message), None
+        except MessageSendError as e:
+            return message, None, e
+
+    def run_once(self):
+        """Send one batch; returns (sent, retried, failed) counts."""
+        from restaurant_app.models import OutboundMessage
+
+        messages = self.claim_batch()
+        if not messages:
+            return 0, 0, 0
+
+        # Identical messages to the same number in one batch are sent once
+        unique, duplicates = {}, []
+        for message in messages:
+            key = (message.channel, message.to_number, message.body)
+            if key in unique:
+                duplicates.append((message, unique[key]))
+            else:
+                unique[key] = message
+
+        now = timezone.now()
+        sent = retried = failed = 0
+        for message, provider_id, error in self.executor.map(self.send_one, unique.values()):
+            message.attempts += 1
+            message.claimed_at = None
+            if error is None:
+                message.status = "sent"
+                message.provider_id = provider_id
+                message.sent_at = now
+                message.last_error = ""
+                sent += 1
+            elif error.retry and message.attempts < settings.MESSAGE_MAX_ATTEMPTS:
+                message.status = "pending"
+                message.next_attempt_at = now + timedelta(seconds=retry_delay(message.attempts))
+                message.last_error = str(error)
+                retried += 1
+            else:
+                message.status = "failed"
+                message.last_error = str(error)
+                failed += 1
+                logger.warning("Giving up on message %s: %s", message.id, error)
+
+        for duplicate, original in duplicates:
+            for field in ("status", "provider_id", "sent_at", "last_error", "next_attempt_at"):
+                setattr(duplicate, field, getattr(original, field))
+            duplicate.claimed_at = None
+            duplicate.last_error = f"Duplicate of message {original.id}"
+
+        OutboundMessage.objects.bulk_update(
+            messages,
+            ["status", "attempts", "claimed_at", "provider_id", "sent_at",
+             "next_attempt_at", "last_error"],
+        )
+        return sent, retried, failed
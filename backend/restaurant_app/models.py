@@ -1,10 +1,32 @@
+import secrets
+from collections import defaultdict
 from datetime import timedelta
-from django.db import models,transaction
+from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models import (
+    Case,
+    DecimalField,
+    F,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
+from .catalog import bump_catalog_version
+from .coupons import bump_coupon_version
+from .floorplan import bump_floor_version
+from .notifications import notify, render_notification
+from .realtime import publish_event
 from .utils import default_time_period
 
 
@@ -87,6 +109,12 @@ class Dish(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get("price")
+        return instance
+
 
 class DishVariant(models.Model):
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name="variants")
@@ -96,6 +124,16 @@ class DishVariant(models.Model):
         return f"{self.name} ({self.dish.name})"
 
 
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Dish)
+@receiver(post_delete, sender=Dish)
+@receiver(post_save, sender=DishVariant)
+@receiver(post_delete, sender=DishVariant)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
@@ -142,25 +180,118 @@ class Order(models.Model):
     delivery_driver_id = models.IntegerField(null=True, blank=True)
     credit_user_id = models.IntegerField(null=True, blank=True)
     kitchen_note = models.TextField(blank=True)
+    table = models.ForeignKey(
+        "Table", related_name="orders", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    coupon = models.ForeignKey(
+        "Coupon", related_name="orders", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            # Order lists hide cancelled orders and page by created_at
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=~Q(status="cancelled"),
+                name="order_open_created_idx",
+            ),
+            models.Index(
+                fields=["order_type", "-created_at"],
+                condition=~Q(status="cancelled"),
+                name="order_open_type_created_idx",
+            ),
+            models.Index(
+                fields=["customer_phone_number", "-created_at"],
+                name="order_phone_created_idx",
+            ),
+            # sales_report filters
+            models.Index(
+                fields=["payment_method", "created_at"],
+                name="order_payment_created_idx",
+            ),
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.id} - {self.created_at} - {self.order_type}"
 
     def save(self, *args, **kwargs):
+        if self._state.adding and not self.invoice_number:
+            # The number is taken in the insert's transaction, so an insert
+            # that fails hands it back and the sequence stays gap-free
+            with transaction.atomic():
+                self.invoice_number = InvoiceSequence.next_invoice_number()
+                super().save(*args, **kwargs)
+            return
         super().save(*args, **kwargs)
 
-        if not self.invoice_number:
-            self.invoice_number = (
-                f"{self.id:04d}"  # Generates an invoice number with leading zeros
-            )
-            self.save(update_fields=["invoice_number"])
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the order contributed to the sales rollups when loaded
+        instance._rollup_state = instance.get_rollup_state()
+        instance._loaded_status = instance.status
+        instance._loaded_table_status = instance.status
+        return instance
 
     def is_delivery_order(self):
         return self.order_type == "delivery"
 
+    def get_rollup_state(self):
+        """Return the rollup bucket and amount this order counts towards,
+        or None when it is not counted (cancelled or unsaved)."""
+        if self.status == "cancelled" or self.created_at is None:
+            return None
+        created_at = timezone.localtime(self.created_at)
+        return (
+            (created_at.date(), created_at.hour, self.order_type, self.payment_method),
+            self.total_amount,
+        )
+
+
+class InvoiceSequence(models.Model):
+    """Last invoice number handed out per sequence: one row per branch, or per
+    branch and day when numbers reset daily."""
+
+    key = models.CharField(max_length=40, unique=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.last_number}"
+
+    @classmethod
+    def allocate(cls, key, seed=None):
+        """Take the next number of ``key``. Call inside the transaction that uses it.
+
+        The increment locks the row until that transaction ends, which orders
+        concurrent processes; a rollback undoes it. ``seed()`` gives the
+        starting point of a sequence that does not exist yet.
+        """
+        if not cls.objects.filter(key=key).update(last_number=F("last_number") + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, last_number=(seed() if seed else 0) + 1)
+            except IntegrityError:
+                # Another process started the sequence first
+                cls.objects.filter(key=key).update(last_number=F("last_number") + 1)
+        return cls.objects.filter(key=key).values_list("last_number", flat=True).get()
+
+    @classmethod
+    def next_invoice_number(cls, day=None):
+        branch = settings.INVOICE_BRANCH_CODE
+        if settings.INVOICE_NUMBER_RESET == "daily":
+            day = day or timezone.localdate()
+            number = cls.allocate(f"{branch}:{day:%Y-%m-%d}")
+            return f"{branch}{day:%y%m%d}-{number:04d}"
+        # Orders numbered before the sequence existed used their id
+        number = cls.allocate(
+            f"{branch}:all",
+            seed=lambda: Order.objects.aggregate(last=Max("id"))["last"] or 0,
+        )
+        return f"{branch}{number:04d}"
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -173,6 +304,131 @@ class OrderItem(models.Model):
         return f"{self.order.id} - {self.dish} - {self.quantity}"
 
 
+class RollupQuerySet(models.QuerySet):
+    def in_window(self, start, end):
+        """Buckets whose hour falls between two datetimes, skipping emptied ones."""
+        start = timezone.localtime(start)
+        end = timezone.localtime(end)
+        return self.filter(
+            Q(date__gt=start.date()) | Q(date=start.date(), hour__gte=start.hour),
+            Q(date__lt=end.date()) | Q(date=end.date(), hour__lte=end.hour),
+            **{f"{self.model.COUNT_FIELD}__gt": 0},
+        )
+
+
+class SalesRollup(models.Model):
+    """Hourly order totals, kept up to date by the Order signals below and
+    rebuilt from scratch with the ``rebuild_sales_rollups`` command."""
+
+    COUNT_FIELD = "order_count"
+
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    order_type = models.CharField(max_length=20, choices=Order.ORDER_TYPE_CHOICES)
+    payment_method = models.CharField(
+        max_length=20, choices=Order.PAYMENT_METHOD_CHOICES
+    )
+    order_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("date", "hour")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "hour", "order_type", "payment_method"],
+                name="unique_sales_rollup_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 - {self.order_type}/{self.payment_method}"
+
+    @classmethod
+    def apply(cls, state, sign):
+        if state is None:
+            return
+        (date, hour, order_type, payment_method), amount = state
+        bucket = dict(
+            date=date, hour=hour, order_type=order_type, payment_method=payment_method
+        )
+        cls.objects.bulk_create([cls(**bucket)], ignore_conflicts=True)
+        cls.objects.filter(**bucket).update(
+            order_count=F("order_count") + sign,
+            total_sales=F("total_sales") + sign * amount,
+        )
+
+
+class DishSalesRollup(models.Model):
+    """Hourly order lines and quantities per dish, for top dishes and category sales."""
+
+    COUNT_FIELD = "line_count"
+
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name="sales_rollups")
+    line_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("date", "hour")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "hour", "dish"], name="unique_dish_sales_rollup_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 - {self.dish_id}"
+
+    @classmethod
+    def apply(cls, state, lines, sign):
+        """Add (or with sign=-1 remove) ``{dish_id: (line_count, quantity)}`` in
+        the bucket of an order's rollup state, in two queries for any number of dishes."""
+        if state is None or not lines:
+            return
+        (date, hour, _, _), _ = state
+        cls.objects.bulk_create(
+            [cls(date=date, hour=hour, dish_id=dish_id) for dish_id in lines],
+            ignore_conflicts=True,
+        )
+        line_counts = [
+            When(dish_id=dish_id, then=Value(sign * count))
+            for dish_id, (count, _) in lines.items()
+        ]
+        quantities = [
+            When(dish_id=dish_id, then=Value(sign * quantity))
+            for dish_id, (_, quantity) in lines.items()
+        ]
+        cls.objects.filter(date=date, hour=hour, dish_id__in=lines).update(
+            line_count=F("line_count") + Case(*line_counts, output_field=models.IntegerField()),
+            quantity=F("quantity") + Case(*quantities, output_field=models.IntegerField()),
+        )
+
+    @classmethod
+    def lines_for_items(cls, items):
+        lines = {}
+        for item in items:
+            dish_id = item.dish_id
+            count, quantity = lines.get(dish_id, (0, 0))
+            lines[dish_id] = (count + 1, quantity + item.quantity)
+        return lines
+
+    @classmethod
+    def lines_for_order(cls, order):
+        rows = (
+            order.items.order_by()
+            .values("dish_id")
+            .annotate(line_count=models.Count("id"), total_quantity=models.Sum("quantity"))
+        )
+        return {
+            row["dish_id"]: (row["line_count"], row["total_quantity"]) for row in rows
+        }
+
+
 class Bill(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="bills")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bills")
@@ -182,6 +438,7 @@ class Bill(models.Model):
 
     class Meta:
         ordering = ("-billed_at",)
+        indexes = [models.Index(fields=["-billed_at", "-id"], name="bill_billed_at_idx")]
 
     def __str__(self):
         return f"Bill for order {self.order.id}"
@@ -204,31 +461,216 @@ class Notification(models.Model):
         null=True,
         blank=True,
     )
-    message = models.TextField()
+    # Free text, or empty for notifications stored as a template id and params
+    message = models.TextField(blank=True)
+    template = models.CharField(max_length=50, blank=True)
+    params = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="notification_created_idx"),
+            models.Index(
+                fields=["-created_at"],
+                condition=Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+            # prune_notifications
+            models.Index(
+                fields=["created_at"],
+                condition=Q(is_read=True),
+                name="notification_read_idx",
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.message[:50]}..."
+        return f"{self.get_message()[:50]}..."
+
+    def get_message(self):
+        if self.template:
+            return render_notification(self.template, self.params)
+        return self.message
+
+    def to_event(self):
+        return {
+            "id": self.id,
+            "message": self.get_message(),
+            "user": self.user_id,
+            "created_at": self.created_at.isoformat(),
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_read = instance.is_read
+        return instance
+
+    @staticmethod
+    def visible_to(user):
+        """Notifications for everyone plus those addressed to ``user``."""
+        return Q(user__isnull=True) | Q(user=user)
+
+    @classmethod
+    def mark_read(cls, user, ids=None, before=None):
+        """Mark ``user``'s visible unread notifications read, optionally only
+        ``ids`` and/or those created at or before ``before``. One UPDATE;
+        returns the number of notifications marked."""
+        unread = cls.objects.filter(cls.visible_to(user), is_read=False)
+        if ids is not None:
+            unread = unread.filter(id__in=ids)
+        if before is not None:
+            unread = unread.filter(created_at__lte=before)
+        with transaction.atomic():
+            # Decrement by what each UPDATE actually flipped, not by a count
+            # read beforehand: a concurrent insert or a second reader marking
+            # the same rows can then never skew the counters
+            changes = {
+                0: -unread.filter(user__isnull=True).update(is_read=True),
+                user.id: -unread.filter(user=user).update(is_read=True),
+            }
+            NotificationCounter.adjust(changes)
+        return -sum(changes.values())
+
+
+class NotificationCounter(models.Model):
+    """Unread notifications per recipient, kept up to date on every insert and
+    read so the badge count never counts rows. Recipient 0 stands for
+    notifications addressed to everyone."""
+
+    recipient = models.PositiveIntegerField(unique=True)
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.recipient}: {self.unread}"
+
+    @classmethod
+    def adjust(cls, changes):
+        """Apply ``{recipient: delta}`` with a single F() UPDATE, never going
+        below zero."""
+        changes = {recipient: delta for recipient, delta in changes.items() if delta}
+        if not changes:
+            return
+        delta = Case(
+            *[When(recipient=recipient, then=Value(d)) for recipient, d in changes.items()],
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        unread = Greatest(F("unread") + delta, Value(0))
+        updated = cls.objects.filter(recipient__in=changes).update(unread=unread)
+        if updated < len(changes):
+            existing = set(
+                cls.objects.filter(recipient__in=changes).values_list("recipient", flat=True)
+            )
+            cls.objects.bulk_create(
+                [cls(recipient=recipient) for recipient in changes if recipient not in existing],
+                ignore_conflicts=True,
+            )
+            cls.objects.filter(recipient__in=changes).exclude(recipient__in=existing).update(
+                unread=unread
+            )
+
+    @classmethod
+    def unread_for(cls, user):
+        return (
+            cls.objects.filter(recipient__in=[0, user.id]).aggregate(total=Sum("unread"))["total"]
+            or 0
+        )
+
+
+class RealtimeEvent(models.Model):
+    """Append-only log behind the event stream; ids double as SSE event ids."""
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"{self.id} {self.kind}"
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification_event(sender, instance, created, **kwargs):
+    # Templated notifications are bulk inserted by notify(), which publishes them
+    if created:
+        publish_event("notification", instance.to_event())
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    was_read = True if created else getattr(instance, "_loaded_is_read", instance.is_read)
+    if was_read != instance.is_read:
+        NotificationCounter.adjust({instance.user_id or 0: 1 if was_read else -1})
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        NotificationCounter.adjust({instance.user_id or 0: -1})
+
+
+@receiver(post_save, sender=Order)
+def publish_order_status_event(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_loaded_status", None)
+    if previous == instance.status:
+        return
+    publish_event(
+        "order.created" if created else "order.status",
+        {
+            "id": instance.id,
+            "status": instance.status,
+            "order_type": instance.order_type,
+            "total_amount": str(instance.total_amount),
+        },
+    )
+    instance._loaded_status = instance.status
 
 
 @receiver(post_save, sender=Order)
 def create_notification_for_orders(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(
-            message=f"New order created: Order #{instance.id} with a total amount of ${instance.total_amount}"
-        )
+        notify("order.created", order_id=instance.id, total_amount=str(instance.total_amount))
 
 
 @receiver(post_save, sender=Bill)
 def create_notification_for_bills(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(
-            message=f"New bill #{instance.id} generated for Order #{instance.order.id}"
+        notify("bill.created", bill_id=instance.id, order_id=instance.order_id)
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_rollup_state", None)
+    current = instance.get_rollup_state()
+    if previous == current:
+        return
+
+    SalesRollup.apply(previous, -1)
+    SalesRollup.apply(current, 1)
+
+    # Items of a new order are recorded by OrderSerializer once they are inserted;
+    # here we only follow orders that start or stop counting (e.g. cancellation)
+    if not created and (previous is None) != (current is None):
+        DishSalesRollup.apply(
+            previous or current,
+            DishSalesRollup.lines_for_order(instance),
+            1 if current else -1,
         )
+    instance._rollup_state = current
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_sales_rollups(sender, instance, **kwargs):
+    state = getattr(instance, "_rollup_state", None)
+    if state is None:
+        return
+    SalesRollup.apply(state, -1)
+    DishSalesRollup.apply(state, DishSalesRollup.lines_for_order(instance), -1)
 
 
 class Floor(models.Model):
@@ -239,20 +681,239 @@ class Floor(models.Model):
 
 
 class Table(models.Model):
+    STATUS_CHOICES = [
+        ("free", "Free"),
+        ("seated", "Seated"),
+        ("billed", "Billed"),
+        ("cleaning", "Cleaning"),
+    ]
+
     table_name = models.CharField(max_length=50)
     start_time = models.TimeField(default="00:00")
     end_time = models.TimeField(default="00:00")
     seats_count = models.PositiveIntegerField()
     capacity = models.PositiveIntegerField()
     floor = models.ForeignKey(Floor, related_name="tables", on_delete=models.CASCADE)
-    is_ready = models.BooleanField(default=True)
+    is_ready = models.BooleanField(default=True)  # True exactly when status is "free"
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="free")
+    current_order = models.OneToOneField(
+        "Order", related_name="current_table", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    seated_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.table_name} - {self.floor.name}"
 
+    # State changes are conditional UPDATEs, so concurrent requests cannot
+    # undo each other; each one invalidates the occupancy index on commit
+
+    @classmethod
+    def transition(cls, tables, **changes):
+        if "status" in changes:
+            changes["is_ready"] = changes["status"] == "free"
+        updated = tables.update(**changes)
+        if updated:
+            bump_floor_version()
+        return updated
+
+    # Tables a new order may take; a seated or billed table has an open order
+    SEATABLE_STATUSES = ("free", "cleaning")
+
+    @classmethod
+    def seat(cls, table_id, order):
+        """Seat ``order`` at a free (or still uncleaned) table; 0 when the
+        table already has an open order."""
+        return cls.transition(
+            cls.objects.filter(pk=table_id, status__in=cls.SEATABLE_STATUSES),
+            status="seated",
+            current_order=order,
+            seated_at=timezone.now(),
+        )
+
+    @classmethod
+    def move(cls, order, table_id):
+        """Move an open order to another table: its old table is released and
+        the new one seated with the same conditional UPDATE as at creation.
+        False when the new table is busy; call it inside a transaction so the
+        release is undone then."""
+        cls.release(order)
+        return table_id is None or bool(cls.seat(table_id, order))
+
+    @classmethod
+    def mark_billed(cls, order):
+        return cls.transition(
+            cls.objects.filter(current_order=order, status="seated"), status="billed"
+        )
+
+    @classmethod
+    def release(cls, order):
+        """Free the table of a closed order: straight away when it was cancelled,
+        otherwise once it has been cleaned."""
+        return cls.transition(
+            cls.objects.filter(current_order=order),
+            status="free" if order.status == "cancelled" else "cleaning",
+            current_order=None,
+            seated_at=None,
+        )
+
+    @classmethod
+    def set_status(cls, table_id, status):
+        """Manual change, e.g. cleaning -> free; leaving a table ends its seating."""
+        changes = {"status": status}
+        if status in ("free", "cleaning"):
+            changes.update(current_order=None, seated_at=None)
+        elif status == "seated":
+            changes["seated_at"] = Coalesce(F("seated_at"), Value(timezone.now()))
+        return cls.transition(cls.objects.filter(pk=table_id), **changes)
+
+
+@receiver(post_save, sender=Floor)
+@receiver(post_delete, sender=Floor)
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_occupancy_index(sender, **kwargs):
+    bump_floor_version()
+
+
+@receiver(post_save, sender=Order)
+def update_table_occupancy(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_loaded_table_status", None)
+    instance._loaded_table_status = instance.status
+    if not instance.table_id or previous == instance.status:
+        return
+    if instance.status in ("delivered", "cancelled"):
+        Table.release(instance)
+    elif created:
+        # Checked by OrderSerializer, which turns a busy table into a 400
+        instance._seated = bool(Table.seat(instance.table_id, instance))
+
+
+@receiver(post_save, sender=Bill)
+def mark_table_billed(sender, instance, created, **kwargs):
+    if created:
+        Table.mark_billed(instance.order)
+
+
+class CouponCampaign(models.Model):
+    """A batch of single-use coupons sharing one set of terms; codes are
+    ``<prefix>-<random>`` so the prefix identifies the campaign."""
+
+    CODE_ALPHABET = "23456789ABCDEFGHJKLMNPQRSTUVWXYZ"  # no 0/O or 1/I/L
+    CODE_LENGTH = 10  # 32**10 ~ 1e15 codes per campaign
+    CHUNK_SIZE = 5000
+    STATUS_CHOICES = (
+        ("generating", "Generating"),
+        ("ready", "Ready"),
+    )
+
+    name = models.CharField(max_length=100)
+    prefix = models.CharField(max_length=12, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="generating")
+    code_count = models.PositiveIntegerField()
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_percentage = models.DecimalField(
+        max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    min_purchase_amount = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    start_date = models.DateTimeField(default=timezone.now)
+    end_date = models.DateTimeField()
+    created_by = models.ForeignKey(
+        User, related_name="+", on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def create_with_codes(cls, progress=None, **fields):
+        """Create a campaign and generate its codes.
+
+        Each chunk commits on its own so the database's write lock is never
+        held for the whole run. Until the last chunk is in the campaign stays
+        "generating" and none of its codes can be redeemed; a run that fails
+        part way is finished later with complete().
+        """
+        campaign = cls.objects.create(**fields)
+        campaign.complete(progress=progress)
+        return campaign
+
+    def complete(self, progress=None):
+        """Generate whatever codes are still missing and open the campaign."""
+        missing = self.code_count - self.coupons.count()
+        if missing > 0:
+            self.generate_codes(missing, progress=progress)
+        CouponCampaign.objects.filter(pk=self.pk).update(status="ready")
+        self.status = "ready"
+        bump_coupon_version()
+
+    def random_code(self):
+        # 32 symbols, so the low five bits of each random byte pick one uniformly
+        body = "".join(self.CODE_ALPHABET[b & 31] for b in secrets.token_bytes(self.CODE_LENGTH))
+        return f"{self.prefix}-{body}"
+
+    def generate_codes(self, count=None, progress=None):
+        """Insert ``count`` (default code_count) new single-use coupons with
+        bulk_create, CHUNK_SIZE at a time; returns how many were created.
+
+        Codes are unique within a chunk by construction and checked against
+        existing codes before each insert; a chunk that still collides with a
+        concurrent insert is rolled back and drawn again.
+        """
+        remaining = self.code_count if count is None else count
+        created = 0
+        while remaining:
+            size = min(remaining, self.CHUNK_SIZE)
+            codes = set()
+            while len(codes) < size:
+                codes.add(self.random_code())
+            codes -= set(Coupon.objects.filter(code__in=codes).values_list("code", flat=True))
+            coupons = [
+                Coupon(
+                    code=code,
+                    campaign=self,
+                    discount_amount=self.discount_amount,
+                    discount_percentage=self.discount_percentage,
+                    min_purchase_amount=self.min_purchase_amount,
+                    start_date=self.start_date,
+                    end_date=self.end_date,
+                    usage_limit=1,
+                )
+                for code in codes
+            ]
+            try:
+                with transaction.atomic():
+                    Coupon.objects.bulk_create(coupons)
+            except IntegrityError:
+                continue
+            created += len(coupons)
+            remaining -= len(coupons)
+            if progress is not None:
+                progress(created)
+        bump_coupon_version()
+        return created
+
+    def revoke(self):
+        """Deactivate every coupon of the campaign with one UPDATE."""
+        with transaction.atomic():
+            revoked = Coupon.objects.filter(campaign=self, is_active=True).update(is_active=False)
+            self.revoked_at = timezone.now()
+            self.save(update_fields=["revoked_at"])
+        bump_coupon_version()
+        return revoked
+
 
 class Coupon(models.Model):
     code = models.CharField(max_length=50, unique=True)
+    campaign = models.ForeignKey(
+        CouponCampaign, related_name="coupons", on_delete=models.CASCADE, null=True, blank=True
+    )
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2)
     discount_percentage = models.DecimalField(
         max_digits=5, decimal_places=2, null=True, blank=True
@@ -289,6 +950,31 @@ class Coupon(models.Model):
             return amount - self.discount_amount
         return amount
 
+    @classmethod
+    def redeem(cls, coupon_id):
+        """Use one redemption of a coupon; False when it is used up, expired
+        or switched off. A single conditional UPDATE, so concurrent orders can
+        never take more than usage_limit between them; call it inside the
+        order's transaction so a failed order gives the redemption back."""
+        now = timezone.now()
+        return bool(
+            cls.objects.filter(
+                Q(usage_limit__isnull=True) | Q(usage_count__lt=F("usage_limit")),
+                pk=coupon_id,
+                is_active=True,
+                start_date__lte=now,
+                end_date__gte=now,
+            ).update(usage_count=F("usage_count") + 1)
+        )
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+@receiver(post_save, sender=CouponCampaign)
+@receiver(post_delete, sender=CouponCampaign)
+def invalidate_coupon_index(sender, **kwargs):
+    bump_coupon_version()
+
 
 class MessType(models.Model):
     MESS_TYPE_CHOICES = [
@@ -337,11 +1023,36 @@ class Menu(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def recompute_sub_totals(cls, menus):
+        """Set sub_total of every menu in ``menus`` from its items with one
+        grouped UPDATE; returns the number of menus updated."""
+        totals = (
+            MenuItem.objects.filter(menu=OuterRef("pk"))
+            .values("menu")
+            .annotate(total=Sum("dish__price"))
+            .values("total")
+        )
+        return cls.objects.filter(pk__in=menus.values("pk")).update(
+            sub_total=Coalesce(
+                Subquery(totals), Value(Decimal("0")), output_field=cls._meta.get_field("sub_total")
+            )
+        )
+
+    @classmethod
+    def add_dish_price(cls, menu_id, dish_id, sign=1):
+        """Add (or with ``sign=-1`` subtract) a dish's price to a menu's
+        sub_total in the database, without loading either row."""
+        price = Subquery(
+            Dish.objects.filter(pk=dish_id).values("price")[:1],
+            output_field=cls._meta.get_field("sub_total"),
+        )
+        sub_total = F("sub_total") + price if sign > 0 else F("sub_total") - price
+        cls.objects.filter(pk=menu_id).update(sub_total=sub_total)
+
     def calculate_sub_total(self):
-        menu_items = self.menu_items.all()
-        total = sum(item.dish.price for item in menu_items) if menu_items else 0
-        self.sub_total = total
-        self.save()
+        Menu.recompute_sub_totals(Menu.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=["sub_total"])
 
 
 class MenuItem(models.Model):
@@ -360,12 +1071,42 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.dish.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Which menu the item's dish price was counted in when loaded
+        instance._counted = (instance.menu_id, instance.dish_id)
+        return instance
+
 
-# Signal handler to update Menu's sub_total
+# Keep Menu.sub_total in step with its items: each add, remove or move adjusts
+# the affected menus by the dish price in the database
 @receiver(post_save, sender=MenuItem)
-def update_menu_sub_total(sender, instance, **kwargs):
-    menu = instance.menu
-    menu.calculate_sub_total()
+def update_menu_sub_total(sender, instance, created, **kwargs):
+    counted = getattr(instance, "_counted", None)
+    current = (instance.menu_id, instance.dish_id)
+    if created:
+        Menu.add_dish_price(*current)
+    elif counted is None:
+        # Saved without being loaded, so what it replaced is unknown
+        Menu.recompute_sub_totals(Menu.objects.filter(pk=instance.menu_id))
+    elif counted != current:
+        Menu.add_dish_price(*counted, sign=-1)
+        Menu.add_dish_price(*current)
+    instance._counted = current
+
+
+@receiver(post_delete, sender=MenuItem)
+def remove_from_menu_sub_total(sender, instance, **kwargs):
+    Menu.add_dish_price(instance.menu_id, instance.dish_id, sign=-1)
+
+
+@receiver(post_save, sender=Dish)
+def reprice_menus(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_loaded_price", None)
+    if not created and loaded is not None and Decimal(instance.price) != loaded:
+        Menu.recompute_sub_totals(Menu.objects.filter(menu_items__dish=instance))
+    instance._loaded_price = Decimal(instance.price)
 
 
 class Mess(models.Model):
@@ -404,7 +1145,41 @@ class Mess(models.Model):
 
     class Meta:
         unique_together = ("mess_type", "customer_name")
+        indexes = [
+            # mess_report filters
+            models.Index(fields=["start_date", "end_date"], name="mess_period_idx"),
+            models.Index(fields=["end_date"], name="mess_end_date_idx"),
+            models.Index(fields=["pending_amount"], name="mess_pending_amount_idx"),
+        ]
+
+    # Messes updated per statement when applying a payment import
+    PAYMENT_UPDATE_BATCH = 200
+
+    @classmethod
+    def apply_payments(cls, totals):
+        """Add payments to mess balances as F() increments, never a read-modify-save.
+
+        ``totals`` maps mess id to (received, cash, bank) amounts; each batch of
+        messes is moved by a single UPDATE, so concurrent payments cannot be lost.
+        """
+        totals = list(totals.items())
+        for start in range(0, len(totals), cls.PAYMENT_UPDATE_BATCH):
+            batch = totals[start:start + cls.PAYMENT_UPDATE_BATCH]
+
+            def increment(index):
+                return Case(
+                    *[When(pk=pk, then=Value(amounts[index])) for pk, amounts in batch],
+                    default=Value(Decimal("0")),
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                )
 
+            received = increment(0)
+            cls.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                paid_amount=F("paid_amount") + received,
+                pending_amount=F("pending_amount") - received,
+                cash_amount=F("cash_amount") + increment(1),
+                bank_amount=F("bank_amount") + increment(2),
+            )
 
 
 class Transaction(models.Model):
@@ -431,22 +1206,53 @@ class Transaction(models.Model):
         'Mess', related_name='transactions', on_delete=models.CASCADE, blank=True, null=True
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["-date", "-id"], name="transaction_date_idx")]
+
     def __str__(self):
         return f"Transaction on {self.date} - {self.status}"
 
-transaction_creation = False
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the transaction contributed to its mess when loaded
+        instance._applied = (instance.mess_id, instance.get_amounts())
+        return instance
+
+    def get_amounts(self):
+        return (
+            Decimal(self.received_amount or 0),
+            Decimal(self.cash_amount or 0),
+            Decimal(self.bank_amount or 0),
+        )
+
+    @classmethod
+    def import_payments(cls, transactions, batch_size=500):
+        """Insert many payments and apply them to their messes in bulk.
+
+        One INSERT per ``batch_size`` rows and one UPDATE per batch of messes,
+        instead of a signal and a mess update per row.
+        """
+        totals = defaultdict(lambda: [Decimal("0")] * 3)
+        for payment in transactions:
+            if payment.mess_id:
+                for index, amount in enumerate(payment.get_amounts()):
+                    totals[payment.mess_id][index] += amount
+        with transaction.atomic():
+            created = cls.objects.bulk_create(transactions, batch_size=batch_size)
+            Mess.apply_payments(totals)
+        return created
+
 
 @receiver(post_save, sender=Mess)
 def create_initial_transaction(sender, instance, created, **kwargs):
-    global transaction_creation
     if created and not instance.initial_transaction_created:
-        transaction_creation = True
         status = 'completed' if instance.pending_amount == 0 else 'due'
         
         try:
             with transaction.atomic():
-                # Create the initial Transaction entry
-                Transaction.objects.create(
+                # Record the amount paid at sign-up; the mess already includes it
+                initial = Transaction(
                     received_amount=instance.paid_amount,
                     status=status,
                     cash_amount=instance.cash_amount,
@@ -454,34 +1260,31 @@ def create_initial_transaction(sender, instance, created, **kwargs):
                     payment_method=instance.payment_method,
                     mess=instance
                 )
-                # Set the flag to True
+                initial._applied = (instance.id, initial.get_amounts())
+                initial.save()
+                Mess.objects.filter(pk=instance.pk).update(initial_transaction_created=True)
                 instance.initial_transaction_created = True
-                instance.save()
         except Exception as e:
             print(f"Error creating initial transaction: {e}")
-        finally:
-            transaction_creation = False
 
 
 @receiver(post_save, sender=Transaction)
-def update_mess_on_transaction_save(sender, instance, **kwargs):
-    if transaction_creation:
-        return  # Skip updating Mess if a transaction is being created
-
-    mess = instance.mess
-    if mess:
-        try:
-            with transaction.atomic():
-                # Update Mess fields based on the Transaction
-                mess.pending_amount -= instance.received_amount
-                mess.paid_amount += instance.received_amount
-                mess.cash_amount += instance.cash_amount
-                mess.bank_amount += instance.bank_amount
-                
-                # Ensure Mess is saved only if changes are actually made
-                mess.save()
-        except Exception as e:
-            print(f"Error updating mess on transaction save: {e}")
+def update_mess_on_transaction_save(sender, instance, created, **kwargs):
+    # Apply only what changed since the transaction was loaded (or all of it
+    # for a new one), so editing a transaction does not count it twice
+    applied_mess_id, applied = getattr(instance, "_applied", (None, None))
+    current = instance.get_amounts()
+    totals = defaultdict(lambda: [Decimal("0")] * 3)
+    if applied_mess_id:
+        for index, amount in enumerate(applied):
+            totals[applied_mess_id][index] -= amount
+    if instance.mess_id:
+        for index, amount in enumerate(current):
+            totals[instance.mess_id][index] += amount
+    totals = {pk: amounts for pk, amounts in totals.items() if any(amounts)}
+    if totals:
+        Mess.apply_payments(totals)
+    instance._applied = (instance.mess_id, current)
 
 class CreditUser(models.Model):
     username = models.CharField(max_length=100)
@@ -494,20 +1297,70 @@ class CreditUser(models.Model):
 
     class Meta:
         ordering = ("last_payment_date",)
+        indexes = [
+            models.Index(
+                fields=["last_payment_date"],
+                condition=Q(is_active=True),
+                name="credituser_active_idx",
+            ),
+            models.Index(fields=["time_period"], name="credituser_time_period_idx"),
+        ]
 
     def __str__(self):
         return self.username
 
-    def add_to_total_due(self, amount):
-        self.total_due += amount
-        self.save()
+    def add_to_total_due(self, amount, order=None):
+        """Charge the customer. One ledger insert and one F() update, so
+        concurrent charges never overwrite each other and nothing is locked."""
+        with transaction.atomic():
+            CreditLedgerEntry.objects.create(
+                credit_user=self, entry_type="charge", amount=amount, order=order
+            )
+            CreditUser.objects.filter(pk=self.pk).update(total_due=F("total_due") + amount)
+        self.refresh_from_db(fields=["total_due"])
 
     def make_payment(self, amount):
-        if amount > self.total_due:
-            amount = self.total_due
-        self.total_due -= amount
-        self.last_payment_date = timezone.now()
-        self.save()
+        """Record a payment, capped at what is owed; returns the amount applied."""
+        now = timezone.now()
+        customer = CreditUser.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            # The cap needs the current balance. Writing the row first holds
+            # it (on SQLite, the database's write lock) until commit, so the
+            # balance read next cannot change under us; select_for_update
+            # would be a no-op on SQLite
+            customer.update(last_payment_date=now)
+            total_due = customer.values_list("total_due", flat=True).get()
+            amount = min(amount, total_due)
+            CreditLedgerEntry.objects.create(
+                credit_user=self, entry_type="payment", amount=-amount
+            )
+            customer.update(
+                total_due=F("total_due") - amount,
+                is_active=Case(
+                    When(time_period__lt=now, then=Value(False)), default=F("is_active")
+                ),
+            )
+        self.refresh_from_db(fields=["total_due", "last_payment_date", "is_active"])
+        return amount
+
+    def ledger_balance(self, before=None):
+        """Balance from the ledger: the latest snapshot plus the entries after it.
+
+        ``before`` limits it to entries created before that datetime (e.g. a
+        statement's opening balance). Snapshots bound the entries summed, so
+        this stays cheap however long the customer's history is.
+        """
+        snapshots = self.balance_snapshots.all()
+        entries = self.ledger_entries.all()
+        if before is not None:
+            snapshots = snapshots.filter(created_at__lt=before)
+            entries = entries.filter(created_at__lt=before)
+        snapshot = snapshots.order_by("-last_entry_id").first()
+        balance = Decimal("0.00")
+        if snapshot is not None:
+            balance = snapshot.balance
+            entries = entries.filter(id__gt=snapshot.last_entry_id)
+        return balance + (entries.aggregate(total=Sum("amount"))["total"] or 0)
 
     def save(self, *args, **kwargs):
         if self.last_payment_date > self.time_period:
@@ -526,7 +1379,162 @@ class CreditOrder(models.Model):
 
     def __str__(self):
         return f"Credit Order for Order {self.order.id}"
-    
 
 
+class CreditLedgerEntry(models.Model):
+    """Append-only record of everything that moved a credit customer's
+    balance. Charges are positive and payments negative; rows are never
+    updated, and CreditUser.total_due is the running sum."""
+
+    ENTRY_TYPE_CHOICES = (
+        ("opening", "Opening balance"),
+        ("charge", "Charge"),
+        ("payment", "Payment"),
+    )
+
+    credit_user = models.ForeignKey(
+        CreditUser, on_delete=models.CASCADE, related_name="ledger_entries"
+    )
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    order = models.ForeignKey(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [
+            models.Index(fields=["credit_user", "id"], name="ledger_user_id_idx"),
+            models.Index(fields=["credit_user", "created_at"], name="ledger_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.credit_user_id} {self.entry_type} {self.amount}"
+
+
+class CreditBalanceSnapshot(models.Model):
+    """Ledger balance of a customer up to and including ``last_entry_id``,
+    written periodically by the ``snapshot_credit_balances`` command."""
+
+    credit_user = models.ForeignKey(
+        CreditUser, on_delete=models.CASCADE, related_name="balance_snapshots"
+    )
+    last_entry_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["credit_user", "-last_entry_id"], name="snapshot_user_entry_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.credit_user_id} @ {self.last_entry_id}: {self.balance}"
+
+
+class PdfBatchJob(models.Model):
+    """A batch of invoices or credit statements rendered in the background;
+    see restaurant_app.pdf_batches."""
+
+    KIND_CHOICES = (
+        ("invoices", "Invoices"),
+        ("statements", "Credit statements"),
+    )
+    FORMAT_CHOICES = (
+        ("pdf", "Merged PDF"),
+        ("zip", "Zip of PDFs"),
+    )
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    output_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="pdf")
+    from_date = models.DateField()
+    to_date = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    pages = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(null=True, blank=True)
+    file = models.FileField(upload_to="pdf_batches/", blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.kind} {self.from_date} - {self.to_date} ({self.status})"
+
+    def get_filename(self):
+        return f"{self.kind}-{self.from_date}-{self.to_date}.{self.output_format}"
+
+
+class OutboundMessage(models.Model):
+    """SMS/WhatsApp outbox. Rows are queued with messaging.queue_message and
+    delivered by the ``run_message_worker`` command."""
+
+    CHANNEL_CHOICES = (
+        ("sms", "SMS"),
+        ("whatsapp", "WhatsApp"),
+    )
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default="whatsapp")
+    to_number = models.CharField(max_length=32)
+    body = models.TextField()
+    dedupe_key = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    provider_id = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=Q(status="pending"),
+                name="outbound_due_idx",
+            ),
+            models.Index(
+                fields=["claimed_at"],
+                condition=Q(status="sending"),
+                name="outbound_claimed_idx",
+            ),
+        ]
 
+    def __str__(self):
+        return f"{self.channel} to {self.to_number} ({self.status})"
+
+
+class ShortLink(models.Model):
+    """Local short links, redirected by shortlinks.short_link_redirect."""
+
+    code = models.CharField(max_length=16, unique=True)
+    target_url = models.URLField(max_length=2000)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.code} -> {self.target_url}"
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from restaurant_app.realtime import publish_events
+
+
+logger = logging.getLogger(__name__)
+
+# Templated notification texts; rows store the template id and its params
+NOTIFICATION_TEMPLATES = {
+    "order.created": "New order created: Order #{order_id} with a total amount of ${total_amount}",
+    "bill.created": "New bill #{bill_id} generated for Order #{order_id}",
+}
+
+
+def render_notification(template, params):
+    text = NOTIFICATION_TEMPLATES.get(template)
+    if text is None:
+        return template
+    try:
+        return text.format(**params)
+    except (KeyError, IndexError):
+        return text
+
+
+class NotificationWriter:
+    """Buffers committed notifications and inserts them in batches.
+
+    A batch is written when NOTIFICATION_BATCH_SIZE notifications are waiting
+    or NOTIFICATION_FLUSH_INTERVAL seconds after the first of them, whichever
+    comes first; an interval of 0 writes every commit's notifications at once.
+    A batch that fails to insert goes back to the front of the queue and is
+    retried by the timer, so committed notifications are not dropped.
+    """
+
+    # Seconds before retrying a failed batch when no flush interval is set
+    RETRY_INTERVAL = 1.0
+
+    def __init__(self):
+        self.pending = []
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def add(self, notifications):
+        interval = settings.NOTIFICATION_FLUSH_INTERVAL
+        with self.lock:
+            self.pending.extend(notifications)
+            due = not interval or len(self.pending) >= settings.NOTIFICATION_BATCH_SIZE
+            if not due:
+                self._schedule(interval)
+        if due:
+            self.flush()
+
+    def _schedule(self, interval):
+        # Called with the lock held
+        if self.timer is None:
+            self.timer = threading.Timer(interval, self._flush_from_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        from restaurant_app.models import Notification, NotificationCounter
+
+        with self.lock:
+            notifications, self.pending = self.pending, []
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not notifications:
+            return
+        try:
+            with transaction.atomic():
+                created = Notification.objects.bulk_create(notifications)
+                unread = Counter(n.user_id or 0 for n in created if not n.is_read)
+                NotificationCounter.adjust(unread)
+                publish_events("notification", [n.to_event() for n in created])
+        except Exception:
+            logger.exception(
+                "Could not write %d notifications; keeping them for the next flush",
+                len(notifications),
+            )
+            for notification in notifications:
+                notification.pk = None  # the insert was rolled back
+            with self.lock:
+                self.pending[:0] = notifications
+                self._schedule(settings.NOTIFICATION_FLUSH_INTERVAL or self.RETRY_INTERVAL)
+            return False
+        return True
+
+
+notification_writer = NotificationWriter()
+
+
+@atexit.register
+def _flush_notifications_on_exit():
+    with notification_writer.lock:
+        pending = len(notification_writer.pending)
+    if pending and not notification_writer.flush():
+        logger.error("Lost %d notifications at shutdown", pending)
+
+
+def notify(template, user=None, **params):
+    """Queue a notification for after the current transaction commits.
+
+    Nothing is written if the transaction (or the savepoint the call was
+    made in) rolls back.
+    """
+    from restaurant_app.models import Notification
+
+    notification = Notification(template=template, params=params, user=user)
+    transaction.on_commit(partial(notification_writer.add, [notification]))
@@ -0,0 +1,132 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over the view's ``cursor_ordering``.
+
+    Pages are fetched with a ``WHERE`` on the last seen position instead of
+    ``OFFSET`` and no ``COUNT(*)`` is issued, so deep pages cost the same as
+    the first one. The cursor carries every ordering field, not just the
+    first as in DRF, so rows that tie on a leading column (a busy day in a
+    ``DateField``) are still paged by the full key. The ordering must end in
+    a unique column such as ``id``.
+    """
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return json.dumps([str(value) for value in values])
+
+    def get_position_filter(self, position, reverse):
+        """``(a, b) < (x, y)`` spelled out as ``a < x OR (a = x AND b < y)``,
+        with each comparison flipped for ascending fields and backwards pages."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        clauses = []
+        for i, order in enumerate(self.ordering):
+            field_name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            equal = {
+                other.lstrip("-"): value
+                for other, value in zip(self.ordering[:i], values[:i])
+            }
+            clauses.append(Q(**equal, **{f"{field_name}__{lookup}": values[i]}))
+        return reduce(or_, clauses)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor = self.decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        # Same as CursorPagination.paginate_queryset, but filtering on the whole key
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = cursor
+        offset, reverse, current_position = cursor
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [o[1:] if o.startswith("-") else f"-{o}" for o in ordering]
+        queryset = queryset.order_by(*ordering).filter(
+            self.get_position_filter(current_position, reverse)
+        )
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = True
+            self.next_position = current_position
+            self.has_previous = following_position is not None
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.next_position = following_position
+            self.has_previous = True
+            self.previous_position = current_position
+
+        if self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class KeysetPaginationMixin:
+    """Lets clients opt into keyset pagination per request with
+    ``?pagination=cursor`` (or by following a ``cursor`` link), while plain
+    requests keep the default page-number responses."""
+
+    cursor_ordering = ("-created_at", "-id")
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = self.cursor_pagination_class()
+                return self._paginator
+        return super().paginator
+
+
+class DishSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
+
+class LedgerPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 500
+    ordering = ("id",)
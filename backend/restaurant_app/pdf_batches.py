@@ -0,0 +1,239 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from pypdf import PdfWriter
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from restaurant_app.invoices import (
+    draw_invoice,
+    draw_statement,
+    get_letterhead,
+    invoice_snapshot,
+    statement_snapshot,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Documents sent to a worker at a time; large enough to amortize the IPC
+DOCUMENTS_PER_TASK = 25
+
+DRAW_FUNCTIONS = {"invoices": draw_invoice, "statements": draw_statement}
+
+
+def _init_worker():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "restaurant_project.settings")
+    import django
+
+    django.setup()
+
+
+def render_documents(kind, documents):
+    """Worker entry point: render (filename, snapshot) pairs to
+    (filename, pdf bytes, page count) without touching the database."""
+    draw = DRAW_FUNCTIONS[kind]
+    rendered = []
+    for filename, snapshot in documents:
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=letter)
+        draw(p, snapshot)
+        pages = p.getPageNumber() - 1
+        p.save()
+        rendered.append((filename, buffer.getvalue(), pages))
+    return rendered
+
+
+def day_bounds(from_date, to_date):
+    start = timezone.make_aware(datetime.combine(from_date, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), datetime.min.time()))
+    return start, end
+
+
+def invoice_documents(from_date, to_date):
+    from restaurant_app.models import Order, OrderItem
+
+    start, end = day_bounds(from_date, to_date)
+    letterhead = get_letterhead()
+    orders = (
+        Order.objects.filter(created_at__gte=start, created_at__lt=end)
+        .exclude(status="cancelled")
+        .select_related("user")
+        .prefetch_related(Prefetch("items", OrderItem.objects.select_related("dish")))
+        .order_by("created_at", "id")
+    )
+    for order in orders.iterator(chunk_size=500):
+        yield (
+            f"invoice-{order.invoice_number or order.id}.pdf",
+            invoice_snapshot(order, letterhead, items=order.items.all()),
+        )
+
+
+def statement_documents(from_date, to_date):
+    from restaurant_app.models import CreditOrder, CreditUser
+
+    start, end = day_bounds(from_date, to_date)
+    letterhead = get_letterhead()
+    period_orders = CreditOrder.objects.filter(
+        order__created_at__gte=start, order__created_at__lt=end
+    ).select_related("order")
+    credit_users = (
+        CreditUser.objects.filter(
+            Q(total_due__gt=0)
+            | Q(
+                credit_orders__order__created_at__gte=start,
+                credit_orders__order__created_at__lt=end,
+            )
+        )
+        .distinct()
+        .prefetch_related(Prefetch("credit_orders", period_orders, to_attr="period_orders"))
+        .order_by("username", "id")
+    )
+    for credit_user in credit_users.iterator(chunk_size=500):
+        yield (
+            f"statement-{credit_user.mobile_number}.pdf",
+            statement_snapshot(
+                credit_user, credit_user.period_orders, from_date, to_date, letterhead
+            ),
+        )
+
+
+DOCUMENT_SOURCES = {"invoices": invoice_documents, "statements": statement_documents}
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_batch(kind, from_date, to_date, output_format, output, workers=None, progress=None):
+    """Render every invoice (or credit statement) in a date range across a
+    process pool and write one merged PDF or a zip of PDFs to ``output``.
+
+    Snapshots are read here, in the calling process; workers only draw.
+    ``progress(done, total, pages)`` is called as chunks complete. Returns
+    counts and throughput.
+    """
+    started = time.perf_counter()
+    tasks = list(chunked(DOCUMENT_SOURCES[kind](from_date, to_date), DOCUMENTS_PER_TASK))
+    total = sum(len(task) for task in tasks)
+    workers = workers or settings.PDF_BATCH_WORKERS or os.cpu_count() or 1
+
+    results = [None] * len(tasks)
+    done = pages = 0
+    if tasks:
+        # spawn: the pool may be started from a request-serving thread, where fork is unsafe
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        ) as executor:
+            futures = {
+                executor.submit(render_documents, kind, task): index
+                for index, task in enumerate(tasks)
+            }
+            for future in as_completed(futures):
+                rendered = future.result()
+                results[futures[future]] = rendered
+                done += len(rendered)
+                pages += sum(page_count for _, _, page_count in rendered)
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "Rendered %s/%s %s (%s pages, %.1f pages/s)",
+                    done, total, kind, pages, pages / elapsed if elapsed else 0,
+                )
+                if progress is not None:
+                    progress(done, total, pages)
+
+    write_output(results, output_format, output)
+    seconds = time.perf_counter() - started
+    stats = {
+        "documents": total,
+        "pages": pages,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+    }
+    logger.info("Finished %s batch: %s", kind, stats)
+    return stats
+
+
+def write_output(results, output_format, output):
+    documents = [document for rendered in results for document in rendered]
+    if output_format == "zip":
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for filename, pdf, _ in documents:
+                archive.writestr(filename, pdf)
+        return
+
+    writer = PdfWriter()
+    for _, pdf, _ in documents:
+        writer.append(io.BytesIO(pdf))
+    writer.write(output)
+
+
+_job_slot = threading.Lock()
+
+
+def run_pdf_batch_job(job_id):
+    """Run a PdfBatchJob to completion; jobs in one process run one at a time."""
+    from django.core.files import File
+    from restaurant_app.models import PdfBatchJob
+
+    with _job_slot:
+        job = PdfBatchJob.objects.get(pk=job_id)
+        job.status = "running"
+        job.save(update_fields=["status"])
+
+        def progress(done, total, pages):
+            PdfBatchJob.objects.filter(pk=job_id).update(done=done, total=total, pages=pages)
+
+        try:
+            with io.BytesIO() as output:
+                stats = render_batch(
+                    job.kind, job.from_date, job.to_date, job.output_format, output,
+                    progress=progress,
+                )
+                output.seek(0)
+                job.file.save(job.get_filename(), File(output), save=False)
+        except Exception as e:
+            logger.exception("PDF batch job %s failed", job_id)
+            job.status = "failed"
+            job.error = str(e)
+        else:
+            job.status = "done"
+            job.total = job.done = stats["documents"]
+            job.pages = stats["pages"]
+            job.seconds = stats["seconds"]
+        finally:
+            job.finished_at = timezone.now()
+            job.save()
+
+
+def _run_job_thread(job_id):
+    try:
+        run_pdf_batch_job(job_id)
+    finally:
+        connection.close()
+
+
+def start_pdf_batch_job(job):
+    """Run the job in a background thread once the creating transaction commits."""
+    thread = threading.Thread(target=_run_job_thread, args=(job.id,), daemon=True)
+    transaction.on_commit(thread.start)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+SUBSCRIBER_QUEUE_SIZE = 500
+
+
+def publish_event(kind, payload):
+    """Record an event in the current transaction and wake this process's
+    stream hub once it commits. Other processes pick it up on their next poll."""
+    from restaurant_app.models import RealtimeEvent
+
+    RealtimeEvent.objects.create(kind=kind, payload=payload)
+    transaction.on_commit(hub.wake_threadsafe)
+
+
+def publish_events(kind, payloads):
+    """Like publish_event for many events of one kind, in a single insert."""
+    from restaurant_app.models import RealtimeEvent
+
+    RealtimeEvent.objects.bulk_create(
+        [RealtimeEvent(kind=kind, payload=payload) for payload in payloads]
+    )
+    transaction.on_commit(hub.wake_threadsafe)
+
+
+def kind_matches(kind, kinds):
+    return not kinds or any(kind == prefix or kind.startswith(prefix + ".") for prefix in kinds)
+
+
+def visible_to(event, user_id):
+    """Notifications addressed to someone else are not sent to this stream,
+    matching what Notification.visible_to lets the REST API return."""
+    if event["kind"] != "notification":
+        return True
+    return event["payload"].get("user") in (None, user_id)
+
+
+def fetch_events_after(event_id, kinds=None, limit=500):
+    from restaurant_app.models import RealtimeEvent
+
+    events = RealtimeEvent.objects.filter(id__gt=event_id)
+    if kinds:
+        matching = Q()
+        for prefix in kinds:
+            matching |= Q(kind=prefix) | Q(kind__startswith=prefix + ".")
+        events = events.filter(matching)
+    return list(events.order_by("id").values("id", "kind", "payload")[:limit])
+
+
+def latest_event_id():
+    from restaurant_app.models import RealtimeEvent
+
+    return RealtimeEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def format_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['kind']}\n"
+        f"data: {json.dumps(event['payload'], separators=(',', ':'))}\n\n"
+    )
+
+
+class EventHub:
+    """Fans new events out to every stream connected to this process.
+
+    A single poller per process reads the event table, however many clients
+    are connected, and only runs while at least one client is subscribed.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self):
+        self.subscribers = set()
+        self.loop = None
+        self.task = None
+        self.wakeup = None
+        self.last_id = None
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # First client on this event loop (or the previous loop has gone)
+            self.loop = loop
+            self.subscribers = set()
+            self.task = None
+            self.wakeup = asyncio.Event()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.last_id = await sync_to_async(latest_event_id)()
+            self.task = loop.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def wake_threadsafe(self):
+        loop, wakeup = self.loop, self.wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def run(self):
+        while self.subscribers:
+            for event in await sync_to_async(fetch_events_after)(self.last_id):
+                self.last_id = event["id"]
+                self.broadcast(event)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def broadcast(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: end its stream, the client resumes by id
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+hub = EventHub()
+
+
+async def event_stream(last_event_id=None, kinds=None, user_id=None):
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    queue = await hub.subscribe()
+    try:
+        # Subscribe first, then replay, so nothing falls between the two
+        sent_id = 0
+        if last_event_id is not None:
+            sent_id = last_event_id
+            while True:
+                missed = await sync_to_async(fetch_events_after)(sent_id, kinds)
+                for event in missed:
+                    sent_id = event["id"]
+                    if visible_to(event, user_id):
+                        yield format_event(event)
+                if len(missed) < 500:
+                    break
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                break
+            if (
+                event["id"] > sent_id
+                and kind_matches(event["kind"], kinds)
+                and visible_to(event, user_id)
+            ):
+                sent_id = event["id"]
+                yield format_event(event)
+    finally:
+        hub.unsubscribe(queue)
+
+
+def get_stream_user(request):
+    """Authenticate from the Authorization header or, since EventSource cannot
+    send headers, a ``token`` query parameter holding the access token."""
+    authentication = JWTAuthentication()
+    raw_token = request.GET.get("token")
+    if raw_token is None:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        return authentication.get_user(AccessToken(raw_token))
+    except (TokenError, InvalidToken):
+        return None
+
+
+async def event_stream_view(request):
+    """Server-sent events for notifications, order and delivery status changes.
+
+    Needs an ASGI server (e.g. ``uvicorn restaurant_project.asgi:application``);
+    reconnecting clients send ``Last-Event-ID`` to replay what they missed.
+    Notifications for other users are left out.
+    ``?kinds=kitchen,order`` limits the stream to those event families.
+    """
+    user = await sync_to_async(get_stream_user)(request)
+    if user is None or not user.is_active:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided or are invalid."},
+            status=401,
+        )
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    kinds = [kind for kind in request.GET.get("kinds", "").split(",") if kind]
+
+    response = StreamingHttpResponse(
+        event_stream(last_event_id, kinds, user.id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
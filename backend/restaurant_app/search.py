@@ -0,0 +1,197 @@
+import bisect
+import itertools
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from restaurant_app.catalog import get_catalog_version
+
+
+TOKEN_RE = re.compile(r"\w+")
+
+# How much a query token matching each field counts towards a dish's rank
+FIELD_WEIGHTS = (("name", 4.0), ("category", 2.0), ("description", 1.0))
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+FUZZY_MIN_SIMILARITY = 0.4
+FUZZY_MIN_LENGTH = 3
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class DishSearchIndex:
+    """In-memory index over dish name, description and category name.
+
+    Every query token must match a dish, either exactly, as a prefix of an
+    indexed word (so autocomplete works while typing), or - when neither
+    matches anything - as a misspelling found through shared trigrams.
+    Dishes are ranked by the summed field weights of their matches.
+    """
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        self.names = {}
+        for dish_id, name, description, category in rows:
+            self.names[dish_id] = normalize(name)
+            fields = {"name": name, "description": description, "category": category}
+            weights = defaultdict(float)
+            for field, weight in FIELD_WEIGHTS:
+                for token in set(tokenize(fields[field])):
+                    weights[token] += weight
+            for token, weight in weights.items():
+                self.postings[token][dish_id] = weight
+
+        self.vocabulary = sorted(self.postings)
+        self.trigram_index = defaultdict(list)
+        for token in self.vocabulary:
+            if len(token) >= FUZZY_MIN_LENGTH:
+                for gram in trigrams(token):
+                    self.trigram_index[gram].append(token)
+
+    @classmethod
+    def from_database(cls):
+        from restaurant_app.models import Dish
+
+        rows = Dish.objects.order_by().values_list(
+            "id", "name", "description", "category__name"
+        )
+        return cls(rows.iterator(chunk_size=2000))
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query):
+        """Return matching dish ids, best match first."""
+        scores = None
+        for token in tokenize(query):
+            matches = self.match_token(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    dish_id: score + matches[dish_id]
+                    for dish_id, score in scores.items()
+                    if dish_id in matches
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(scores, key=lambda dish_id: (-scores[dish_id], self.names[dish_id], dish_id))
+
+    def match_token(self, token):
+        matches = dict(self.postings.get(token, {}))
+
+        start = bisect.bisect_left(self.vocabulary, token)
+        for candidate in itertools.islice(self.vocabulary, start, None):
+            if not candidate.startswith(token):
+                break
+            if candidate == token:
+                continue
+            for dish_id, weight in self.postings[candidate].items():
+                score = weight * PREFIX_FACTOR
+                if score > matches.get(dish_id, 0):
+                    matches[dish_id] = score
+
+        if not matches and len(token) >= FUZZY_MIN_LENGTH:
+            for candidate, similarity in self.similar_tokens(token):
+                for dish_id, weight in self.postings[candidate].items():
+                    score = weight * FUZZY_FACTOR * similarity
+                    if score > matches.get(dish_id, 0):
+                        matches[dish_id] = score
+        return matches
+
+    def similar_tokens(self, token):
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                shared[candidate] += 1
+        for candidate, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(candidate)) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                yield candidate, similarity
+
+
+_index_lock = threading.Lock()
+_index_state = {"version": None, "index": None}
+
+
+def get_dish_search_index():
+    """Return this process's index, rebuilding it when the catalog version changes."""
+    version = get_catalog_version()
+    if _index_state["version"] != version:
+        with _index_lock:
+            if _index_state["version"] != version:
+                _index_state["index"] = DishSearchIndex.from_database()
+                _index_state["version"] = version
+    return _index_state["index"]
+
+
+class RankedQuerySet:
+    """Rows of ``queryset`` in the order of ``ids``, loaded a slice at a time.
+
+    Pagination slices it, so only the page's ids go to the database (one
+    ``in_bulk``); the ranking itself never leaves Python.
+    """
+
+    ordered = True  # keeps Paginator from warning
+    chunk_size = 500
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        page_ids = self.ids[index] if isinstance(index, slice) else [self.ids[index]]
+        rows = self.queryset.in_bulk(page_ids)
+        page = [rows[pk] for pk in page_ids if pk in rows]
+        return page if isinstance(index, slice) else page[0]
+
+    def __iter__(self):
+        for start in range(0, len(self.ids), self.chunk_size):
+            yield from self[start : start + self.chunk_size]
+
+
+class DishSearchFilter(filters.SearchFilter):
+    """SearchFilter backed by the dish index: ranked matches with prefix and
+    typo tolerance instead of icontains scans. ?ordering= still takes precedence.
+    Every match is returned; the view's pagination decides how many per page,
+    and only that page is fetched."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = " ".join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        dish_ids = get_dish_search_index().search(query)
+        if not dish_ids:
+            return queryset.none()
+        if request.query_params.get(api_settings.ORDERING_PARAM) or getattr(
+            view, "action", "list"
+        ) != "list":
+            # Explicit ordering, or a detail lookup that needs a real queryset
+            return queryset.filter(pk__in=dish_ids)
+        if queryset.query.has_filters():
+            # e.g. ?category=: keep the ranked ids the other filters allow
+            allowed = set(queryset.values_list("pk", flat=True))
+            dish_ids = [dish_id for dish_id in dish_ids if dish_id in allowed]
+        return RankedQuerySet(queryset, dish_ids)
@@ -1,11 +1,16 @@
+from decimal import Decimal
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch
 from delivery_drivers.models import DeliveryDriver
+from kitchen.models import KitchenTicket
 from restaurant_app.models import *
+from restaurant_app.coupons import get_coupon_index
 
 
 
@@ -114,12 +119,45 @@ class DishVariantSerializer(serializers.ModelSerializer):
         model = DishVariant
         fields = ['id', 'name','dish']
 
+class DishLookupField(serializers.PrimaryKeyRelatedField):
+    """Resolves a dish from the batch loaded by OrderItemListSerializer,
+    falling back to a per-item query when used on its own."""
+
+    def to_internal_value(self, data):
+        dishes = self.context.get("dish_lookup")
+        if dishes is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return dishes[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        # Load every dish referenced by the order in one query instead of one per line
+        if isinstance(data, list):
+            dish_ids = set()
+            for item in data:
+                try:
+                    dish_ids.add(int(item["dish"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            self.context["dish_lookup"] = Dish.objects.in_bulk(dish_ids)
+        return super().to_internal_value(data)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    dish = serializers.PrimaryKeyRelatedField(queryset=Dish.objects.all())
+    dish = DishLookupField(queryset=Dish.objects.all())
 
     class Meta:
         model = OrderItem
         fields = ["dish", "quantity","is_newly_added","variants"]
+        list_serializer_class = OrderItemListSerializer
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -127,6 +165,7 @@ class OrderSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     delivery_order_status = serializers.CharField(source="delivery_order.status", read_only=True)
     delivery_driver = DriverSerializer(source='delivery_order.driver', read_only=True)
+    coupon_code = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = Order
@@ -151,53 +190,142 @@ class OrderSerializer(serializers.ModelSerializer):
             "delivery_driver",
             "credit_user_id",
             "delivery_order_status",
-            "kitchen_note"
+            "kitchen_note",
+            "table",
+            "coupon",
+            "coupon_code",
+            "discount_amount",
         ]
+        read_only_fields = ["coupon", "discount_amount"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Mirrors the relations read by UserSerializer, DriverSerializer and items
+        return queryset.select_related(
+            "user__driver_profile",
+            "delivery_order__driver__user",
+        ).prefetch_related("items")
+
+    @staticmethod
+    def get_items_total(items_data):
+        return sum(
+            item_data.get("quantity", 1) * item_data["dish"].price
+            for item_data in items_data
+        )
+
+    @staticmethod
+    def get_coupon(code, items_total):
+        """The coupon for ``code`` from the in-memory index, or a validation error."""
+        coupon = get_coupon_index().get(code)
+        if coupon is None:
+            raise serializers.ValidationError({"coupon_code": "Invalid or expired coupon."})
+        if coupon.min_purchase_amount and items_total < coupon.min_purchase_amount:
+            raise serializers.ValidationError(
+                {"coupon_code": f"Orders must be at least {coupon.min_purchase_amount} "
+                                "to use this coupon."}
+            )
+        return coupon
+
+    @staticmethod
+    def get_discount(coupon, items_total):
+        discount = items_total - coupon.apply_discount(items_total)
+        return min(max(discount, Decimal("0")), items_total).quantize(Decimal("0.01"))
 
     def create(self, validated_data):
         items_data = validated_data.pop("items")
+        coupon_code = validated_data.pop("coupon_code", "")
         user = self.context["request"].user
-        order = Order.objects.create(user=user, **validated_data)
-        total_amount = 0
 
-        for item_data in items_data:
-            order_item = OrderItem.objects.create(order=order, **item_data)
-            total_amount += order_item.quantity * order_item.dish.price
-        
-        # Add delivery charge to total amount if it's not the default value
-        if order.delivery_charge != 0:
-            total_amount += order.delivery_charge
+        # Dishes are already resolved, so the total is known before the first insert
+        total_amount = self.get_items_total(items_data)
 
-        order.total_amount = total_amount
-        order.save()
+        coupon = None
+        if coupon_code:
+            coupon = self.get_coupon(coupon_code, total_amount)
+            discount = self.get_discount(coupon, total_amount)
+            validated_data["coupon"] = coupon
+            validated_data["discount_amount"] = discount
+            total_amount -= discount
+
+        # Add delivery charge to total amount if it's not the default value
+        delivery_charge = validated_data.get("delivery_charge", 0)
+        if delivery_charge != 0:
+            total_amount += delivery_charge
+        validated_data["total_amount"] = total_amount
+
+        with transaction.atomic():
+            # Taken first and inside the order's transaction: an order that
+            # fails to save hands the redemption back
+            if coupon is not None and not Coupon.redeem(coupon.id):
+                raise serializers.ValidationError(
+                    {"coupon_code": "This coupon is no longer available."}
+                )
+            order = Order.objects.create(user=user, **validated_data)
+            if not getattr(order, "_seated", True):
+                raise serializers.ValidationError(
+                    {"table": "This table already has an open order."}
+                )
+            items = OrderItem.objects.bulk_create(
+                [OrderItem(order=order, **item_data) for item_data in items_data]
+            )
+            # bulk_create skips signals, so record the lines in the dish rollups here
+            DishSalesRollup.apply(
+                order.get_rollup_state(), DishSalesRollup.lines_for_items(items), 1
+            )
+            KitchenTicket.create_for_items(order, items)
         return order
 
     def update(self, instance, validated_data):
         
         items_data = validated_data.pop("items", None)
+        validated_data.pop("coupon_code", None)  # a coupon is only taken at checkout
+        table_moved = (
+            "table" in validated_data
+            and getattr(validated_data["table"], "pk", None) != instance.table_id
+        )
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        # Start by resetting the total amount to 0
-        total_amount = 0
 
         # Sum existing items' total amount
-        for existing_item in instance.items.all():
-            total_amount += existing_item.quantity * existing_item.dish.price
-
-        # Add new items' total amount
-        if items_data:
-            for item_data in items_data:
-                item_data['is_newly_added'] = True  # Marking as newly added
-                order_item = OrderItem.objects.create(order=instance, **item_data)
-                total_amount += order_item.quantity * order_item.dish.price
-        
-        # Add delivery charge to total amount if it's not the default value
-        if instance.delivery_charge != 0:
-            total_amount += instance.delivery_charge
-
-        # Update the total amount
-        instance.total_amount = total_amount
-        instance.save()
+        total_amount = sum(
+            existing_item.quantity * existing_item.dish.price
+            for existing_item in instance.items.select_related("dish")
+        )
+
+        with transaction.atomic():
+            if table_moved and instance.status not in ("delivered", "cancelled"):
+                if not Table.move(instance, instance.table_id):
+                    raise serializers.ValidationError(
+                        {"table": "This table already has an open order."}
+                    )
+
+            # Add new items' total amount
+            if items_data:
+                for item_data in items_data:
+                    item_data['is_newly_added'] = True  # Marking as newly added
+                items = OrderItem.objects.bulk_create(
+                    [OrderItem(order=instance, **item_data) for item_data in items_data]
+                )
+                DishSalesRollup.apply(
+                    instance.get_rollup_state(), DishSalesRollup.lines_for_items(items), 1
+                )
+                KitchenTicket.create_for_items(instance, items, is_addition=True)
+                total_amount += self.get_items_total(items_data)
+
+            # Keep the coupon's discount: a percentage follows the new items
+            # total, a fixed amount stays what was granted at checkout
+            if instance.coupon_id:
+                if instance.coupon.discount_percentage:
+                    instance.discount_amount = self.get_discount(instance.coupon, total_amount)
+                total_amount -= min(instance.discount_amount, total_amount)
+
+            # Add delivery charge to total amount if it's not the default value
+            if instance.delivery_charge != 0:
+                total_amount += instance.delivery_charge
+
+            # Update the total amount
+            instance.total_amount = total_amount
+            instance.save()
         return instance
     
 
@@ -333,6 +461,16 @@ class BillSerializer(serializers.ModelSerializer):
         model = Bill
         fields = ['id', 'order', 'order_id', 'user', 'total_amount', 'paid', 'billed_at']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # BillOrderItemSerializer and sub_total both read item.dish
+        return queryset.select_related(
+            "order",
+            "user__driver_profile",
+        ).prefetch_related(
+            Prefetch("order__items", queryset=OrderItem.objects.select_related("dish"))
+        )
+
     def create(self, validated_data):
         # Pop the order_id from the validated data
         order = validated_data.pop('order_id')
@@ -347,7 +485,12 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ["id", "user", "message", "created_at", "is_read"]
+        fields = ["id", "user", "message", "template", "params", "created_at", "is_read"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["message"] = instance.get_message()
+        return data
 
 
 class FloorSerializer(serializers.ModelSerializer):
@@ -360,6 +503,25 @@ class TableSerializer(serializers.ModelSerializer):
     class Meta:
         model = Table
         fields = "__all__"
+        # Driven by orders and bills, or the set_status action
+        read_only_fields = ["status", "current_order", "seated_at"]
+
+    def update(self, instance, validated_data):
+        is_ready = validated_data.pop("is_ready", None)
+        instance = super().update(instance, validated_data)
+        # The old ready toggle maps onto the table states
+        if is_ready is not None and is_ready != instance.is_ready:
+            Table.set_status(instance.pk, "free" if is_ready else "cleaning")
+            instance.refresh_from_db()
+        return instance
+
+
+class FloorSnapshotSerializer(serializers.ModelSerializer):
+    tables = TableSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Floor
+        fields = ["id", "name", "tables"]
 
 
 class CouponSerializer(serializers.ModelSerializer):
@@ -381,6 +543,49 @@ class CouponSerializer(serializers.ModelSerializer):
         read_only_fields = ["usage_count"]
 
 
+class CouponCampaignSerializer(serializers.ModelSerializer):
+    # Enough for a large promotion while keeping one request's insert bounded
+    MAX_CODES = 100_000
+
+    class Meta:
+        model = CouponCampaign
+        fields = [
+            "id",
+            "name",
+            "prefix",
+            "status",
+            "code_count",
+            "discount_amount",
+            "discount_percentage",
+            "min_purchase_amount",
+            "start_date",
+            "end_date",
+            "created_at",
+            "revoked_at",
+        ]
+        read_only_fields = ["status", "created_at", "revoked_at"]
+
+    def to_internal_value(self, data):
+        # Upper-case before the field validators run, so the unique check
+        # sees the prefix as it will be stored
+        if isinstance(data.get("prefix"), str):
+            data = {**data, "prefix": data["prefix"].upper()}
+        return super().to_internal_value(data)
+
+    def validate_prefix(self, value):
+        if not value.isalnum():
+            raise serializers.ValidationError("Use letters and digits only.")
+        return value
+
+    def validate_code_count(self, value):
+        if not 1 <= value <= self.MAX_CODES:
+            raise serializers.ValidationError(f"Must be between 1 and {self.MAX_CODES}.")
+        return value
+
+    def create(self, validated_data):
+        return CouponCampaign.create_with_codes(**validated_data)
+
+
 class MessTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = MessType
@@ -441,6 +646,22 @@ class MessSerializer(serializers.ModelSerializer):
             "grand_total"
         ]
 
+    # Moved by transactions as F() increments; only set at sign-up
+    BALANCE_FIELDS = ("paid_amount", "pending_amount", "cash_amount", "bank_amount")
+
+    def update(self, instance, validated_data):
+        # Save only the edited columns, never the balances loaded with the
+        # instance, which would overwrite payments recorded meanwhile
+        for field in self.BALANCE_FIELDS:
+            validated_data.pop(field, None)
+        menus = validated_data.pop("menus", None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        if menus is not None:
+            instance.menus.set(menus)
+        return instance
+
 
 class CreditOrderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -464,8 +685,62 @@ class CreditUserSerializer(serializers.ModelSerializer):
             "credit_orders",
             "limit_amount"
         ]
+        # Moved only through the credit ledger (charges and make_payment)
+        read_only_fields = ["total_due"]
+
+    def update(self, instance, validated_data):
+        # Save only the edited columns: a full-row save would write back the
+        # total_due loaded with the instance over concurrent charges
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+
+class CreditLedgerEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CreditLedgerEntry
+        fields = ["id", "entry_type", "amount", "order", "created_at"]
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Transaction
-        fields = ['id', 'received_amount', 'status', 'cash_amount', 'bank_amount', 'payment_method', 'mess','date']
\ No newline at end of file
+        fields = ['id', 'received_amount', 'status', 'cash_amount', 'bank_amount', 'payment_method', 'mess','date']
+
+class PdfBatchJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PdfBatchJob
+        fields = [
+            "id",
+            "kind",
+            "output_format",
+            "from_date",
+            "to_date",
+            "status",
+            "total",
+            "done",
+            "pages",
+            "seconds",
+            "file",
+            "error",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "status",
+            "total",
+            "done",
+            "pages",
+            "seconds",
+            "file",
+            "error",
+            "created_at",
+            "finished_at",
+        ]
+
+    def validate(self, data):
+        if data["from_date"] > data["to_date"]:
+            raise serializers.ValidationError("from_date must not be after to_date.")
+        return data
@@ -0,0 +1,168 @@
+import atexit
+import logging
+import secrets
+import string
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.http import Http404, HttpResponseGone, HttpResponseRedirect
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+BASE62 = string.digits + string.ascii_letters
+CODE_LENGTH = 7  # 62**7 ~ 3.5e12 codes, so links cannot be enumerated
+HIT_FLUSH_INTERVAL = 10
+
+
+def base62_code(length=CODE_LENGTH):
+    return "".join(secrets.choice(BASE62) for _ in range(length))
+
+
+class LinkCache:
+    """Small thread-safe LRU of code -> (target_url, expires_at)."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, code):
+        with self.lock:
+            entry = self.entries.get(code)
+            if entry is not None:
+                self.entries.move_to_end(code)
+            return entry
+
+    def set(self, code, entry):
+        with self.lock:
+            self.entries[code] = entry
+            self.entries.move_to_end(code)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+class HitCounter:
+    """Counts redirects in memory and writes them as one UPDATE per flush.
+
+    The first hit after a flush starts a timer, so counts reach the database
+    within ``interval`` seconds even if the link then goes quiet. Counts from
+    a failed flush are merged back and retried on the next one.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def record(self, code):
+        with self.lock:
+            self.counts[code] += 1
+            self._schedule()
+
+    def _schedule(self):
+        # Called with the lock held
+        if self.timer is None:
+            self.timer = threading.Timer(self.interval, self._flush_from_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        from restaurant_app.models import ShortLink
+
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not counts:
+            return True
+        try:
+            ShortLink.objects.filter(code__in=counts).update(
+                hit_count=F("hit_count")
+                + Case(
+                    *[When(code=code, then=Value(count)) for code, count in counts.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ),
+                last_hit_at=timezone.now(),
+            )
+        except Exception:
+            logger.exception("Could not write hits for %d links; retrying later", len(counts))
+            with self.lock:
+                self.counts.update(counts)
+                self._schedule()
+            return False
+        return True
+
+
+link_cache = LinkCache(settings.SHORT_LINK_CACHE_SIZE)
+hit_counter = HitCounter(HIT_FLUSH_INTERVAL)
+
+
+@atexit.register
+def _flush_hits_on_exit():
+    if not hit_counter.flush():
+        logger.error("Lost hit counts for %d links at shutdown", len(hit_counter.counts))
+
+
+def create_short_link(target_url, expires_in=None):
+    """Create a short link for ``target_url``; ``expires_in`` is a timedelta,
+    None for a link that never expires."""
+    from restaurant_app.models import ShortLink
+
+    expires_at = timezone.now() + expires_in if expires_in else None
+    while True:
+        try:
+            with transaction.atomic():
+                link = ShortLink.objects.create(
+                    code=base62_code(), target_url=target_url, expires_at=expires_at
+                )
+        except IntegrityError:
+            continue  # code collision, draw again
+        return link
+
+
+def short_url(code):
+    return f"{settings.SHORT_LINK_BASE_URL.rstrip('/')}/s/{code}"
+
+
+def resolve(code):
+    """Return (target_url, expires_at) for a code, from the LRU when possible."""
+    from restaurant_app.models import ShortLink
+
+    entry = link_cache.get(code)
+    if entry is None:
+        row = (
+            ShortLink.objects.filter(code=code)
+            .values_list("target_url", "expires_at")
+            .first()
+        )
+        if row is None:
+            return None
+        entry = tuple(row)
+        link_cache.set(code, entry)
+    return entry
+
+
+def short_link_redirect(request, code):
+    entry = resolve(code)
+    if entry is None:
+        raise Http404("Unknown link")
+    target_url, expires_at = entry
+    if expires_at is not None and expires_at <= timezone.now():
+        return HttpResponseGone("This link has expired.")
+    hit_counter.record(code)
+    return HttpResponseRedirect(target_url)
+
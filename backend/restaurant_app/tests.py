@@ -1,3 +1,1972 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image
+from pypdf import PdfReader
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from delivery_drivers.models import DeliveryDriver, DeliveryOrder
+from restaurant_app.models import (
+    Bill,
+    Category,
+    Coupon,
+    CouponCampaign,
+    CreditLedgerEntry,
+    CreditOrder,
+    CreditUser,
+    Dish,
+    DishSalesRollup,
+    Floor,
+    InvoiceSequence,
+    LogoInfo,
+    Menu,
+    MenuItem,
+    Mess,
+    MessType,
+    Notification,
+    NotificationCounter,
+    Order,
+    OrderItem,
+    OutboundMessage,
+    PdfBatchJob,
+    RealtimeEvent,
+    SalesRollup,
+    ShortLink,
+    Table,
+    Transaction,
+    User,
+)
+from restaurant_app.messaging import FakeTransport, MessageWorker, queue_message
+from restaurant_app.notifications import notification_writer, notify
+from restaurant_app.coupons import _index_state as coupon_index_state, get_coupon_index
+from restaurant_app.floorplan import _index_state as floor_index_state
+from restaurant_app.invoices import (
+    _logo_state,
+    get_print_logo,
+    invoice_renderer,
+    invoice_snapshot,
+)
+from restaurant_app.pagination import KeysetPagination
+from restaurant_app.pdf_batches import render_batch, run_pdf_batch_job
+from restaurant_app.search import get_dish_search_index
+from restaurant_app.serializers import CreditUserSerializer, MessSerializer
+from restaurant_app.shortlinks import hit_counter, link_cache
+from restaurant_app.utils import generate_order_pdf, send_sms, shorten_url
+
+
+class APITestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="staff",
+            email="staff@example.com",
+            password="secret-pass",
+            passcode="123456",
+            role="staff",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name="Mains")
+        self.addCleanup(self.discard_buffered_notifications)
+
+    @staticmethod
+    def discard_buffered_notifications():
+        # Committed orders queue notifications; don't let them land in a later test
+        with notification_writer.lock:
+            notification_writer.pending = []
+            if notification_writer.timer is not None:
+                notification_writer.timer.cancel()
+                notification_writer.timer = None
+
+    def create_dishes(self, count, price="10.00"):
+        return Dish.objects.bulk_create(
+            [
+                Dish(name=f"Dish {i}", price=Decimal(price), category=self.category)
+                for i in range(count)
+            ]
+        )
+
+    def order_payload(self, dishes, **extra):
+        payload = {
+            "total_amount": "0.00",
+            "order_type": "dining",
+            "items": [{"dish": dish.id, "quantity": 2} for dish in dishes],
+        }
+        payload.update(extra)
+        return payload
+
+
+class OrderCreateQueryCountTests(APITestMixin, TestCase):
+    def post_order(self, item_count):
+        dishes = self.create_dishes(item_count)
+        # JWT auth loads a fresh user per request; mirror that so cached
+        # relations on the user don't skew later counts
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/orders/", self.order_payload(dishes), format="json"
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(queries)
+
+    def test_query_count_is_flat_in_number_of_items(self):
+        InvoiceSequence.next_invoice_number()  # the first order starts the sequence
+        counts = {}
+        for item_count in (1, 10, 100):
+            response, counts[item_count] = self.post_order(item_count)
+            order = Order.objects.get(pk=response.data["id"])
+            self.assertEqual(order.items.count(), item_count)
+            self.assertEqual(order.total_amount, Decimal("20.00") * item_count)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_total_includes_delivery_charge(self):
+        dishes = self.create_dishes(3, price="5.50")
+        response = self.client.post(
+            "/api/orders/",
+            self.order_payload(dishes, delivery_charge="4.00"),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("37.00"))
+
+    def test_unknown_dish_is_rejected(self):
+        dishes = self.create_dishes(1)
+        payload = self.order_payload(dishes)
+        payload["items"].append({"dish": 999999, "quantity": 1})
+        response = self.client.post("/api/orders/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class ReadPathQueryBudgetTests(APITestMixin, TestCase):
+    """Each endpoint must run the same fixed number of queries for a page of
+    any size; raise a budget only when the serializer genuinely reads more."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        self.dishes = self.create_dishes(3)
+        driver_user = User.objects.create_user(
+            username="driver",
+            email="driver@example.com",
+            password="secret-pass",
+            passcode="654321",
+            role="driver",
+        )
+        self.driver = DeliveryDriver.objects.create(user=driver_user, is_active=True)
+
+    def create_orders(self, count):
+        for i in range(count):
+            order_type = "delivery" if i % 2 else "dining"
+            response = self.client.post(
+                "/api/orders/",
+                self.order_payload(
+                    self.dishes,
+                    order_type=order_type,
+                    delivery_driver_id=self.driver.id if i % 2 else None,
+                    customer_phone_number="5550100",
+                ),
+                format="json",
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+            Bill.objects.create(
+                order=Order.objects.get(pk=response.data["id"]),
+                total_amount=Decimal("60.00"),
+            )
+
+    def assert_budget(self, url, budget):
+        for count in (2, 8):
+            self.create_orders(count)
+            self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_order_list(self):
+        self.assert_budget("/api/orders/", 3)
+
+    def test_order_retrieve(self):
+        self.create_orders(1)
+        order = Order.objects.first()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/orders/{order.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["items"]), 3)
+
+    def test_user_order_history(self):
+        self.assert_budget("/api/orders/user_order_history/?customer_phone_number=5550100", 2)
+
+    def test_delivery_order_list(self):
+        self.assert_budget("/api/delivery-orders/", 3)
+
+    def test_bill_list(self):
+        self.assert_budget("/api/bills/", 3)
+
+
+class SalesRollupTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dishes = self.create_dishes(2)
+
+    def post_order(self, **extra):
+        response = self.client.post(
+            "/api/orders/", self.order_payload(self.dishes, **extra), format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(pk=response.data["id"])
+
+    def rollup_snapshot(self):
+        return (
+            sorted(
+                SalesRollup.objects.filter(order_count__gt=0).values_list(
+                    "date", "hour", "order_type", "payment_method", "order_count", "total_sales"
+                )
+            ),
+            sorted(
+                DishSalesRollup.objects.filter(line_count__gt=0).values_list(
+                    "date", "hour", "dish_id", "line_count", "quantity"
+                )
+            ),
+        )
+
+    def test_rollups_follow_create_payment_change_and_cancel(self):
+        first = self.post_order()
+        self.post_order(order_type="takeaway")
+        self.assertEqual(
+            SalesRollup.objects.aggregate(total=Sum("total_sales"))["total"],
+            Decimal("80.00"),
+        )
+        self.assertEqual(
+            DishSalesRollup.objects.aggregate(quantity=Sum("quantity"))["quantity"], 8
+        )
+
+        response = self.client.patch(
+            f"/api/order-status/{first.pk}/",
+            {"status": "delivered", "payment_method": "bank", "bank_amount": "40.00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        bank = SalesRollup.objects.get(order_type="dining", payment_method="bank")
+        cash = SalesRollup.objects.get(order_type="dining", payment_method="cash")
+        self.assertEqual((bank.order_count, cash.order_count), (1, 0))
+
+        second = Order.objects.get(order_type="takeaway")
+        self.client.post(f"/api/orders/{second.pk}/cancel_order/")
+        self.assertEqual(
+            SalesRollup.objects.aggregate(total=Sum("total_sales"))["total"],
+            Decimal("40.00"),
+        )
+        self.assertEqual(
+            DishSalesRollup.objects.aggregate(quantity=Sum("quantity"))["quantity"], 4
+        )
+
+    def test_dashboard_reads_rollups(self):
+        self.post_order()
+        self.post_order(delivery_charge="5.00")
+        response = self.client.get("/api/orders/dashboard_data/?time_range=day")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_orders"], 2)
+        self.assertEqual(response.data["total_income"], Decimal("85.00"))
+        self.assertEqual(response.data["avg_order_value"], Decimal("42.50"))
+        self.assertEqual(response.data["top_dishes"][0]["orders"], 2)
+        self.assertEqual(response.data["category_sales"][0]["value"], Decimal("80.00"))
+        self.assertEqual(response.data["popular_time_slots"][0]["order_count"], 2)
+
+    def test_rebuild_matches_incremental_state(self):
+        self.post_order()
+        cancelled = self.post_order(order_type="takeaway")
+        self.client.post(f"/api/orders/{cancelled.pk}/cancel_order/")
+        self.post_order(order_type="takeaway")
+        incremental = self.rollup_snapshot()
+
+        call_command("rebuild_sales_rollups", stdout=StringIO())
+        self.assertEqual(self.rollup_snapshot(), incremental)
+
+
+class ReportExportTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        dishes = self.create_dishes(2)
+        for order_type in ("dining", "takeaway", "dining"):
+            self.client.post(
+                "/api/orders/",
+                self.order_payload(dishes, order_type=order_type),
+                format="json",
+            )
+
+    def read_stream(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_sales_report_csv(self):
+        response = self.client.get("/api/orders/sales_report/?format=csv&order_type=dining")
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(StringIO(self.read_stream(response))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row["order_type"] for row in rows}, {"dining"})
+        self.assertEqual(rows[0]["billed_by"], "staff")
+        self.assertEqual(rows[0]["total_amount"], "40.00")
+
+    def test_sales_report_ndjson(self):
+        response = self.client.get("/api/orders/sales_report/?format=ndjson")
+        lines = self.read_stream(response).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])["total_amount"], "40.00")
+
+    def test_mess_report_csv(self):
+        mess_type = MessType.objects.create(name="breakfast_lunch")
+        Mess.objects.create(
+            customer_name="Asha",
+            mobile_number="5550101",
+            start_date="2024-08-01",
+            end_date="2024-08-31",
+            mess_type=mess_type,
+            total_amount=Decimal("3000.00"),
+            paid_amount=Decimal("1000.00"),
+            pending_amount=Decimal("2000.00"),
+        )
+        response = self.client.get("/api/messes/mess_report/?format=csv&credit=1")
+        rows = list(csv.DictReader(StringIO(self.read_stream(response))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["mess_type"], "breakfast_lunch")
+        self.assertEqual(rows[0]["pending_amount"], "2000.00")
+
+
+class KeysetPaginationTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        dishes = self.create_dishes(1)
+        for _ in range(25):
+            self.client.post("/api/orders/", self.order_payload(dishes), format="json")
+
+    def test_walks_every_order_without_counting(self):
+        seen = []
+        url = "/api/orders/?pagination=cursor&page_size=10"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(
+                any("COUNT(" in query["sql"] for query in queries.captured_queries)
+            )
+            seen += [order["id"] for order in response.data["results"]]
+            url = response.data["next"]
+        expected = list(Order.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_ties_on_the_leading_column_are_paged_by_the_full_key(self):
+        Order.objects.update(created_at=timezone.now())
+        seen = []
+        url = "/api/orders/?pagination=cursor&page_size=10"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any("OFFSET" in q["sql"] for q in queries.captured_queries))
+            seen += [order["id"] for order in response.data["results"]]
+            last_page, url = response.data, response.data["next"]
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(len(seen), 25)
+
+        back = [order["id"] for order in last_page["results"]]
+        url = last_page["previous"]
+        while url:
+            response = self.client.get(url)
+            back = [order["id"] for order in response.data["results"]] + back
+            url = response.data["previous"]
+        self.assertEqual(back, seen)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get("/api/orders/?cursor=cD1ub3Rqc29u")  # p=notjson
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, "max_page_size", 7):
+            response = self.client.get("/api/orders/?pagination=cursor&page_size=1000")
+        self.assertEqual(len(response.data["results"]), 7)
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get("/api/orders/?page=3")
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 5)
+
+
+class QueryPlanTests(APITestMixin, TestCase):
+    """Runs EXPLAIN QUERY PLAN on every SELECT an endpoint issues and fails if
+    SQLite falls back to a full scan of one of the large tables. Walking a
+    whole index counts as a full scan too, unless the query stops early with a
+    LIMIT or the index is a partial one whose condition is the whole filter.
+    Page-number COUNT(*) queries are skipped: they are linear by nature, which
+    is what ?pagination=cursor avoids."""
+
+    LARGE_TABLES = {
+        "restaurant_app_order",
+        "restaurant_app_notification",
+        "restaurant_app_mess",
+        "restaurant_app_credituser",
+        "restaurant_app_transaction",
+        "restaurant_app_bill",
+        "delivery_drivers_deliveryorder",
+    }
+    FILTER_INDEXES = {"notification_unread_idx", "credituser_active_idx"}
+    FULL_SCAN = re.compile(
+        r"^SCAN (?:TABLE )?\"?(\w+)\"?(?: USING (?:COVERING )?INDEX (\w+))?$"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        self.client.post(
+            "/api/orders/", self.order_payload(self.create_dishes(1)), format="json"
+        )
+
+    def capture_selects(self, method, url, **kwargs):
+        statements = []
+
+        def collect(execute, sql, params, many, context):
+            statement = sql.lstrip().upper()
+            if statement.startswith("SELECT") and not statement.startswith("SELECT COUNT(*)"):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(collect):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, getattr(response, "data", None))
+        return statements
+
+    def assert_no_full_scans(self, url, method="get", **kwargs):
+        statements = self.capture_selects(method, url, **kwargs)
+        self.assertTrue(statements)
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                for row in cursor.fetchall():
+                    match = self.FULL_SCAN.match(row[-1])
+                    if not match or match.group(1) not in self.LARGE_TABLES:
+                        continue
+                    table, index = match.groups()
+                    if index and (" LIMIT " in sql or index in self.FILTER_INDEXES):
+                        continue
+                    self.fail(f"{url} scans {table}:\n{row[-1]}\n{sql}")
+
+    def test_order_lists(self):
+        self.assert_no_full_scans("/api/orders/")
+        self.assert_no_full_scans("/api/orders/?order_type=dining")
+        self.assert_no_full_scans("/api/orders/?pagination=cursor")
+        self.assert_no_full_scans(
+            "/api/orders/user_order_history/?customer_phone_number=5550100"
+        )
+
+    def test_sales_report(self):
+        self.assert_no_full_scans(
+            "/api/orders/sales_report/?from_date=2024-01-01&to_date=2024-12-31"
+        )
+        self.assert_no_full_scans("/api/orders/sales_report/?payment_method=cash")
+        self.assert_no_full_scans("/api/orders/sales_report/?order_status=pending")
+
+    def test_notifications(self):
+        self.assert_no_full_scans("/api/notifications/unread/")
+        self.assert_no_full_scans("/api/notifications/?pagination=cursor")
+
+    def test_mess_report(self):
+        self.assert_no_full_scans(
+            "/api/messes/mess_report/?from_date=2024-01-01&to_date=2024-12-31"
+        )
+        self.assert_no_full_scans("/api/messes/mess_report/?to_date=2024-12-31")
+        self.assert_no_full_scans("/api/messes/mess_report/?credit=1")
+
+    def test_credit_users(self):
+        self.assert_no_full_scans("/api/credit-users/get_active_users/")
+
+    def test_keyset_lists(self):
+        self.assert_no_full_scans("/api/bills/?pagination=cursor")
+        self.assert_no_full_scans("/api/transactions/?pagination=cursor")
+
+    def test_driver_active_orders(self):
+        driver_user = User.objects.create_user(
+            username="driver",
+            email="driver@example.com",
+            password="secret-pass",
+            passcode="654321",
+            role="driver",
+        )
+        driver = DeliveryDriver.objects.create(user=driver_user, is_active=True)
+        self.assert_no_full_scans(
+            f"/api/delivery-drivers/{driver.pk}/toggle_available/", method="patch"
+        )
+
+
+class SQLiteProductionModeTests(TestCase):
+    def test_production_options_apply_pragmas(self):
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            wrapper = DatabaseWrapper(
+                {
+                    **connection.settings_dict,
+                    "NAME": f"{scratch_dir}/pragmas.sqlite3",
+                    "OPTIONS": settings.SQLITE_PRODUCTION_OPTIONS,
+                },
+                alias="pragmas",
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "temp_store"):
+                        cursor.execute(f"PRAGMA {name}")
+                        pragmas[name] = cursor.fetchone()[0]
+                self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas["journal_mode"], "wal")
+        self.assertEqual(pragmas["synchronous"], 1)  # NORMAL
+        self.assertEqual(pragmas["busy_timeout"], settings.SQLITE_BUSY_TIMEOUT_MS)
+        self.assertEqual(pragmas["temp_store"], 2)  # MEMORY
+
+    def test_maintenance_command(self):
+        out = StringIO()
+        call_command("sqlite_maintenance", stdout=out)
+        self.assertIn("SQLite maintenance complete.", out.getvalue())
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "catalog": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "catalog-tests",
+        },
+    }
+)
+class CatalogCacheTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["catalog"].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dishes = self.create_dishes(3)
+            Category.objects.create(name="Drinks")
+
+    def test_repeat_reads_skip_the_database(self):
+        first = self.client.get("/api/dishes/")
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/dishes/")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get("/api/categories/")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/categories/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_changes_bump_the_version(self):
+        etag = self.client.get("/api/search-dishes/?search=Dish")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f"/api/dishes/{self.dishes[0].pk}/", {"name": "Renamed"}, format="json"
+            )
+        response = self.client.get("/api/search-dishes/?search=Dish", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["results"]), 2)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "catalog": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "search-tests",
+        },
+    }
+)
+class DishSearchTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["catalog"].clear()
+        rice = Category.objects.create(name="Rice")
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.bulk_create(
+                [
+                    Dish(name="Chicken Biryani", price=12, category=rice),
+                    Dish(name="Mutton Biryani", price=14, category=rice),
+                    Dish(name="Chicken Soup", price=6, category=self.category,
+                         description="Clear broth"),
+                    Dish(name="Ghee Rice", price=5, category=rice),
+                ]
+            )
+            Category.objects.create(name="Soups")
+
+    def search(self, query, **params):
+        response = self.client.get("/api/search-dishes/", {"search": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [dish["name"] for dish in response.data["results"]]
+
+    def test_prefix_matches_while_typing(self):
+        self.assertEqual(self.search("chick bir"), ["Chicken Biryani"])
+        self.assertEqual(self.search("bi"), ["Chicken Biryani", "Mutton Biryani"])
+
+    def test_typos_are_tolerated(self):
+        self.assertEqual(self.search("biriyani mutton"), ["Mutton Biryani"])
+
+    def test_name_matches_outrank_category_matches(self):
+        self.assertEqual(self.search("rice")[0], "Ghee Rice")
+
+    def test_results_are_paginated(self):
+        response = self.client.get("/api/search-dishes/", {"search": "ch", "page_size": 1})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.search("pathiri"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.create(name="Pathiri", price=3, category=self.category)
+        self.assertEqual(self.search("pathiri"), ["Pathiri"])
+
+    def test_dish_list_search_returns_every_match(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Dish.objects.bulk_create(
+                [Dish(name=f"Curry {i}", price=8, category=self.category) for i in range(600)]
+            )
+        get_dish_search_index()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/dishes/", {"search": "curry", "page": 60})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 600)
+        self.assertEqual(len(response.data["results"]), 10)
+        # Ranked and paged in Python; only the page's ten ids are queried
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("CASE", queries[0]["sql"])
+
+    def test_dish_list_search_respects_other_filters_and_ordering(self):
+        rice = Category.objects.get(name="Rice")
+        response = self.client.get("/api/dishes/", {"search": "chicken", "category": rice.id})
+        self.assertEqual([d["name"] for d in response.data["results"]], ["Chicken Biryani"])
+        response = self.client.get("/api/dishes/", {"search": "biryani", "ordering": "-price"})
+        self.assertEqual(
+            [d["name"] for d in response.data["results"]], ["Mutton Biryani", "Chicken Biryani"]
+        )
+
+    def test_dish_list_search_uses_ranked_index(self):
+        response = self.client.get("/api/dishes/", {"search": "biryani chiken"})
+        self.assertEqual([dish["name"] for dish in response.data["results"]], ["Chicken Biryani"])
+
+
+@override_settings(NOTIFICATION_FLUSH_INTERVAL=0)
+class RealtimeEventTests(APITestMixin, TestCase):
+    def events(self):
+        return list(RealtimeEvent.objects.values_list("kind", "payload"))
+
+    def test_order_lifecycle_publishes_compact_events(self):
+        dishes = self.create_dishes(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/orders/", self.order_payload(dishes, order_type="delivery"), format="json"
+            )
+        order_id = response.data["id"]
+        kinds = [kind for kind, _ in self.events()]
+        self.assertEqual(sorted(kinds), ["delivery.status", "notification", "order.created"])
+
+        order = Order.objects.get(pk=order_id)
+        order.invoice_number = "X-1"
+        order.save()
+        self.assertEqual(RealtimeEvent.objects.count(), 3)
+
+        order.status = "approved"
+        order.save()
+        delivery = DeliveryOrder.objects.get(order=order)
+        delivery.status = "accepted"
+        delivery.save()
+        kind, payload = self.events()[-2]
+        self.assertEqual(kind, "order.status")
+        self.assertEqual(payload["status"], "approved")
+        self.assertNotIn("user", payload)
+        self.assertEqual(self.events()[-1][1]["status"], "accepted")
+
+    def read_stream(self, chunks, **headers):
+        async def read():
+            client = AsyncClient()
+            token = str(AccessToken.for_user(self.user))
+            response = await client.get("/api/events/", {"token": token}, headers=headers)
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            content = response.streaming_content
+            received = []
+            async for chunk in content:
+                received.append(chunk.decode())
+                if len(received) == chunks:
+                    break
+            await content.aclose()
+            return received
+
+        return async_to_sync(read)()
+
+    def test_stream_resumes_after_last_event_id(self):
+        for number in range(3):
+            Notification.objects.create(message=f"Note {number}")
+        first, second, third = RealtimeEvent.objects.values_list("id", flat=True)
+
+        received = self.read_stream(3, **{"Last-Event-ID": str(first)})
+        self.assertTrue(received[0].startswith("retry:"))
+        self.assertTrue(received[1].startswith(f"id: {second}\nevent: notification\n"))
+        self.assertIn('"message":"Note 2"', received[2])
+
+    def test_stream_leaves_out_other_users_notifications(self):
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="secret-pass",
+            passcode="222222", role="staff",
+        )
+        Notification.objects.create(message="Start")
+        start = RealtimeEvent.objects.get().id
+        Notification.objects.create(message="For someone else", user=other)
+        Notification.objects.create(message="For me", user=self.user)
+        Notification.objects.create(message="For everyone")
+
+        received = self.read_stream(3, **{"Last-Event-ID": str(start)})
+        self.assertIn('"message":"For me"', received[1])
+        self.assertIn('"message":"For everyone"', received[2])
+
+    def test_stream_requires_a_valid_token(self):
+        response = async_to_sync(AsyncClient().get)("/api/events/", {"token": "bogus"})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "invoices": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "invoice-tests",
+        },
+    }
+)
+class InvoiceRenderingTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["invoices"].clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        os.makedirs(os.path.join(media.name, "company_logos"))
+        Image.new("RGBA", (40, 30), (200, 30, 30, 128)).save(
+            os.path.join(media.name, "company_logos", "print.png")
+        )
+        LogoInfo.objects.create(
+            company_name="Spice Route",
+            phone_number="555-0100",
+            location="Main Road",
+            office_number="1",
+            main_logo="company_logos/print.png",
+            side_logo="company_logos/print.png",
+            print_logo="company_logos/print.png",
+        )
+        response = self.client.post(
+            "/api/orders/", self.order_payload(self.create_dishes(3)), format="json"
+        )
+        self.order = Order.objects.get(pk=response.data["id"])
+
+    def test_invoice_is_rendered_off_thread_then_served_from_cache(self):
+        url = f"/api/orders/{self.order.id}/invoice/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 202)
+        invoice_renderer.submit(invoice_snapshot(self.order)).result(timeout=30)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_cache_version_follows_order_changes(self):
+        first = invoice_renderer.cache_key(invoice_snapshot(self.order))
+        self.order.status = "approved"
+        self.order.save()
+        self.assertNotEqual(invoice_renderer.cache_key(invoice_snapshot(self.order)), first)
+
+    def test_logo_is_decoded_once(self):
+        _logo_state["key"] = None
+        with mock.patch("restaurant_app.invoices.Image.open", wraps=Image.open) as image_open:
+            generate_order_pdf(self.order)
+            self.order.status = "approved"
+            self.order.save()
+            generate_order_pdf(self.order)
+        self.assertEqual(image_open.call_count, 1)
+
+    def test_logo_replaced_at_the_same_path_is_reread(self):
+        _logo_state["key"] = None
+        path = LogoInfo.objects.get().print_logo.path
+        self.assertEqual(get_print_logo(path).getSize(), (40, 30))
+
+        Image.new("RGB", (8, 8), "red").save(path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(get_print_logo(path).getSize(), (8, 8))
+
+    def test_cache_version_follows_logo_file(self):
+        first = invoice_renderer.cache_key(invoice_snapshot(self.order))
+        path = LogoInfo.objects.get().print_logo.path
+        Image.new("RGB", (8, 8), "red").save(path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertNotEqual(invoice_renderer.cache_key(invoice_snapshot(self.order)), first)
+
+    def test_long_orders_span_pages(self):
+        response = self.client.post(
+            "/api/orders/", self.order_payload(self.create_dishes(80)), format="json"
+        )
+        pdf = generate_order_pdf(Order.objects.get(pk=response.data["id"])).getvalue()
+        self.assertGreater(pdf.count(b"/Type /Page\n"), 1)
+
+    def test_saturated_pool_is_refused(self):
+        with mock.patch.object(invoice_renderer, "max_pending", 0):
+            response = self.client.get(f"/api/orders/{self.order.id}/invoice/")
+        self.assertEqual(response.status_code, 503)
+
+
+class PdfBatchTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        dishes = self.create_dishes(2)
+        self.orders = [
+            Order.objects.get(
+                pk=self.client.post(
+                    "/api/orders/", self.order_payload(dishes), format="json"
+                ).data["id"]
+            )
+            for _ in range(3)
+        ]
+        self.today = timezone.localdate()
+
+    def test_invoices_are_merged_into_one_pdf(self):
+        output = BytesIO()
+        progress = []
+        stats = render_batch(
+            "invoices", self.today, self.today, "pdf", output, workers=2,
+            progress=lambda *args: progress.append(args),
+        )
+        self.assertEqual(stats["documents"], 3)
+        self.assertEqual(len(PdfReader(output).pages), 3)
+        self.assertEqual(progress[-1], (3, 3, 3))
+        self.assertGreater(stats["pages_per_second"], 0)
+
+    def test_credit_statements_are_zipped(self):
+        credit_user = CreditUser.objects.create(
+            username="Anu", mobile_number="9000000001", total_due=Decimal("40.00")
+        )
+        CreditOrder.objects.create(order=self.orders[0], credit_user=credit_user)
+        CreditUser.objects.create(username="Settled", mobile_number="9000000002")
+
+        output = BytesIO()
+        stats = render_batch("statements", self.today, self.today, "zip", output, workers=1)
+        self.assertEqual(stats["documents"], 1)
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), ["statement-9000000001.pdf"])
+
+    def test_api_job_renders_in_background(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with self.settings(MEDIA_ROOT=media.name):
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    "/api/pdf-batches/",
+                    {"kind": "invoices", "from_date": self.today, "to_date": self.today,
+                     "output_format": "zip"},
+                    format="json",
+                )
+            self.assertEqual(response.status_code, 202, response.data)
+            self.assertEqual(len(callbacks), 1)
+
+            # Run the job here rather than on the background thread
+            run_pdf_batch_job(response.data["id"])
+            job = PdfBatchJob.objects.get(pk=response.data["id"])
+            self.assertEqual((job.status, job.done, job.pages), ("done", 3, 3))
+            with zipfile.ZipFile(job.file.path) as archive:
+                self.assertEqual(len(archive.namelist()), 3)
+
+    def test_command_rejects_impossible_dates(self):
+        for value in ("2024-02-30", "30-02-2024"):
+            with self.assertRaisesMessage(CommandError, "--from-date must be a date"):
+                call_command("render_pdf_batch", "invoices", from_date=value, stdout=StringIO())
+
+
+class MessageOutboxTests(TestCase):
+    def test_batch_is_sent_over_one_transport(self):
+        for number in range(5):
+            queue_message(f"+9100000000{number}", "Your order is ready")
+        transport = FakeTransport()
+        worker = MessageWorker(transport=transport, batch_size=10)
+        self.assertEqual(worker.run_once(), (5, 0, 0))
+        self.assertEqual(len(transport.sent), 5)
+        self.assertFalse(OutboundMessage.objects.exclude(status="sent").exists())
+        self.assertEqual(worker.run_once(), (0, 0, 0))
+
+    def test_messages_are_deduplicated(self):
+        first = queue_message("+910000000001", "Bill #7", dedupe_key="bill-7")
+        again = queue_message("+910000000001", "Bill #7", dedupe_key="bill-7")
+        self.assertEqual(first.pk, again.pk)
+
+        # Identical messages queued without a key are sent once per batch
+        queue_message("+910000000002", "Table ready")
+        queue_message("+910000000002", "Table ready")
+        transport = FakeTransport()
+        MessageWorker(transport=transport).run_once()
+        self.assertEqual(len(transport.sent), 2)
+        self.assertEqual(OutboundMessage.objects.filter(status="sent").count(), 3)
+
+    @override_settings(MESSAGE_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        message = queue_message("+910000000003", "Hello")
+        rejected = queue_message("+910000000004", "Hello")
+        worker = MessageWorker(
+            transport=FakeTransport(failure_rate=1, rejected_numbers=[rejected.to_number])
+        )
+        self.assertEqual(worker.run_once(), (0, 1, 1))
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ("pending", 1))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertEqual(worker.run_once(), (0, 0, 0))
+
+        OutboundMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(worker.run_once(), (0, 0, 1))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ("failed", 2))
+
+    def test_abandoned_claims_are_picked_up_again(self):
+        message = queue_message("+910000000005", "Hello")
+        OutboundMessage.objects.filter(pk=message.pk).update(
+            status="sending", claimed_at=timezone.now() - MessageWorker.lease * 2
+        )
+        self.assertEqual(MessageWorker(transport=FakeTransport()).run_once(), (1, 0, 0))
+
+    def test_send_sms_only_queues(self):
+        with mock.patch("twilio.rest.Client") as client:
+            self.assertTrue(send_sms("whatsapp:+910000000006", "Order #1 received"))
+        client.assert_not_called()
+        self.assertEqual(OutboundMessage.objects.get().to_number, "+910000000006")
+
+
+@override_settings(SHORT_LINK_BASE_URL="https://rm.example")
+class ShortLinkTests(TestCase):
+    def setUp(self):
+        self.reset_hit_counter()
+        self.addCleanup(self.reset_hit_counter)
+
+    @staticmethod
+    def reset_hit_counter():
+        with hit_counter.lock:
+            hit_counter.counts.clear()
+            if hit_counter.timer is not None:
+                hit_counter.timer.cancel()
+                hit_counter.timer = None
+
+    def code(self, url):
+        return url.rsplit("/", 1)[1]
+
+    def test_shorten_url_is_local(self):
+        with mock.patch("requests.get") as get:
+            url = shorten_url("https://rm.example/orders/42/invoice/")
+        get.assert_not_called()
+        self.assertRegex(url, r"^https://rm\.example/s/[0-9A-Za-z]{7}$")
+        self.assertIsNotNone(ShortLink.objects.get(code=self.code(url)).expires_at)
+
+    def test_redirect_is_served_from_the_lru(self):
+        code = self.code(shorten_url("https://rm.example/track/7"))
+        response = self.client.get(f"/s/{code}")
+        self.assertRedirects(response, "https://rm.example/track/7", fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.client.get(f"/s/{code}")
+        self.assertIsNotNone(link_cache.get(code))
+
+    def test_hits_are_flushed_in_one_update(self):
+        first = self.code(shorten_url("https://rm.example/a"))
+        second = self.code(shorten_url("https://rm.example/b"))
+        for code in (first, first, second):
+            self.client.get(f"/s/{code}")
+        with self.assertNumQueries(1):
+            hit_counter.flush()
+        self.assertEqual(
+            dict(ShortLink.objects.values_list("code", "hit_count")), {first: 2, second: 1}
+        )
+
+    def test_quiet_links_are_flushed_by_the_timer(self):
+        code = self.code(shorten_url("https://rm.example/quiet"))
+        fired = threading.Event()
+        # The timer's own connection can't see this test's transaction, so
+        # only check that it fires; the flush itself is covered above
+        with mock.patch.object(hit_counter, "interval", 0.05), \
+                mock.patch.object(hit_counter, "_flush_from_timer", fired.set):
+            self.client.get(f"/s/{code}")
+            self.assertTrue(fired.wait(1))
+        self.assertEqual(hit_counter.counts[code], 1)
+
+    def test_failed_flush_keeps_the_counts(self):
+        code = self.code(shorten_url("https://rm.example/busy"))
+        self.client.get(f"/s/{code}")
+        locked = OperationalError("database is locked")
+        with mock.patch.object(ShortLink.objects, "filter", side_effect=locked):
+            with self.assertLogs("restaurant_app.shortlinks", "ERROR"):
+                self.assertFalse(hit_counter.flush())
+        self.assertEqual(hit_counter.counts[code], 1)
+        self.assertTrue(hit_counter.flush())
+        self.assertEqual(ShortLink.objects.get(code=code).hit_count, 1)
+
+    def test_expired_and_unknown_links(self):
+        code = self.code(shorten_url("https://rm.example/old", expires_in=timedelta(seconds=-1)))
+        self.assertEqual(self.client.get(f"/s/{code}").status_code, 410)
+        self.assertEqual(self.client.get("/s/nothere").status_code, 404)
+
+
+class CreditLedgerTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.credit_user = CreditUser.objects.create(
+            username="Anu", mobile_number="9000000001", limit_amount=Decimal("1000")
+        )
+
+    def credit_order(self):
+        dishes = self.create_dishes(1, price="25.00")
+        order_id = self.client.post(
+            "/api/orders/", self.order_payload(dishes), format="json"
+        ).data["id"]
+        payload = {
+            "status": "delivered",
+            "payment_method": "credit",
+            "credit_user_id": self.credit_user.id,
+        }
+        response = self.client.patch(f"/api/order-status/{order_id}/", payload, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return order_id, payload
+
+    def test_credit_orders_are_charged_once_through_the_ledger(self):
+        order_id, payload = self.credit_order()
+        self.client.patch(f"/api/order-status/{order_id}/", payload, format="json")
+        self.credit_user.refresh_from_db()
+        self.assertEqual(self.credit_user.total_due, Decimal("50.00"))
+        entry = CreditLedgerEntry.objects.get()
+        self.assertEqual((entry.entry_type, entry.amount, entry.order_id), ("charge", Decimal("50.00"), order_id))
+
+    def test_concurrent_charges_are_not_lost(self):
+        # Two terminals holding the same stale row
+        first = CreditUser.objects.get(pk=self.credit_user.pk)
+        second = CreditUser.objects.get(pk=self.credit_user.pk)
+        first.add_to_total_due(Decimal("10.00"))
+        second.add_to_total_due(Decimal("15.00"))
+        self.credit_user.refresh_from_db()
+        self.assertEqual(self.credit_user.total_due, Decimal("25.00"))
+        self.assertEqual(self.credit_user.ledger_balance(), Decimal("25.00"))
+
+    def test_payment_is_capped_and_recorded(self):
+        self.credit_user.add_to_total_due(Decimal("30.00"))
+        response = self.client.post(
+            f"/api/credit-users/{self.credit_user.id}/make_payment/", {"payment_amount": "45"}
+        )
+        self.assertEqual(Decimal(response.data["total_due"]), Decimal("0.00"))
+        self.assertEqual(CreditLedgerEntry.objects.last().amount, Decimal("-30.00"))
+
+    def test_total_due_cannot_be_edited_directly(self):
+        self.client.patch(
+            f"/api/credit-users/{self.credit_user.id}/", {"total_due": "999"}, format="json"
+        )
+        self.credit_user.refresh_from_db()
+        self.assertEqual(self.credit_user.total_due, Decimal("0.00"))
+
+    def test_profile_edit_does_not_overwrite_a_concurrent_charge(self):
+        stale = CreditUser.objects.get(pk=self.credit_user.pk)
+        self.credit_user.add_to_total_due(Decimal("20.00"))
+        serializer = CreditUserSerializer(stale, data={"username": "Anu K"}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.credit_user.refresh_from_db()
+        self.assertEqual(
+            (self.credit_user.username, self.credit_user.total_due), ("Anu K", Decimal("20.00"))
+        )
+
+    def test_failed_charge_leaves_the_order_uncharged(self):
+        with mock.patch.object(CreditUser, "add_to_total_due", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.credit_order()
+        self.assertFalse(CreditOrder.objects.exists())
+
+    def test_snapshots_bound_balance_and_statement_work(self):
+        for _ in range(12):
+            self.credit_user.add_to_total_due(Decimal("5.00"))
+        call_command("snapshot_credit_balances", every=5, stdout=StringIO())
+        self.credit_user.add_to_total_due(Decimal("5.00"))
+        self.credit_user.make_payment(Decimal("20.00"))
+
+        snapshot = self.credit_user.balance_snapshots.get()
+        self.assertEqual(snapshot.balance, Decimal("60.00"))
+        with CaptureQueriesContext(connection) as queries:
+            balance = self.credit_user.ledger_balance()
+        self.assertEqual(balance, Decimal("45.00"))
+        self.assertEqual(balance, self.credit_user.total_due)
+        # Only the two entries after the snapshot are summed
+        self.assertIn(f'"id" > {snapshot.last_entry_id}', queries[-1]["sql"])
+
+        today = timezone.localdate()
+        response = self.client.get(
+            f"/api/credit-users/{self.credit_user.id}/statement/",
+            {"from_date": today, "to_date": today, "page_size": 10},
+        )
+        self.assertEqual(response.data["opening_balance"], Decimal("0.00"))
+        self.assertEqual(response.data["closing_balance"], Decimal("45.00"))
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertIsNotNone(response.data["next"])
+
+    def test_statement_rejects_impossible_dates(self):
+        response = self.client.get(
+            f"/api/credit-users/{self.credit_user.id}/statement/",
+            {"from_date": "2024-13-45", "to_date": "2024-12-31"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill_records_pre_ledger_balances(self):
+        CreditUser.objects.filter(pk=self.credit_user.pk).update(total_due=Decimal("70.00"))
+        call_command("snapshot_credit_balances", backfill=True, stdout=StringIO())
+        self.assertEqual(self.credit_user.ledger_balance(), Decimal("70.00"))
+
+
+class CreditPaymentConcurrencyTests(TransactionTestCase):
+    def test_parallel_payments_never_exceed_the_balance(self):
+        credit_user = CreditUser.objects.create(
+            username="Anu", mobile_number="9000000001", limit_amount=Decimal("1000")
+        )
+        credit_user.add_to_total_due(Decimal("30.00"))
+
+        def pay(_):
+            try:
+                return CreditUser.objects.get(pk=credit_user.pk).make_payment(Decimal("10.00"))
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            applied = list(executor.map(pay, range(8)))
+
+        self.assertEqual(sum(applied), Decimal("30.00"))
+        credit_user.refresh_from_db()
+        self.assertEqual(credit_user.total_due, Decimal("0.00"))
+        self.assertEqual(credit_user.ledger_balance(), Decimal("0.00"))
+
+
+class MessPaymentMixin(APITestMixin):
+    def create_mess(self, name="Asha", mobile_number="5550101"):
+        mess_type, _ = MessType.objects.get_or_create(name="breakfast_lunch")
+        return Mess.objects.create(
+            customer_name=name,
+            mobile_number=mobile_number,
+            start_date="2024-08-01",
+            end_date="2024-08-31",
+            mess_type=mess_type,
+            total_amount=Decimal("3000.00"),
+            paid_amount=Decimal("1000.00"),
+            pending_amount=Decimal("2000.00"),
+            cash_amount=Decimal("1000.00"),
+        )
+
+    def assertBalances(self, mess, paid, pending, cash, bank):
+        mess.refresh_from_db()
+        self.assertEqual(
+            (mess.paid_amount, mess.pending_amount, mess.cash_amount, mess.bank_amount),
+            tuple(Decimal(amount) for amount in (paid, pending, cash, bank)),
+        )
+
+
+class MessPaymentTests(MessPaymentMixin, TestCase):
+    def test_initial_transaction_does_not_change_balances(self):
+        mess = self.create_mess()
+        initial = mess.transactions.get()
+        self.assertEqual(initial.received_amount, Decimal("1000.00"))
+        self.assertTrue(Mess.objects.get(pk=mess.pk).initial_transaction_created)
+        self.assertBalances(mess, "1000", "2000", "1000", "0")
+
+    def test_payment_and_edit_apply_increments(self):
+        mess = self.create_mess()
+        response = self.client.post(
+            "/api/transactions/",
+            {"mess": mess.id, "received_amount": "500", "cash_amount": "200",
+             "bank_amount": "300", "payment_method": "cash-bank", "status": "completed"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertBalances(mess, "1500", "1500", "1200", "300")
+
+        # Editing applies only the difference
+        self.client.patch(
+            f"/api/transactions/{response.data['id']}/",
+            {"received_amount": "600", "bank_amount": "400"},
+        )
+        self.assertBalances(mess, "1600", "1400", "1200", "400")
+
+    def test_mess_edit_keeps_recorded_payments(self):
+        mess = self.create_mess()
+        stale = Mess.objects.get(pk=mess.pk)
+        Transaction.import_payments(
+            [Transaction(mess=mess, received_amount=500, bank_amount=500, status="completed")]
+        )
+        serializer = MessSerializer(
+            stale, data={"end_date": "2024-09-30", "paid_amount": "0"}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertBalances(mess, "1500", "1500", "1000", "500")
+        self.assertEqual(str(mess.end_date), "2024-09-30")
+
+    def test_bulk_import_uses_one_update_per_batch(self):
+        messes = [self.create_mess(f"Member {i}", f"55502{i:02d}") for i in range(5)]
+        rows = [
+            {"mess": mess.id, "received_amount": "100", "cash_amount": "100",
+             "payment_method": "cash", "status": "completed"}
+            for mess in messes for _ in range(4)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/transactions/bulk_import/", rows, format="json")
+        self.assertEqual(response.data, {"created": 20})
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "restaurant_app_mess"')]
+        self.assertEqual(len(updates), 1)
+        for mess in messes:
+            self.assertBalances(mess, "1400", "1600", "1400", "0")
+
+
+class MessPaymentConcurrencyTests(MessPaymentMixin, TransactionTestCase):
+    def test_concurrent_payments_reconcile(self):
+        mess = self.create_mess()
+
+        def post_payment(i):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                return client.post(
+                    "/api/transactions/",
+                    {"mess": mess.id, "received_amount": "10", "cash_amount": "10",
+                     "payment_method": "cash", "status": "completed"},
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            codes = list(executor.map(post_payment, range(80)))
+
+        self.assertEqual(codes, [201] * 80)
+        totals = mess.transactions.aggregate(received=Sum("received_amount"), cash=Sum("cash_amount"))
+        self.assertEqual(totals, {"received": Decimal("1800.00"), "cash": Decimal("1800.00")})
+        self.assertBalances(mess, "1800", "1200", "1800", "0")
+
+
+class InvoiceNumberTests(APITestMixin, TestCase):
+    def create_order(self):
+        return Order.objects.create(user=self.user, total_amount=Decimal("10.00"))
+
+    def test_number_is_assigned_before_the_single_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            order = self.create_order()
+        order_writes = [
+            q["sql"] for q in queries
+            if re.match(r'(INSERT INTO|UPDATE) "restaurant_app_order"', q["sql"])
+        ]
+        self.assertEqual(len(order_writes), 1)
+        self.assertEqual(order.invoice_number, "0001")
+
+    def test_sequence_continues_after_existing_order_ids(self):
+        first = self.create_order()
+        InvoiceSequence.objects.all().delete()
+        self.assertEqual(self.create_order().invoice_number, f"{first.id + 1:04d}")
+
+    @override_settings(INVOICE_NUMBER_RESET="daily", INVOICE_BRANCH_CODE="KOC")
+    def test_daily_branch_numbers_reset_and_stay_gap_free(self):
+        self.assertEqual(self.create_order().invoice_number[-5:], "-0001")
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.create_order()
+                raise RuntimeError("payment failed")
+        # The rolled back order gave its number back
+        order = self.create_order()
+        self.assertEqual(order.invoice_number, f"KOC{timezone.localdate():%y%m%d}-0002")
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(
+            InvoiceSequence.next_invoice_number(day=tomorrow), f"KOC{tomorrow:%y%m%d}-0001"
+        )
+
+
+class InvoiceNumberConcurrencyTests(APITestMixin, TransactionTestCase):
+    def test_concurrent_orders_get_distinct_consecutive_numbers(self):
+        def create_orders(_):
+            try:
+                return [
+                    Order.objects.create(user=self.user, total_amount=Decimal("1")).invoice_number
+                    for _ in range(10)
+                ]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            numbers = [number for batch in executor.map(create_orders, range(6)) for number in batch]
+
+        self.assertEqual(sorted(numbers), [f"{n:04d}" for n in range(1, 61)])
+
+
+class NotificationWriterTests(APITestMixin, TestCase):
+    @override_settings(NOTIFICATION_FLUSH_INTERVAL=60, NOTIFICATION_BATCH_SIZE=3)
+    def test_notifications_are_written_in_batches_after_commit(self):
+        dishes = self.create_dishes(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/orders/", self.order_payload(dishes), format="json")
+            self.assertFalse(Notification.objects.exists())
+        # Waiting for the rest of the batch
+        self.assertFalse(Notification.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notify("order.created", order_id=2, total_amount="5.00")
+            notify("order.created", order_id=3, total_amount="7.00")
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertIsNone(notification_writer.timer)
+
+        data = self.client.get("/api/notifications/unread/").data
+        messages = {notification["message"] for notification in data}
+        self.assertIn(
+            f"New order created: Order #{response.data['id']} with a total amount of $20.00",
+            messages,
+        )
+        self.assertEqual(RealtimeEvent.objects.filter(kind="notification").count(), 3)
+
+    @override_settings(NOTIFICATION_FLUSH_INTERVAL=60)
+    def test_failed_batch_is_kept_and_retried(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify("order.created", order_id=1, total_amount="5.00")
+            notify("order.created", order_id=2, total_amount="7.00")
+
+        locked = OperationalError("database is locked")
+        with mock.patch.object(Notification.objects, "bulk_create", side_effect=locked):
+            with self.assertLogs("restaurant_app.notifications", "ERROR"):
+                self.assertFalse(notification_writer.flush())
+        self.assertEqual(len(notification_writer.pending), 2)
+        self.assertIsNotNone(notification_writer.timer)
+
+        self.assertTrue(notification_writer.flush())
+        self.assertEqual(
+            sorted(Notification.objects.values_list("params__order_id", flat=True)), [1, 2]
+        )
+        self.assertEqual(NotificationCounter.unread_for(self.user), 2)
+
+    def test_rolled_back_notifications_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    notify("order.created", order_id=1, total_amount="5.00")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_prune_archives_and_deletes_old_read_notifications(self):
+        old = timezone.now() - timedelta(days=40)
+        Notification.objects.bulk_create(
+            [Notification(template="order.created", params={"order_id": i, "total_amount": "1"},
+                          is_read=i % 2 == 0) for i in range(6)]
+        )
+        Notification.objects.update(created_at=old)
+        Notification.objects.create(message="Recent", is_read=True)
+
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            archive = os.path.join(scratch_dir, "notifications.jsonl")
+            call_command("prune_notifications", days=30, archive=archive, batch_size=2,
+                         stdout=StringIO())
+            with open(archive) as f:
+                archived = [json.loads(line) for line in f]
+
+        self.assertEqual(sorted(row["params"]["order_id"] for row in archived), [0, 2, 4])
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 3)
+        self.assertTrue(Notification.objects.filter(message="Recent").exists())
+        self.assertEqual(Notification.objects.count(), 4)
+
+
+class NotificationCounterTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(
+            username="other", password="secret-pass", passcode="654321", role="staff"
+        )
+        for number in range(4):
+            Notification.objects.create(message=f"Everyone {number}")
+        Notification.objects.create(message="Mine", user=self.user)
+        Notification.objects.create(message="Theirs", user=self.other)
+
+    def unread_count(self):
+        with self.assertNumQueries(1):
+            return self.client.get("/api/notifications/unread_count/").data["unread"]
+
+    def test_counter_follows_inserts_and_reads(self):
+        self.assertEqual(self.unread_count(), 5)
+        self.assertEqual(len(self.client.get("/api/notifications/unread/").data), 5)
+
+        notification = Notification.objects.get(message="Everyone 0")
+        self.client.post(f"/api/notifications/{notification.id}/mark_as_read/")
+        self.client.post(f"/api/notifications/{notification.id}/mark_as_read/")
+        self.assertEqual(self.unread_count(), 4)
+
+        Notification.objects.get(message="Mine").delete()
+        self.assertEqual(self.unread_count(), 3)
+
+    def test_mark_read_by_ids_and_before_is_one_update_per_recipient(self):
+        ids = list(
+            Notification.objects.filter(message__startswith="Everyone")
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        theirs = Notification.objects.get(message="Theirs")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/notifications/mark_read/", {"ids": ids[:2] + [theirs.id]}, format="json"
+            )
+        self.assertEqual(response.data, {"marked": 2, "unread": 3})
+        updates = [q["sql"] for q in queries if q["sql"].startswith('UPDATE "restaurant_app_notification"')]
+        # One for broadcasts, one for the user's own; each decrements its counter
+        self.assertEqual(len(updates), 2)
+
+        Notification.objects.filter(id=ids[3]).update(created_at=timezone.now() + timedelta(hours=1))
+        response = self.client.post(
+            "/api/notifications/mark_read/", {"before": timezone.now().isoformat()}, format="json"
+        )
+        self.assertEqual(response.data, {"marked": 2, "unread": 1})
+
+        response = self.client.post("/api/notifications/mark_all_read/")
+        self.assertEqual(response.data, {"marked": 1, "unread": 0})
+        # Other users' notifications are left alone
+        self.assertFalse(Notification.objects.get(message="Theirs").is_read)
+
+    def test_counters_are_maintained_for_batched_notifications(self):
+        with override_settings(NOTIFICATION_FLUSH_INTERVAL=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                notify("order.created", order_id=1, total_amount="5.00")
+                notify("order.created", order_id=2, total_amount="5.00")
+        self.assertEqual(self.unread_count(), 7)
+
+    def test_rebuild_command_recounts(self):
+        NotificationCounter.objects.update(unread=99)
+        call_command("rebuild_notification_counters", stdout=StringIO())
+        self.assertEqual(self.unread_count(), 5)
+        self.assertEqual(NotificationCounter.objects.get(recipient=self.other.id).unread, 1)
+
+    def test_counter_never_goes_negative(self):
+        NotificationCounter.objects.update(unread=0)
+        Notification.mark_read(self.user)
+        self.assertEqual(self.unread_count(), 0)
+        self.assertFalse(NotificationCounter.objects.filter(unread__lt=0).exists())
+
+    def test_invalid_mark_read_payload(self):
+        response = self.client.post("/api/notifications/mark_read/", {"ids": "1,2"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class FloorPlanTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        floor_index_state.update(version=None, index=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.floor = Floor.objects.create(name="Ground")
+            self.table = Table.objects.create(
+                table_name="T1", seats_count=4, capacity=4, floor=self.floor
+            )
+            Table.objects.create(table_name="T2", seats_count=2, capacity=2, floor=self.floor)
+            Floor.objects.create(name="Terrace")
+
+    def plan(self):
+        response = self.client.get("/api/floors/plan/")
+        return {
+            table["table_name"]: table for floor in response.data for table in floor["tables"]
+        }
+
+    def seat_order(self):
+        dishes = self.create_dishes(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/orders/", self.order_payload(dishes, table=self.table.id), format="json"
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Order.objects.get(pk=response.data["id"])
+
+    def test_table_follows_order_bill_and_close(self):
+        order = self.seat_order()
+        t1 = self.plan()["T1"]
+        self.assertEqual((t1["status"], t1["current_order_id"]), ("seated", order.id))
+        self.assertEqual(t1["seated_minutes"], 0)
+        self.assertFalse(Table.objects.get(pk=self.table.pk).is_ready)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Bill.objects.create(order=order, total_amount=order.total_amount)
+        self.assertEqual(self.plan()["T1"]["status"], "billed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                f"/api/order-status/{order.id}/", {"status": "delivered", "payment_method": "cash"}
+            )
+        t1 = self.plan()["T1"]
+        self.assertEqual(
+            (t1["status"], t1["current_order_id"], t1["seated_at"]), ("cleaning", None, None)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/tables/{self.table.id}/set_status/", {"status": "free"})
+        self.assertEqual(self.plan()["T1"]["status"], "free")
+        self.assertTrue(Table.objects.get(pk=self.table.pk).is_ready)
+
+    def test_moving_an_order_releases_the_old_table(self):
+        order = self.seat_order()
+        t2 = Table.objects.get(table_name="T2")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/orders/{order.id}/", {"table": t2.id}, format="json"
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        plan = self.plan()
+        self.assertEqual((plan["T1"]["status"], plan["T1"]["current_order_id"]), ("cleaning", None))
+        self.assertEqual((plan["T2"]["status"], plan["T2"]["current_order_id"]), ("seated", order.id))
+
+        # T1 is seatable again, but T2 is taken by the moved order
+        other = self.seat_order()
+        response = self.client.patch(f"/api/orders/{other.id}/", {"table": t2.id}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("table", response.data)
+        self.assertEqual(Table.objects.get(pk=self.table.pk).current_order_id, other.id)
+        self.assertEqual(Order.objects.get(pk=other.id).table_id, self.table.id)
+
+    def test_busy_table_rejects_a_second_order(self):
+        order = self.seat_order()
+        seated_at = Table.objects.get(pk=self.table.pk).seated_at
+        response = self.client.post(
+            "/api/orders/",
+            self.order_payload(self.create_dishes(1), table=self.table.id),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("table", response.data)
+        self.assertEqual(Order.objects.count(), 1)
+        table = Table.objects.get(pk=self.table.pk)
+        self.assertEqual((table.current_order_id, table.seated_at), (order.id, seated_at))
+
+        # The first order still bills and closes the table
+        with self.captureOnCommitCallbacks(execute=True):
+            Bill.objects.create(order=order, total_amount=order.total_amount)
+        self.assertEqual(self.plan()["T1"]["status"], "billed")
+
+    def test_cancelled_order_frees_the_table(self):
+        order = self.seat_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/order-status/{order.id}/", {"status": "cancelled"})
+        self.assertEqual(self.plan()["T1"]["status"], "free")
+
+    def test_plan_is_served_from_memory(self):
+        response = self.client.get("/api/floors/plan/")
+        self.assertEqual([floor["name"] for floor in response.data], ["Ground", "Terrace"])
+        self.assertEqual(
+            response.data[0]["counts"], {"free": 2, "seated": 0, "billed": 0, "cleaning": 0}
+        )
+        with self.assertNumQueries(0):
+            self.client.get("/api/floors/plan/", {"floor": "Ground"})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/tables/", {"floor": "Ground"})
+        self.assertEqual(response.data["count"], 2)
+        self.assertFalse(any("restaurant_app_floor" in q["sql"] for q in queries))
+
+    def test_ready_toggle_maps_to_status(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/tables/{self.table.id}/", {"is_ready": False})
+        self.assertEqual(response.data["status"], "cleaning")
+        self.assertEqual(self.plan()["T1"]["status"], "cleaning")
+
+
+class FloorSnapshotTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            ground = Floor.objects.create(name="Ground")
+            self.table = Table.objects.create(
+                table_name="T1", seats_count=4, capacity=4, floor=ground
+            )
+            Table.objects.create(table_name="T2", seats_count=2, capacity=2, floor=ground)
+            Floor.objects.create(name="Terrace")
+
+    def test_snapshot_nests_tables_and_revalidates_with_etag(self):
+        with self.assertNumQueries(2):  # floors, then their tables
+            response = self.client.get("/api/floors/snapshot/")
+        self.assertEqual(
+            [(floor["name"], [t["table_name"] for t in floor["tables"]]) for floor in response.data],
+            [("Ground", ["T1", "T2"]), ("Terrace", [])],
+        )
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/floors/snapshot/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Unrelated writes keep the ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_dishes(1)
+        self.assertEqual(self.client.get("/api/floors/snapshot/")["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/tables/{self.table.id}/", {"table_name": "Window 1"})
+        response = self.client.get("/api/floors/snapshot/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.data[0]["tables"][1]["table_name"], "Window 1")
+
+    def test_floor_list_returns_names(self):
+        self.assertEqual(self.client.get("/api/floors/").data, ["Ground", "Terrace"])
+
+
+class CouponTestMixin(APITestMixin):
+    def setUp(self):
+        super().setUp()
+        coupon_index_state.update(version=None, index=None)
+        self.dishes = self.create_dishes(1, price="25.00")
+
+    def create_coupon(self, **fields):
+        fields.setdefault("code", "SPIKE10")
+        fields.setdefault("discount_amount", Decimal("10.00"))
+        fields.setdefault("end_date", timezone.now() + timedelta(days=1))
+        return Coupon.objects.create(**fields)
+
+    def post_order(self, client=None, code="SPIKE10"):
+        return (client or self.client).post(
+            "/api/orders/", self.order_payload(self.dishes, coupon_code=code), format="json"
+        )
+
+
+class CouponRedemptionTests(CouponTestMixin, TestCase):
+    def test_coupon_discounts_the_order_and_counts_the_use(self):
+        coupon = self.create_coupon(discount_percentage=Decimal("20"), min_purchase_amount=50)
+        response = self.post_order()
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data["discount_amount"]), Decimal("10.00"))
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("40.00"))
+        self.assertEqual(response.data["coupon"], coupon.id)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_count, 1)
+
+    def test_updating_a_coupon_order_keeps_its_discount(self):
+        self.create_coupon()
+        self.create_coupon(code="TENPCT", discount_amount=0, discount_percentage=Decimal("10"))
+        response = self.post_order()
+        order_id = response.data["id"]
+        response = self.client.patch(
+            f"/api/orders/{order_id}/", {"kitchen_note": "x"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("40.00"))
+        self.assertEqual(Decimal(response.data["discount_amount"]), Decimal("10.00"))
+
+        order_id = self.post_order(code="TENPCT").data["id"]
+        response = self.client.patch(
+            f"/api/orders/{order_id}/",
+            {"items": [{"dish": self.dishes[0].id, "quantity": 2}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Decimal(response.data["discount_amount"]), Decimal("10.00"))
+        self.assertEqual(Decimal(response.data["total_amount"]), Decimal("90.00"))
+
+    def test_rejected_coupons_create_no_order(self):
+        self.create_coupon(usage_limit=1, usage_count=1)
+        self.create_coupon(code="BIG", min_purchase_amount=100)
+        self.assertEqual(self.post_order().status_code, 400)
+        self.assertEqual(self.post_order(code="BIG").status_code, 400)
+        self.assertEqual(self.post_order(code="NOPE").status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_index_is_in_memory_and_reloads_on_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon = self.create_coupon()
+        self.assertIsNotNone(get_coupon_index().get("SPIKE10"))
+        with self.assertNumQueries(0):
+            get_coupon_index().get("SPIKE10")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            coupon.is_active = False
+            coupon.save()
+        self.assertIsNone(get_coupon_index().get("SPIKE10"))
+
+
+class CouponCampaignTests(CouponTestMixin, TestCase):
+    def create_campaign(self, code_count=12):
+        response = self.client.post(
+            "/api/coupon-campaigns/",
+            {
+                "name": "Spring",
+                "prefix": "spring",
+                "code_count": code_count,
+                "discount_amount": "5.00",
+                "end_date": (timezone.now() + timedelta(days=7)).isoformat(),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return CouponCampaign.objects.get(pk=response.data["id"])
+
+    @mock.patch.object(CouponCampaign, "CHUNK_SIZE", 5)
+    def test_codes_are_unique_and_inserted_in_chunks(self):
+        with mock.patch.object(
+            Coupon.objects, "bulk_create", wraps=Coupon.objects.bulk_create
+        ) as bulk_create:
+            campaign = self.create_campaign(code_count=12)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [5, 5, 2])
+        codes = list(campaign.coupons.values_list("code", flat=True))
+        self.assertEqual(len(set(codes)), 12)
+        self.assertTrue(all(re.fullmatch(r"SPRING-[2-9A-HJ-NP-Z]{10}", code) for code in codes))
+        self.assertFalse(campaign.coupons.exclude(usage_limit=1).exists())
+
+    def test_campaign_codes_redeem_once_and_stay_out_of_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign = self.create_campaign()
+        code = campaign.coupons.first().code
+        index = get_coupon_index()
+        self.assertEqual(index.coupons, {})
+        self.assertIsNone(index.get("OTHER-2345678923"))
+
+        self.assertEqual(self.post_order(code=code).status_code, 201)
+        self.assertEqual(self.post_order(code=code).status_code, 400)
+
+    def test_revoke_is_a_single_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            campaign = self.create_campaign()
+        code = campaign.coupons.first().code
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f"/api/coupon-campaigns/{campaign.pk}/revoke/")
+        self.assertEqual(response.data["revoked"], 12)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)  # the coupons and the campaign row
+        self.assertFalse(campaign.coupons.filter(is_active=True).exists())
+        self.assertIsNone(get_coupon_index().get(code))
+        self.assertEqual(self.post_order(code=code).status_code, 400)
+
+    def test_export_streams_the_codes_as_csv(self):
+        campaign = self.create_campaign()
+        response = self.client.get(f"/api/coupon-campaigns/{campaign.pk}/export/")
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ["code", "is_active", "usage_count", "start_date", "end_date"])
+        self.assertEqual(
+            {row[0] for row in rows[1:]}, set(campaign.coupons.values_list("code", flat=True))
+        )
+
+    def test_coupon_list_leaves_out_campaign_codes(self):
+        self.create_coupon()
+        campaign = self.create_campaign()
+        self.assertEqual([c["code"] for c in self.client.get("/api/coupons/").data], ["SPIKE10"])
+        response = self.client.get(f"/api/coupons/?campaign={campaign.pk}")
+        self.assertEqual(len(response.data), 12)
+        response = self.client.get("/api/coupons/?include_campaigns=true")
+        self.assertEqual(len(response.data), 13)
+
+    def test_prefix_is_unique_whatever_its_case(self):
+        self.create_campaign()
+        response = self.client.post(
+            "/api/coupon-campaigns/",
+            {"name": "Again", "prefix": "Spring", "code_count": 1,
+             "end_date": timezone.now().isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("prefix", response.data)
+
+    @mock.patch.object(CouponCampaign, "CHUNK_SIZE", 5)
+    def test_interrupted_generation_is_not_redeemable_until_completed(self):
+        bulk_create = Coupon.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise RuntimeError("worker timed out")
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(CouponCampaign, "CHUNK_SIZE", 5), \
+                mock.patch.object(Coupon.objects, "bulk_create", side_effect=fail_second_chunk):
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError):
+                    self.create_campaign()
+        campaign = CouponCampaign.objects.get()
+        self.assertEqual((campaign.status, campaign.coupons.count()), ("generating", 5))
+        code = campaign.coupons.first().code
+        self.assertIsNone(get_coupon_index().get(code))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/coupon-campaigns/{campaign.pk}/complete/")
+        self.assertEqual(response.data["status"], "ready")
+        self.assertEqual(campaign.coupons.count(), 12)
+        self.assertEqual(self.post_order(code=code).status_code, 201)
+
+    def test_bad_campaign_filter_is_a_client_error(self):
+        self.assertEqual(self.client.get("/api/coupons/?campaign=abc").status_code, 400)
+
+    def test_staff_only_and_code_count_is_bounded(self):
+        response = self.client.post(
+            "/api/coupon-campaigns/",
+            {"name": "Huge", "prefix": "HUGE", "code_count": 100_001,
+             "end_date": timezone.now().isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.user.role = "driver"
+        self.user.save()
+        self.assertEqual(self.client.get("/api/coupon-campaigns/").status_code, 403)
+
+
+class CouponConcurrencyTests(CouponTestMixin, TransactionTestCase):
+    def test_campaign_chunks_commit_one_by_one(self):
+        self.user.role = "admin"
+        self.user.save()
+        bulk_create = Coupon.objects.bulk_create
+        seen_by_others = []
+
+        def count_from_another_connection():
+            try:
+                return Coupon.objects.count()
+            finally:
+                connection.close()
+
+        def insert(objs, *args, **kwargs):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                seen_by_others.append(executor.submit(count_from_another_connection).result())
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(CouponCampaign, "CHUNK_SIZE", 5), \
+                mock.patch.object(Coupon.objects, "bulk_create", side_effect=insert):
+            response = self.client.post(
+                "/api/coupon-campaigns/",
+                {"name": "Spring", "prefix": "SPRING", "code_count": 12,
+                 "end_date": (timezone.now() + timedelta(days=7)).isoformat()},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        # Earlier chunks were already committed, not held in one transaction
+        self.assertEqual(seen_by_others, [0, 5, 10])
+        self.assertEqual(CouponCampaign.objects.get().status, "ready")
+
+    def test_parallel_redemptions_never_exceed_the_limit(self):
+        coupon = self.create_coupon(usage_limit=100)
+
+        def redeem(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                return self.post_order(client).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            codes = list(executor.map(redeem, range(500)))
+
+        self.assertEqual(codes.count(201), 100)
+        self.assertEqual(codes.count(400), 400)
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_count, 100)
+        self.assertEqual(Order.objects.filter(coupon=coupon).count(), 100)
+
+
+class MenuSubTotalTests(APITestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup, self.rice, self.curry = Dish.objects.bulk_create(
+            [
+                Dish(name="Soup", price=Decimal("4.00"), category=self.category),
+                Dish(name="Rice", price=Decimal("3.50"), category=self.category),
+                Dish(name="Curry", price=Decimal("9.00"), category=self.category),
+            ]
+        )
+        self.lunch = Menu.objects.create(name="Lunch")
+        self.dinner = Menu.objects.create(name="Dinner")
+
+    def sub_totals(self):
+        return dict(Menu.objects.values_list("name", "sub_total"))
+
+    def test_add_move_and_remove_adjust_in_the_database(self):
+        with self.assertNumQueries(2):  # the insert and one UPDATE, no menu or dish reads
+            MenuItem.objects.create(menu=self.lunch, dish=self.soup)
+        item = MenuItem.objects.create(menu=self.lunch, dish=self.curry)
+        self.assertEqual(self.sub_totals(), {"Lunch": Decimal("13.00"), "Dinner": 0})
+
+        item = MenuItem.objects.get(pk=item.pk)
+        item.menu = self.dinner
+        item.save()
+        self.assertEqual(self.sub_totals(), {"Lunch": Decimal("4.00"), "Dinner": Decimal("9.00")})
+
+        item.dish = self.rice
+        item.save()
+        self.assertEqual(self.sub_totals()["Dinner"], Decimal("3.50"))
+
+        item.delete()
+        self.assertEqual(self.sub_totals(), {"Lunch": Decimal("4.00"), "Dinner": 0})
+
+    def test_price_change_recomputes_affected_menus_in_one_query(self):
+        for menu in (self.lunch, self.dinner):
+            MenuItem.objects.create(menu=menu, dish=self.soup)
+            MenuItem.objects.create(menu=menu, dish=self.rice)
+        soup = Dish.objects.get(pk=self.soup.pk)
+        soup.price = Decimal("5.00")
+        with CaptureQueriesContext(connection) as queries:
+            soup.save()
+        self.assertEqual(len([q for q in queries if "menu" in q["sql"].lower()]), 1)
+        self.assertEqual(
+            self.sub_totals(), {"Lunch": Decimal("8.50"), "Dinner": Decimal("8.50")}
+        )
+
+        soup.name = "Tomato soup"
+        with CaptureQueriesContext(connection) as queries:
+            soup.save()
+        self.assertFalse([q for q in queries if "menu" in q["sql"].lower()])
+
+    def test_deleting_a_dish_takes_it_off_its_menus(self):
+        MenuItem.objects.create(menu=self.lunch, dish=self.soup)
+        MenuItem.objects.create(menu=self.lunch, dish=self.rice)
+        Dish.objects.get(pk=self.rice.pk).delete()
+        self.assertEqual(self.sub_totals()["Lunch"], Decimal("4.00"))
+
+    def test_menu_list_prefetches_items_with_their_dishes(self):
+        def fill(count):
+            for i in range(count):
+                menu = Menu.objects.create(name=f"Menu {i}")
+                MenuItem.objects.create(menu=menu, dish=self.soup)
+                MenuItem.objects.create(menu=menu, dish=self.curry)
+
+        for count in (1, 5):
+            fill(count)
+            with self.assertNumQueries(3):  # count, menus, items joined to dishes
+                response = self.client.get("/api/menus/")
+            self.assertEqual(response.status_code, 200)
+        for menu in response.data["results"]:
+            if menu["name"] in ("Lunch", "Dinner"):
+                continue
+            self.assertEqual(
+                {item["dish"]["name"] for item in menu["menu_items"]}, {"Soup", "Curry"}
+            )
@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, filters, permissions, status
@@ -8,14 +8,34 @@ from rest_framework.decorators import action
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import TokenError, RefreshToken
 from rest_framework_simplejwt.exceptions import InvalidToken
+from django.http import HttpResponse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Count, Avg, F
-from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.db.models import Sum, Count, Avg, F, Prefetch
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Q
-from django.db.models.functions import TruncDate, TruncHour
 from restaurant_app.models import *
 from restaurant_app.serializers import *
+from restaurant_app.pagination import (
+    DishSearchPagination,
+    KeysetPaginationMixin,
+    LedgerPagination,
+)
+from restaurant_app.search import DishSearchFilter, get_dish_search_index
+from restaurant_app.catalog import CatalogCacheMixin, cached_catalog_response
+from restaurant_app.floorplan import cached_floor_response, get_occupancy_index
+from restaurant_app.invoices import invoice_renderer, invoice_snapshot, snapshot_version
+from restaurant_app.pdf_batches import start_pdf_batch_job
+from restaurant_app.exports import (
+    COUPON_EXPORT_COLUMNS,
+    CSVRenderer,
+    EXPORT_FORMATS,
+    EXPORT_RENDERER_CLASSES,
+    MESS_REPORT_COLUMNS,
+    SALES_REPORT_COLUMNS,
+    stream_queryset,
+)
 from rest_framework.decorators import api_view
 
 
@@ -82,19 +102,19 @@ class LogoInfoViewSet(viewsets.ModelViewSet):
 
     
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ["name"]
 
 
-class DishViewSet(viewsets.ModelViewSet):
+class DishViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Dish.objects.all()
     serializer_class = DishSerializer
     filter_backends = [
         DjangoFilterBackend,
-        filters.SearchFilter,
+        DishSearchFilter,
         filters.OrderingFilter,
     ]
     filterset_fields = ["category"]
@@ -102,7 +122,7 @@ class DishViewSet(viewsets.ModelViewSet):
     ordering_fields = ["name", "price"]
 
 
-class DishVariantViewSet(viewsets.ModelViewSet):
+class DishVariantViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = DishVariant.objects.all()
     serializer_class = DishVariantSerializer
 
@@ -115,7 +135,7 @@ class DishVariantViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -130,6 +150,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         order_type = self.request.query_params.get("order_type", None)
         if order_type:
             queryset = queryset.filter(order_type=order_type)
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
         return queryset.exclude(status='cancelled')
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
@@ -142,6 +163,37 @@ class OrderViewSet(viewsets.ModelViewSet):
         order.save()
         return Response({"detail": "Order has been cancelled."}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"])
+    def invoice(self, request, pk=None):
+        """The order's invoice PDF.
+
+        Served from the invoice cache; on a miss the render is queued on the
+        worker pool and 202 is returned, so the client retries shortly.
+        """
+        snapshot = invoice_snapshot(self.get_object())
+        etag = f'"{snapshot_version(snapshot)}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        pdf = invoice_renderer.get_cached(snapshot)
+        if pdf is None:
+            if invoice_renderer.submit(snapshot) is None:
+                return Response(
+                    {"detail": "Invoice printing is busy, try again shortly."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": "5"},
+                )
+            return Response(
+                {"detail": "Invoice is being rendered."},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Retry-After": "1"},
+            )
+
+        response = HttpResponse(pdf, content_type="application/pdf")
+        response["Content-Disposition"] = f'inline; filename="invoice-{snapshot["order_id"]}.pdf"'
+        response["ETag"] = etag
+        return response
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -149,7 +201,11 @@ class OrderViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    def get_queryset_by_time_range(self, time_range):
+    @staticmethod
+    def start_of_day(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def get_time_range_bounds(self, time_range):
         end_date = timezone.now()
         if time_range == "day":
             start_date = end_date - timedelta(days=1)
@@ -162,7 +218,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         else:
             start_date = end_date - timedelta(days=30)
 
-        return self.queryset.filter(created_at__range=(start_date, end_date))
+        return start_date, end_date
     
     @action(detail=False, methods=["get"])
     def user_order_history(self, request):
@@ -182,7 +238,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=["get"])  # Update on 21-08-2024
+    @action(
+        detail=False, methods=["get"], renderer_classes=EXPORT_RENDERER_CLASSES
+    )  # Update on 21-08-2024
     def sales_report(self, request):
         from_date = request.query_params.get("from_date")
         to_date = request.query_params.get("to_date")
@@ -195,15 +253,13 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         queryset = self.get_queryset()
 
-        # Apply date filters if provided
-        if from_date and to_date:
+        # Apply date filters if provided, as created_at ranges so they can use an index
+        if from_date:
+            queryset = queryset.filter(created_at__gte=self.start_of_day(from_date))
+        if to_date:
             queryset = queryset.filter(
-                created_at__date__gte=from_date, created_at__date__lte=to_date
+                created_at__lt=self.start_of_day(to_date + timedelta(days=1))
             )
-        elif from_date:
-            queryset = queryset.filter(created_at__date__gte=from_date)
-        elif to_date:
-            queryset = queryset.filter(created_at__date__lte=to_date)
 
         # Apply additional filters based on query parameters
         if order_type:
@@ -213,54 +269,64 @@ class OrderViewSet(viewsets.ModelViewSet):
         if status:
             queryset = queryset.filter(status=status)
 
+        # ?format=csv|ndjson streams a flat projection instead of serializing everything
+        export_format = request.accepted_renderer.format
+        if export_format in EXPORT_FORMATS:
+            return stream_queryset(
+                queryset, SALES_REPORT_COLUMNS, export_format, "sales_report"
+            )
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def dashboard_data(self, request):
+        # Reads the hourly rollups maintained on order save instead of scanning orders
         time_range = request.query_params.get("time_range", "month")
-        queryset = self.get_queryset_by_time_range(time_range)
+        start_date, end_date = self.get_time_range_bounds(time_range)
+        rollups = SalesRollup.objects.in_window(start_date, end_date)
+        dish_rollups = DishSalesRollup.objects.in_window(start_date, end_date)
 
         daily_sales = (
-            queryset.annotate(date=TruncDate("created_at"))
-            .values("date")
-            .annotate(total_sales=Sum("total_amount"), order_count=Count("id"))
+            rollups.values("date")
+            .annotate(total_sales=Sum("total_sales"), order_count=Sum("order_count"))
             .order_by("date")
         )
 
-        total_income = (
-            queryset.aggregate(total_income=Sum("total_amount"))["total_income"] or 0
+        totals = rollups.aggregate(
+            total_income=Sum("total_sales"), total_orders=Sum("order_count")
         )
+        total_income = totals["total_income"] or 0
+        total_orders = totals["total_orders"] or 0
 
-        popular_time_slots = (
-            queryset.annotate(hour=TruncHour("created_at"))
-            .values("hour")
-            .annotate(order_count=Count("id"))
+        popular_time_slots = [
+            {
+                "hour": timezone.make_aware(
+                    datetime.combine(slot["date"], time(slot["hour"]))
+                ),
+                "order_count": slot["order_count"],
+            }
+            for slot in rollups.values("date", "hour")
+            .annotate(order_count=Sum("order_count"))
             .order_by("-order_count")[:5]
-        )
+        ]
 
         top_dishes = (
-            OrderItem.objects.filter(order__in=queryset)
-            .values(
+            dish_rollups.values(
                 "dish__name",
                 "dish__image",
             )
-            .annotate(orders=Count("id"))
+            .annotate(orders=Sum("line_count"))
             .order_by("-orders")[:5]
         )
 
         category_sales = (
-            OrderItem.objects.filter(order__in=queryset)
-            .values("dish__category__name")
+            dish_rollups.values("dish__category__name")
             .annotate(value=Sum(F("quantity") * F("dish__price")))
             .order_by("-value")
         )
 
-        total_orders = queryset.count()
-
-        avg_order_value = (
-            queryset.aggregate(avg_value=Avg("total_amount"))["avg_value"] or 0
-        )
+        avg_order_value = total_income / total_orders if total_orders else 0
 
         return Response(
             {
@@ -277,7 +343,9 @@ class OrderViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def sales_trends(self, request):
         time_range = request.query_params.get("time_range", "month")
-        current_queryset = self.get_queryset_by_time_range(time_range)
+        current_rollups = SalesRollup.objects.in_window(
+            *self.get_time_range_bounds(time_range)
+        )
 
         end_date = timezone.now() - timedelta(days=1)
         if time_range == "day":
@@ -293,21 +361,22 @@ class OrderViewSet(viewsets.ModelViewSet):
             start_date = end_date - timedelta(days=365)
             prev_start_date = start_date - timedelta(days=365)
 
-        prev_queryset = self.queryset.filter(
-            created_at__range=(prev_start_date, start_date)
-        )
+        prev_rollups = SalesRollup.objects.in_window(prev_start_date, start_date)
 
-        current_stats = current_queryset.aggregate(
-            total_income=Sum("total_amount"),
-            total_orders=Count("id"),
-            avg_order_value=Avg("total_amount"),
-        )
+        def summarize(rollups):
+            stats = rollups.aggregate(
+                total_income=Sum("total_sales"),
+                total_orders=Sum("order_count"),
+            )
+            total_income = stats["total_income"] or 0
+            total_orders = stats["total_orders"] or 0
+            stats["avg_order_value"] = (
+                total_income / total_orders if total_orders else 0
+            )
+            return stats
 
-        prev_stats = prev_queryset.aggregate(
-            total_income=Sum("total_amount"),
-            total_orders=Count("id"),
-            avg_order_value=Avg("total_amount"),
-        )
+        current_stats = summarize(current_rollups)
+        prev_stats = summarize(prev_rollups)
 
         def calculate_trend(current, previous):
             if previous and previous != 0:
@@ -361,9 +430,17 @@ class OrderStatusUpdateViewSet(viewsets.GenericViewSet):
                         status=status.HTTP_400_BAD_REQUEST,
                     )
 
-                # Create the credit order if it doesn't exist
-                CreditOrder.objects.get_or_create(order=updated_order, credit_user=credit_user)
-                credit_user.add_to_total_due(updated_order.total_amount)
+                # Charge the order once, when it first becomes a credit order.
+                # One transaction, so a failed charge leaves no CreditOrder
+                # behind that would make a retry skip it
+                with transaction.atomic():
+                    _, created = CreditOrder.objects.get_or_create(
+                        order=updated_order, credit_user=credit_user
+                    )
+                    if created:
+                        credit_user.add_to_total_due(
+                            updated_order.total_amount, order=updated_order
+                        )
 
             return Response({"detail": "Order updated successfully."}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -385,10 +462,14 @@ class OrderTypeChangeViewSet(viewsets.ViewSet):
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class BillViewSet(viewsets.ModelViewSet):
+class BillViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     queryset = Bill.objects.all()
     serializer_class = BillSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ("-billed_at", "-id")
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset())
 
     def perform_create(self, serializer):
         serializer.save()
@@ -396,7 +477,7 @@ class BillViewSet(viewsets.ModelViewSet):
 
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all().order_by("-created_at")
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -410,10 +491,48 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"])
     def unread(self, request):
-        unread_notifications = self.queryset.filter(is_read=False)
+        unread_notifications = self.queryset.filter(
+            Notification.visible_to(request.user), is_read=False
+        )
         serializer = self.get_serializer(unread_notifications, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def unread_count(self, request):
+        return Response({"unread": NotificationCounter.unread_for(request.user)})
+
+    @action(detail=False, methods=["post"])
+    def mark_read(self, request):
+        """Mark notifications read in one UPDATE: {"ids": [...]} and/or
+        {"before": "<ISO timestamp>"} narrow it down."""
+        ids = request.data.get("ids")
+        if ids is not None and (
+            not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)
+        ):
+            return Response(
+                {"error": "ids must be a list of notification ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        before = request.data.get("before")
+        if before is not None:
+            before = parse_datetime(str(before))
+            if before is None:
+                return Response(
+                    {"error": "before must be an ISO 8601 timestamp"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        marked = Notification.mark_read(request.user, ids=ids, before=before)
+        return Response(
+            {"marked": marked, "unread": NotificationCounter.unread_for(request.user)}
+        )
+
+    @action(detail=False, methods=["post"])
+    def mark_all_read(self, request):
+        marked = Notification.mark_read(request.user)
+        return Response(
+            {"marked": marked, "unread": NotificationCounter.unread_for(request.user)}
+        )
+
 
 class FloorViewSet(viewsets.ModelViewSet):
     queryset = Floor.objects.all()
@@ -421,10 +540,27 @@ class FloorViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        names = [item["name"] for item in serializer.data]
-        return Response(names)
+        return Response(list(self.get_queryset().values_list("name", flat=True)))
+
+    @action(detail=False, methods=["get"])
+    def snapshot(self, request):
+        """All floors with their tables nested, for host stands to poll with
+        If-None-Match; the ETag only changes when a floor or table changes."""
+
+        def build():
+            floors = Floor.objects.order_by("name").prefetch_related(
+                Prefetch("tables", Table.objects.order_by("table_name", "id"))
+            )
+            return FloorSnapshotSerializer(floors, many=True).data
+
+        return cached_floor_response(request, build)
+
+    @action(detail=False, methods=["get"])
+    def plan(self, request):
+        """Every floor with its tables' live status and seat time, from the
+        in-memory occupancy index. ?floor=<name> limits it to one floor."""
+        floor = request.query_params.get("floor")
+        return Response(get_occupancy_index().plan(floor=floor))
 
 
 class TableViewSet(viewsets.ModelViewSet):
@@ -435,9 +571,23 @@ class TableViewSet(viewsets.ModelViewSet):
         queryset = Table.objects.all()
         floor = self.request.query_params.get("floor")
         if floor:
-            queryset = queryset.filter(floor__name=floor)
+            # Floor names resolve from the occupancy index, so no join
+            queryset = queryset.filter(floor_id=get_occupancy_index().floor_id(floor))
         return queryset
 
+    @action(detail=True, methods=["post"])
+    def set_status(self, request, pk=None):
+        table = self.get_object()
+        new_status = request.data.get("status")
+        if new_status not in dict(Table.STATUS_CHOICES):
+            return Response(
+                {"error": "status must be one of free, seated, billed, cleaning"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        Table.set_status(table.pk, new_status)
+        table.refresh_from_db()
+        return Response(self.get_serializer(table).data)
+
 
 class CouponViewSet(viewsets.ModelViewSet):
     queryset = Coupon.objects.all()
@@ -445,7 +595,22 @@ class CouponViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
+        # Campaign codes run to the hundred thousands, so they are left out
+        # unless asked for: per campaign with ?campaign=<id>, or all of them
+        # with ?include_campaigns=true
+        params = request.query_params
         queryset = self.get_queryset()
+        if params.get("campaign"):
+            try:
+                campaign = int(params["campaign"])
+            except ValueError:
+                return Response(
+                    {"campaign": "Must be a campaign id."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = queryset.filter(campaign_id=campaign)
+        elif params.get("include_campaigns", "").lower() != "true":
+            queryset = queryset.filter(campaign__isnull=True)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -480,13 +645,55 @@ class CouponViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class CouponCampaignViewSet(viewsets.ModelViewSet):
+    """Generate, export and revoke batches of single-use coupon codes."""
+
+    queryset = CouponCampaign.objects.all()
+    serializer_class = CouponCampaignSerializer
+    permission_classes = [permissions.IsAdminUser]
+    http_method_names = ["get", "post"]
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(detail=True, methods=["get"], renderer_classes=EXPORT_RENDERER_CLASSES)
+    def export(self, request, pk=None):
+        """Stream the campaign's codes as CSV (default) or NDJSON."""
+        campaign = self.get_object()
+        export_format = request.accepted_renderer.format
+        if export_format not in EXPORT_FORMATS:
+            export_format = CSVRenderer.format
+        return stream_queryset(
+            campaign.coupons.order_by("id"),
+            COUPON_EXPORT_COLUMNS,
+            export_format,
+            f"coupons-{campaign.prefix}",
+        )
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        """Finish generating a campaign whose run was interrupted."""
+        campaign = self.get_object()
+        campaign.complete()
+        return Response(self.get_serializer(campaign).data)
+
+    @action(detail=True, methods=["post"])
+    def revoke(self, request, pk=None):
+        campaign = self.get_object()
+        revoked = campaign.revoke()
+        return Response({"revoked": revoked, "revoked_at": campaign.revoked_at})
+
+
 class MessTypeViewSet(viewsets.ModelViewSet):
     queryset = MessType.objects.all()
     serializer_class = MessTypeSerializer
 
 
 class MenuViewSet(viewsets.ModelViewSet):
-    queryset = Menu.objects.all()
+    # Items and their dishes in one extra query for the whole page
+    queryset = Menu.objects.prefetch_related(
+        Prefetch("menu_items", queryset=MenuItem.objects.select_related("dish"))
+    )
     serializer_class = MenuSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ["mess_type", "is_custom", "created_by"]
@@ -537,7 +744,7 @@ class MessViewSet(viewsets.ModelViewSet):
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
-    @action(detail=False, methods=["get"])
+    @action(detail=False, methods=["get"], renderer_classes=EXPORT_RENDERER_CLASSES)
     def mess_report(self, request):
         from_date = request.query_params.get("from_date")
         to_date = request.query_params.get("to_date")
@@ -572,17 +779,32 @@ class MessViewSet(viewsets.ModelViewSet):
             except MessType.DoesNotExist:
                 return Response({"detail": "Invalid mess_type"}, status=400)
 
+        export_format = request.accepted_renderer.format
+        if export_format in EXPORT_FORMATS:
+            return stream_queryset(
+                queryset, MESS_REPORT_COLUMNS, export_format, "mess_report"
+            )
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
 class SearchDishesAPIView(APIView):
     def get(self, request):
+        return cached_catalog_response(request, lambda: self.search(request))
+
+    def search(self, request):
         query = request.GET.get("search", "")
         if query:
-            dishes = Dish.objects.filter(name__icontains=query)
-            serializer = DishSerializer(dishes, many=True)
-            return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+            # Ranked ids come from the in-memory index; only the page is loaded
+            dish_ids = get_dish_search_index().search(query)
+            paginator = DishSearchPagination()
+            page_ids = paginator.paginate_queryset(dish_ids, request, view=self)
+            dishes = Dish.objects.in_bulk(page_ids)
+            serializer = DishSerializer(
+                [dishes[dish_id] for dish_id in page_ids if dish_id in dishes], many=True
+            )
+            return paginator.get_paginated_response(serializer.data)
         return Response({"results": []}, status=status.HTTP_200_OK)
 
 
@@ -610,19 +832,97 @@ class CreditUserViewSet(viewsets.ModelViewSet):
         credit_user.make_payment(amount)
         return Response(CreditUserSerializer(credit_user).data)
 
+    @action(detail=True, methods=["get"])
+    def balance(self, request, pk=None):
+        credit_user = self.get_object()
+        return Response(
+            {"total_due": credit_user.total_due, "ledger_balance": credit_user.ledger_balance()}
+        )
+
+    @action(detail=True, methods=["get"])
+    def statement(self, request, pk=None):
+        """Ledger entries between from_date and to_date (inclusive) with the
+        opening and closing balances; entries are cursor-paginated."""
+        credit_user = self.get_object()
+        try:
+            from_date = parse_date(request.query_params.get("from_date", ""))
+            to_date = parse_date(request.query_params.get("to_date", ""))
+        except ValueError:  # well formed but not a real date, e.g. 2024-13-45
+            from_date = to_date = None
+        if from_date is None or to_date is None:
+            return Response(
+                {"error": "from_date and to_date are required (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start = OrderViewSet.start_of_day(from_date)
+        end = OrderViewSet.start_of_day(to_date + timedelta(days=1))
+
+        entries = credit_user.ledger_entries.filter(created_at__gte=start, created_at__lt=end)
+        paginator = LedgerPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        return Response(
+            {
+                "opening_balance": credit_user.ledger_balance(before=start),
+                "closing_balance": credit_user.ledger_balance(before=end),
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+                "results": CreditLedgerEntrySerializer(page, many=True).data,
+            }
+        )
+
 
 class CreditOrderViewSet(viewsets.ModelViewSet):
     queryset = CreditOrder.objects.all()
     serializer_class = CreditOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class PdfBatchJobViewSet(viewsets.ModelViewSet):
+    """Start and follow background batches of invoices or credit statements.
+
+    POST queues a job and returns 202; poll the job for done/total and pages,
+    and download ``file`` once its status is "done".
+    """
+
+    queryset = PdfBatchJob.objects.all()
+    serializer_class = PdfBatchJobSerializer
+    permission_classes = [permissions.IsAdminUser]
+    http_method_names = ["get", "post"]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(created_by=request.user)
+        start_pdf_batch_job(job)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class TransactionViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    cursor_ordering = ("-date", "-id")
 
     def get_queryset(self):
         queryset = super().get_queryset()
         mess_id = self.request.query_params.get('mess_id', None)
         if mess_id is not None:
             queryset = queryset.filter(mess_id=mess_id)
-        return queryset
\ No newline at end of file
+        return queryset
+
+    def perform_create(self, serializer):
+        # The insert and the mess balance increment commit together
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    @action(detail=False, methods=["post"])
+    def bulk_import(self, request):
+        """Create a list of payments at once, e.g. from a bank statement."""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        created = Transaction.import_payments(
+            [Transaction(**data) for data in serializer.validated_data]
+        )
+        return Response({"created": len(created)}, status=status.HTTP_201_CREATED)
\ No newline at end of file
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     "django_filters",
     "restaurant_app.apps.RestaurantAppConfig",
     "delivery_drivers.apps.DeliveryDriversConfig",
+    "kitchen.apps.KitchenConfig",
 ]
 
 REST_FRAMEWORK = {
@@ -89,9 +90,88 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file rather than the in-memory default, so tests that write from
+        # several threads wait on SQLite's busy timeout instead of failing
+        # with "database table is locked"
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# SQLite production mode: WAL lets report reads run alongside the writer,
+# IMMEDIATE transactions take the write lock up front so concurrent writers
+# queue on busy_timeout instead of failing with "database is locked", and
+# connections are kept open between requests.
+SQLITE_PRODUCTION_MODE = env.bool("SQLITE_PRODUCTION_MODE", default=False)
+SQLITE_BUSY_TIMEOUT_MS = env.int("SQLITE_BUSY_TIMEOUT_MS", default=20000)
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative means KiB, i.e. 64 MiB
+    "temp_store": "MEMORY",
+}
+SQLITE_PRODUCTION_OPTIONS = {
+    "transaction_mode": "IMMEDIATE",
+    "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+    "init_command": ";".join(
+        f"PRAGMA {name}={value}" for name, value in SQLITE_PRAGMAS.items()
+    ),
+}
+
+if SQLITE_PRODUCTION_MODE:
+    DATABASES["default"].update(
+        {
+            "CONN_MAX_AGE": None,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": SQLITE_PRODUCTION_OPTIONS,
+        }
+    )
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Serialized menu responses and the catalog version. It must be shared by
+    # every worker process so a menu edit invalidates all of them.
+    "catalog": {
+        "BACKEND": env.str(
+            "CATALOG_CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": env.str(
+            "CATALOG_CACHE_LOCATION", default=str(BASE_DIR / "cache" / "catalog")
+        ),
+        "TIMEOUT": 60 * 60 * 24,
+    },
+    # Rendered invoice PDFs, keyed by order id and content version
+    "invoices": {
+        "BACKEND": env.str(
+            "INVOICE_CACHE_BACKEND",
+            default="django.core.cache.backends.filebased.FileBasedCache",
+        ),
+        "LOCATION": env.str(
+            "INVOICE_CACHE_LOCATION", default=str(BASE_DIR / "cache" / "invoices")
+        ),
+        "TIMEOUT": 60 * 60 * 24 * 7,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+# Invoice PDFs are rendered off the request thread by a small per-process pool;
+# when INVOICE_RENDER_QUEUE_SIZE renders are already pending, new ones are refused
+INVOICE_RENDER_WORKERS = env.int("INVOICE_RENDER_WORKERS", default=2)
+INVOICE_RENDER_QUEUE_SIZE = env.int("INVOICE_RENDER_QUEUE_SIZE", default=20)
+
+# Invoice numbers: INVOICE_NUMBER_RESET is "never" (0001, 0002, ...) or "daily"
+# (<branch>YYMMDD-0001); INVOICE_BRANCH_CODE prefixes and separates the sequences
+# of branches sharing a database
+INVOICE_NUMBER_RESET = env.str("INVOICE_NUMBER_RESET", default="never")
+INVOICE_BRANCH_CODE = env.str("INVOICE_BRANCH_CODE", default="")
+
+# Processes used by batch invoice/statement rendering; 0 means one per CPU core
+PDF_BATCH_WORKERS = env.int("PDF_BATCH_WORKERS", default=0)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -154,6 +234,26 @@ TWILIO_ACCOUNT_SID = env.str("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = env.str("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = env.str("TWILIO_PHONE_NUMBER")
 
+# SMS/WhatsApp outbox, delivered by "manage.py run_message_worker"
+MESSAGE_TRANSPORT = env.str(
+    "MESSAGE_TRANSPORT", default="restaurant_app.messaging.TwilioTransport"
+)
+MESSAGE_SEND_CONCURRENCY = env.int("MESSAGE_SEND_CONCURRENCY", default=4)
+MESSAGE_MAX_ATTEMPTS = env.int("MESSAGE_MAX_ATTEMPTS", default=5)
+MESSAGE_RETRY_BASE_SECONDS = env.int("MESSAGE_RETRY_BASE_SECONDS", default=30)
+
+# Order and bill notifications are written in batches after their transaction
+# commits; read notifications older than NOTIFICATION_RETENTION_DAYS are removed
+# by "manage.py prune_notifications"
+NOTIFICATION_BATCH_SIZE = env.int("NOTIFICATION_BATCH_SIZE", default=100)
+NOTIFICATION_FLUSH_INTERVAL = env.float("NOTIFICATION_FLUSH_INTERVAL", default=1.0)
+NOTIFICATION_RETENTION_DAYS = env.int("NOTIFICATION_RETENTION_DAYS", default=30)
+
+# Short links (utils.shorten_url) are served from SHORT_LINK_BASE_URL/s/<code>
+SHORT_LINK_BASE_URL = env.str("SHORT_LINK_BASE_URL", default="http://localhost:8000")
+SHORT_LINK_EXPIRY_DAYS = env.int("SHORT_LINK_EXPIRY_DAYS", default=90)
+SHORT_LINK_CACHE_SIZE = env.int("SHORT_LINK_CACHE_SIZE", default=10000)
+
 UNFOLD = {
     "SITE_TITLE": "Nasscript",
     "SITE_HEADER": "Nasscript",
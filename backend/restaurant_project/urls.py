@@ -21,6 +21,7 @@ from restaurant_app.views import (
     FloorViewSet,
     TableViewSet,
     CouponViewSet,
+    CouponCampaignViewSet,
     MenuViewSet,
     MenuItemViewSet,
     MessViewSet,
@@ -30,13 +31,17 @@ from restaurant_app.views import (
     CreditOrderViewSet,
     TransactionViewSet,
    OrderTypeChangeViewSet,
-    DishVariantViewSet
+    DishVariantViewSet,
+    PdfBatchJobViewSet,
 
 )
+from restaurant_app.realtime import event_stream_view
+from restaurant_app.shortlinks import short_link_redirect
 from delivery_drivers.views import (
     DeliveryDriverViewSet,
     DeliveryOrderViewSet,
 )
+from kitchen.views import KitchenStationViewSet, KitchenTicketViewSet
 
 
 router = DefaultRouter()
@@ -51,11 +56,13 @@ router.register(r"notifications", NotificationViewSet, basename="notifications")
 router.register(r"floors", FloorViewSet, basename="floors")
 router.register(r"tables", TableViewSet, basename="tables")
 router.register(r"coupons", CouponViewSet, basename="coupons")
+router.register(r"coupon-campaigns", CouponCampaignViewSet, basename="coupon-campaigns")
 router.register(r"mess-types", MessTypeViewSet, basename="mess_types")
 router.register(r"menus", MenuViewSet, basename="menus")
 router.register(r"menu-items", MenuItemViewSet, basename="menu_items")
 router.register(r"messes", MessViewSet, basename="messes")
 router.register(r'transactions', TransactionViewSet, basename="transactions")
+router.register(r"pdf-batches", PdfBatchJobViewSet, basename="pdf_batches")
 
 # Credit User URLs
 router.register(r"credit-users", CreditUserViewSet, basename="credit_users")
@@ -65,6 +72,10 @@ router.register(r"credit-orders", CreditOrderViewSet, basename="credit_orders")
 router.register(r"delivery-drivers", DeliveryDriverViewSet, basename="delivery_drivers")
 router.register(r"delivery-orders", DeliveryOrderViewSet, basename="delivery_orders")
 
+# Kitchen display URLs
+router.register(r"kitchen-stations", KitchenStationViewSet, basename="kitchen_stations")
+router.register(r"kitchen-tickets", KitchenTicketViewSet, basename="kitchen_tickets")
+
 # for updating the status of the order
 router.register(r'order-status', OrderStatusUpdateViewSet, basename='order-status')
 
@@ -82,6 +93,8 @@ urlpatterns = [
     path("api/", include(router.urls)),
     path("api/login-passcode/", PasscodeLoginView.as_view(), name="login-passcode"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/events/", event_stream_view, name="event_stream"),
+    path("s/<str:code>", short_link_redirect, name="short_link"),
     path("api/logout/", LogoutView.as_view({"post": "logout"}), name="logout"),
     path(
         "api/search-dishes/", SearchDishesAPIView.as_view(), name="search_dishes"
@@ -8,8 +8,8 @@ interface NotificationBadgeProps {
 }
 
 const fetchUnreadNotifications = async () => {
-  const response = await api.get("/notifications/unread/");
-  return response.data.length;
+  const response = await api.get("/notifications/unread_count/");
+  return response.data.unread;
 };
 
 const NotificationBadge: React.FC<NotificationBadgeProps> = ({ className = "" }) => {
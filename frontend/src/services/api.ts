@@ -189,8 +189,8 @@ export const fetchBills = async (page: number) => {
 
 export const fetchUnreadCount = async () => {
   try {
-    const response = await api.get("/notifications/unread/");
-    return response.data.length;
+    const response = await api.get("/notifications/unread_count/");
+    return response.data.unread;
   } catch (error) {
     console.error("Error fetching unread notifications:", error);
   }